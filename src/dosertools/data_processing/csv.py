@@ -77,13 +77,59 @@ def csv_to_dataframe(csv : str, fname_format : str, sampleinfo_format : str, opt
 
     return dataset
 
-def generate_df(csv_location : typing.Union[str, bytes, os.PathLike], fname_format : str, sampleinfo_format : str, optional_settings: dict = {}) -> pd.DataFrame:
+def process_csv(csv : str, fname_format : str, sampleinfo_format : str, optional_settings: dict = {}) -> pd.DataFrame:
+    """
+    Reads in a csv and processes it for fitting.
+
+    Reads the csv with csv_to_dataframe, truncates the data before the
+    longest block of zeros, and adds the strain rate, critical time, and
+    diameter at critical time.
+
+    Parameters
+    ----------
+    csv : string
+        Path to csv file to import.
+    fname_format : str
+        The format of the fname with parameter names separated
+        by the deliminator specified by fname_split.
+        ex. "date_sampleinfo_fps_run"
+    sampleinfo_format : str
+        The format of the sampleinfo section of the fname,
+        separated by the deliminator specified by sample_split.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    tc_bounds: 2 element list of floats
+        [start, end]
+        The D/D0 to bound the start and end for finding the critical time.
+        Default is [0.3,0.07].
+
+    Returns
+    -------
+    process_csv : pd.DataFrame
+        dataframe with data from csv, sample information from filename,
+        strain rate and critical time calculated
+    """
+
+    sample_df = csv_to_dataframe(csv,fname_format,sampleinfo_format,optional_settings)
+    # Truncates the data before the longest block of zeros.
+    sample_df = extension.truncate_data(sample_df)
+    # Adds the strain rate to the dataset.
+    sample_df = extension.add_strain_rate(sample_df)
+    # Finds critical time by locating the maximum strain rate within the bounds.
+    sample_df = extension.add_critical_time(sample_df, optional_settings)
+    return sample_df
+
+def generate_df(csv_location : typing.Union[str, bytes, os.PathLike], fname_format : str, sampleinfo_format : str,
+                optional_settings: dict = {}, processed_dfs: dict = {}) -> pd.DataFrame:
     """
     Reads in all csvs and process them into a dataframe.
 
     Reads in data from all csvs in csv_location, process each, adding
     strain rate, critical time, diameter at critical time, and parameters from the
-    filename, and put all data into one dataframe. Loops csv_to_dataframe for
+    filename, and put all data into one dataframe. Loops process_csv for
     all csvs in folder.
 
     Parameters
@@ -102,6 +148,10 @@ def generate_df(csv_location : typing.Union[str, bytes, os.PathLike], fname_form
         separated by the deliminator specified by sample_split
     optional_settings: dict
         A dictionary of optional settings.
+    processed_dfs: dict, optional
+        Dataframes already returned by process_csv, keyed by the absolute
+        path of their csv. These csvs are not processed again.
+        Default is {}.
 
     Returns
     -------
@@ -127,15 +177,12 @@ def generate_df(csv_location : typing.Union[str, bytes, os.PathLike], fname_form
 
     # Runs the processing for each csv in the folder.
     for csv in csvs:
-        if verbose:
-            print("Processing " + csv)
-        sample_df = csv_to_dataframe(csv,fname_format,sampleinfo_format,optional_settings)
-        # Truncates the data before the longest block of zeros.
-        sample_df = extension.truncate_data(sample_df)
-        # Adds the strain rate to the dataset.
-        sample_df = extension.add_strain_rate(sample_df)
-        # Finds critical time by locating the maximum strain rate within the bounds.
-        sample_df = extension.add_critical_time(sample_df, optional_settings)
+        try:
+            sample_df = processed_dfs[os.path.abspath(csv)]
+        except KeyError:
+            if verbose:
+                print("Processing " + csv)
+            sample_df = process_csv(csv,fname_format,sampleinfo_format,optional_settings)
         df_list.append(sample_df)
     df = pd.concat(df_list,ignore_index=True)
 
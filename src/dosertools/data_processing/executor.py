@@ -0,0 +1,195 @@
+import concurrent.futures
+import multiprocessing
+import multiprocessing.pool
+import typing
+
+try:
+    import loky
+except ImportError:
+    # loky is only needed for the "loky" executor.
+    loky = None
+
+# Executors make_pool can create, selected with the "executor" setting.
+EXECUTORS = ["process", "fork", "forkserver", "spawn", "thread", "serial", "loky"]
+
+class SerialPool:
+    """
+    Runs tasks one at a time in the calling process, with the methods of
+    multiprocessing.pool.Pool used by integration.
+
+    Each task runs as soon as it is submitted, so errors keep their full
+    tracebacks and profilers and debuggers see every call.
+
+    Parameters
+    ----------
+    initializer: callable or None, optional
+        Function called once when the pool is created.
+        Default is None.
+    """
+
+    def __init__(self, initializer: typing.Optional[typing.Callable] = None):
+        if initializer is not None:
+            initializer()
+
+    def apply_async(self, function: typing.Callable, args: tuple = (), kwds: dict = {},
+                    callback: typing.Optional[typing.Callable] = None,
+                    error_callback: typing.Optional[typing.Callable] = None) -> None:
+        """
+        Runs function(*args, **kwds), then calls callback with its result,
+        or error_callback with the exception it raised.
+        """
+
+        try:
+            result = function(*args, **kwds)
+        except Exception as error:
+            if error_callback is None:
+                raise
+            error_callback(error)
+        else:
+            if callback is not None:
+                callback(result)
+        pass
+
+    def starmap(self, function: typing.Callable, iterable: typing.Iterable) -> list:
+        """
+        Runs function on each tuple of arguments in iterable, in order.
+        """
+
+        return [function(*arguments) for arguments in iterable]
+
+    def close(self) -> None:
+        pass
+
+    def join(self) -> None:
+        pass
+
+    def terminate(self) -> None:
+        pass
+
+class FuturesPool:
+    """
+    Runs tasks in a concurrent.futures executor, with the methods of
+    multiprocessing.pool.Pool used by integration.
+
+    Parameters
+    ----------
+    executor: concurrent.futures.Executor
+        Executor to submit tasks to.
+    shutdown: bool, optional
+        True to shut the executor down when the pool is joined or
+        terminated. False to leave its workers running for later pools
+        (e.g. loky's reusable executor), only waiting for this pool's tasks.
+        Default is True.
+    """
+
+    def __init__(self, executor: concurrent.futures.Executor, shutdown: bool = True):
+        self.executor = executor
+        self.shutdown = shutdown
+        self.futures = []
+
+    def apply_async(self, function: typing.Callable, args: tuple = (), kwds: dict = {},
+                    callback: typing.Optional[typing.Callable] = None,
+                    error_callback: typing.Optional[typing.Callable] = None) -> concurrent.futures.Future:
+        """
+        Submits function(*args, **kwds). Once it finishes, callback is called
+        with its result, or error_callback with the exception it raised.
+        """
+
+        def finished(future):
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is None and callback is not None:
+                callback(future.result())
+            elif error is not None and error_callback is not None:
+                error_callback(error)
+
+        future = self.executor.submit(function, *args, **kwds)
+        self.futures.append(future)
+        future.add_done_callback(finished)
+        return future
+
+    def starmap(self, function: typing.Callable, iterable: typing.Iterable) -> list:
+        """
+        Runs function on each tuple of arguments in iterable, returning the
+        results in order.
+        """
+
+        futures = [self.executor.submit(function, *arguments) for arguments in iterable]
+        self.futures.extend(futures)
+        return [future.result() for future in futures]
+
+    def close(self) -> None:
+        pass
+
+    def join(self) -> None:
+        """
+        Waits for every submitted task to finish.
+        """
+
+        concurrent.futures.wait(self.futures)
+        if self.shutdown:
+            self.executor.shutdown(wait=True)
+        self.futures = []
+
+    def terminate(self) -> None:
+        """
+        Cancels every submitted task that has not started.
+        """
+
+        for future in self.futures:
+            future.cancel()
+        if self.shutdown:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.futures = []
+
+def make_pool(executor: str, processes: int, initializer: typing.Optional[typing.Callable] = None) -> typing.Union[multiprocessing.pool.Pool, SerialPool, FuturesPool]:
+    """
+    Creates a pool of workers of the given kind.
+
+    Every pool has the apply_async, starmap, close, join, and terminate
+    methods of multiprocessing.pool.Pool.
+
+    Parameters
+    ----------
+    executor: str
+        Kind of pool, one of EXECUTORS:
+        "process": multiprocessing.Pool with the default start method.
+        "fork", "forkserver", "spawn": multiprocessing.Pool with that start
+        method.
+        "thread": multiprocessing.pool.ThreadPool, threads in this process.
+        "serial": SerialPool, every task in the calling process in turn.
+        "loky": loky's reusable executor of worker processes, kept running
+        between pools. Requires loky.
+    processes: int
+        Number of workers. Ignored for "serial".
+    initializer: callable or None, optional
+        Function called once by each worker when it starts.
+        Default is None.
+
+    Returns
+    -------
+    pool: multiprocessing.pool.Pool, SerialPool, or FuturesPool
+        The pool of workers.
+
+    Raises
+    ------
+    ValueError: If executor is not one of EXECUTORS, or the start method is
+    not available on this platform.
+    ImportError: If executor is "loky" and loky is not installed.
+    """
+
+    if executor == "process":
+        return multiprocessing.Pool(processes, initializer=initializer)
+    elif executor in ["fork", "forkserver", "spawn"]:
+        return multiprocessing.get_context(executor).Pool(processes, initializer=initializer)
+    elif executor == "thread":
+        return multiprocessing.pool.ThreadPool(processes, initializer=initializer)
+    elif executor == "serial":
+        return SerialPool(initializer)
+    elif executor == "loky":
+        if loky is None:
+            raise ImportError("The loky executor requires loky (pip install loky).")
+        return FuturesPool(loky.get_reusable_executor(max_workers=processes, initializer=initializer), shutdown=False)
+    else:
+        raise ValueError("executor must be one of " + ", ".join(EXECUTORS) + ".")
@@ -1,18 +1,34 @@
 import typing
 import os
 import time
+import datetime
+import contextlib
+import importlib
+import queue
+import collections
+import sys
+import warnings
 import multiprocessing
 import multiprocessing.pool
 import numpy as np
 import pandas as pd
 
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where peak memory is not reported.
+    resource = None
+
 from ..image_processing import tiff_handling as th
 from ..image_processing import binary as binary
+from ..image_processing import shared_arrays as shared_arrays
 from ..file_handling import folder as folder
 from ..file_handling import tags as tags
 from . import fitting as fitting
 from . import csv as dpcsv
 from . import figures as figures
+from . import executor as executor
+from . import profiling as profiling
 
 def set_defaults(optional_settings: dict = {}) -> dict:
     """
@@ -101,6 +117,8 @@ def set_defaults(optional_settings: dict = {}) -> dict:
         Default is False.
     image_extension: string
         The extension for images in the video folder. TIFF recommended.
+        "mraw" to read Photron .mraw recordings (named like video folders)
+        instead of folders of images.
         Default is "tif". Do not include ".".
     summary_filename: string
         The base filename (no extension) for saving the summary csvs. If not
@@ -111,6 +129,126 @@ def set_defaults(optional_settings: dict = {}) -> dict:
         How many cores to use for multithreading/multiprocessing. If nothing
         provided, default will be the maximum number of cores returned from
         os.cpu_count()
+    fused: bool
+        True to crop, background-subtract, binarize, and measure each frame in
+        memory and write the csv of D/D0 vs. time directly, skipping the
+        round-trip through binary images saved on disk. False to save binary
+        images and then read them back to produce the csv.
+        Default is False.
+    save_bin: bool
+        True to save binary images when fused is True (i.e. as a
+        troubleshooting output). Binary images are always saved when fused is
+        False.
+        Default is False.
+    streaming_median: bool
+        True to find the median of the background video with a fixed memory
+        ceiling (two passes over the video). Requires integer images of at
+        most 12 bits, and raises a ValueError for larger values. False to
+        load all cropped background frames at once.
+        Default is False.
+    reader: string
+        "skimage" to read TIFF frames through skimage's tifffile plugin, or
+        "memmap" to memory-map uncompressed TIFF frames.
+        Default is "skimage".
+    bin_format: string
+        "png" to save binary images as one .png per frame, or "packed" to
+        save them as one bit-packed binary stack file per video.
+        Default is "png".
+    intermediate_format: string
+        "tiff" to save cropped and background-subtracted images as one TIFF
+        per frame, or "stack" to save them as one multi-page TIFF per video.
+        Default is "tiff".
+    intermediate_compression: string
+        Lossless compression used by tifffile for intermediate stacks (e.g.
+        "zlib"), or None for uncompressed stacks.
+        Default is None.
+    frame_threads: int
+        Number of threads converting frames of each video at once. The number
+        of videos processed at once is reduced to keep the total number of
+        workers within cpu_count.
+        Default is 1.
+    async_write: bool
+        True to save individual images (binary, cropped, and
+        background-subtracted) on background threads with a bounded queue, so
+        processing does not wait for each image to be written.
+        Default is False.
+    write_threads: int
+        Number of background threads saving images if async_write is True.
+        Default is 2.
+    prefetch_depth: int
+        Number of frames read and decoded ahead on a background thread while
+        frames are processed. 0 to turn off reading ahead for
+        memory-constrained runs.
+        Default is 4.
+    stop_after_breakup: int
+        Number of consecutive frames with a minimum diameter of 0 (a broken
+        liquid bridge) after which the rest of the video is not processed,
+        when fused is True. 0 to process every frame.
+        Default is 0.
+    frame_step: int
+        For screening runs, processes every frame_step-th frame first, then
+        every frame in the region where D/D0 passes through tc_bounds and
+        fitting_bounds. Frames outside that region are skipped. 1 to process
+        every frame.
+        Default is 1.
+    use_cache: bool
+        True to keep a cache manifest in each video's images folder, keyed
+        on the video files and the settings that change each output. Stages
+        are skipped only if their key matches, and recomputed otherwise
+        (replacing skip_existing).
+        Default is False.
+    cache_digest: bool
+        True to identify video files in cache keys by a digest of their
+        contents, rather than their size and modification time.
+        Default is False.
+    resume: bool
+        True to continue videos interrupted partway through (e.g. by a
+        preempted job) from the last frame recorded in their progress file,
+        rather than converting them again from the start.
+        Default is False.
+    task_frames: int
+        Number of frames in each task sent to the pool of worker processes.
+        Above 0, each video is split into ranges of task_frames frames that
+        any idle worker can convert, so long videos do not keep one worker
+        busy after the others finish. Only used when no per-video stacks are
+        saved and frame_step, stop_after_breakup, use_cache, and resume are
+        at their defaults. 0 to send whole videos.
+        Default is 0.
+    max_memory: int
+        Memory budget in bytes for the tasks running in the pool at once.
+        Each task's peak memory is estimated from the frame shape and dtype
+        and the number of background frames, read from the video headers,
+        and tasks wait to start until their estimate fits in the budget.
+        0 for no budget.
+        Default is 0.
+    shard_index: int
+        Index of the shard of videos processed by this job, from 0 to
+        shard_count - 1 (see folder.select_shard).
+        Default is 0.
+    shard_count: int
+        Number of shards the videos are split into, e.g. the number of tasks
+        in a cluster array job. Above 1, each job only processes its shard
+        into csvs, and summaries are made once every shard is finished with
+        merge_shards.
+        Default is 1.
+    executor: string
+        Kind of pool the pipeline runs its tasks in (see
+        executor.make_pool): "process" (multiprocessing with the default
+        start method), "fork", "forkserver", or "spawn" (multiprocessing with
+        that start method), "thread" (threads in one process), "serial" (one
+        task at a time in the calling process, for debugging and profiling),
+        or "loky" (loky's reusable pool of processes, if loky is installed).
+        Default is "process".
+    profile: bool
+        True to time each stage, each video's steps in the workers, and the
+        phases of converting frames (see profiling), and save a report of
+        where the time went as a json file in summary_folder.
+        Default is False.
+    profile_trace: bool
+        True to also save a Chrome trace of every timed event in
+        summary_folder when profile is True, to open in chrome://tracing or
+        https://ui.perfetto.dev.
+        Default is False.
     """
 
     settings = {}
@@ -195,8 +333,248 @@ def set_defaults(optional_settings: dict = {}) -> dict:
         settings["cpu_count"] = optional_settings["cpu_count"]
     except KeyError:
         settings["cpu_count"] = os.cpu_count()
+    try:
+        settings["fused"] = optional_settings["fused"]
+    except KeyError:
+        settings["fused"] = False
+    try:
+        settings["save_bin"] = optional_settings["save_bin"]
+    except KeyError:
+        settings["save_bin"] = False
+    try:
+        settings["streaming_median"] = optional_settings["streaming_median"]
+    except KeyError:
+        settings["streaming_median"] = False
+    try:
+        settings["reader"] = optional_settings["reader"]
+    except KeyError:
+        settings["reader"] = "skimage"
+    try:
+        settings["bin_format"] = optional_settings["bin_format"]
+    except KeyError:
+        settings["bin_format"] = "png"
+    try:
+        settings["intermediate_format"] = optional_settings["intermediate_format"]
+    except KeyError:
+        settings["intermediate_format"] = "tiff"
+    try:
+        settings["intermediate_compression"] = optional_settings["intermediate_compression"]
+    except KeyError:
+        settings["intermediate_compression"] = None
+    try:
+        settings["frame_threads"] = optional_settings["frame_threads"]
+    except KeyError:
+        settings["frame_threads"] = 1
+    try:
+        settings["async_write"] = optional_settings["async_write"]
+    except KeyError:
+        settings["async_write"] = False
+    try:
+        settings["write_threads"] = optional_settings["write_threads"]
+    except KeyError:
+        settings["write_threads"] = 2
+    try:
+        settings["prefetch_depth"] = optional_settings["prefetch_depth"]
+    except KeyError:
+        settings["prefetch_depth"] = 4
+    try:
+        settings["stop_after_breakup"] = optional_settings["stop_after_breakup"]
+    except KeyError:
+        settings["stop_after_breakup"] = 0
+    try:
+        settings["frame_step"] = optional_settings["frame_step"]
+    except KeyError:
+        settings["frame_step"] = 1
+    try:
+        settings["use_cache"] = optional_settings["use_cache"]
+    except KeyError:
+        settings["use_cache"] = False
+    try:
+        settings["cache_digest"] = optional_settings["cache_digest"]
+    except KeyError:
+        settings["cache_digest"] = False
+    try:
+        settings["resume"] = optional_settings["resume"]
+    except KeyError:
+        settings["resume"] = False
+    try:
+        settings["task_frames"] = optional_settings["task_frames"]
+    except KeyError:
+        settings["task_frames"] = 0
+    try:
+        settings["max_memory"] = optional_settings["max_memory"]
+    except KeyError:
+        settings["max_memory"] = 0
+    try:
+        settings["shard_index"] = optional_settings["shard_index"]
+    except KeyError:
+        settings["shard_index"] = 0
+    try:
+        settings["shard_count"] = optional_settings["shard_count"]
+    except KeyError:
+        settings["shard_count"] = 1
+    try:
+        settings["executor"] = optional_settings["executor"]
+    except KeyError:
+        settings["executor"] = "process"
+    try:
+        settings["profile"] = optional_settings["profile"]
+    except KeyError:
+        settings["profile"] = False
+    try:
+        settings["profile_trace"] = optional_settings["profile_trace"]
+    except KeyError:
+        settings["profile_trace"] = False
     return settings
 
+def video_process_count(optional_settings: dict = {}) -> int:
+    """
+    Finds the number of videos to process at once within the worker budget.
+
+    Each video process uses frame_threads threads, so the number of
+    processes is cpu_count divided by frame_threads (at least 1).
+
+    Parameters
+    ----------
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    cpu_count: int
+        How many cores to use for multithreading/multiprocessing. If nothing
+        provided, default will be the maximum number of cores returned from
+        os.cpu_count()
+    frame_threads: int
+        Number of threads converting frames of each video at once.
+        Default is 1.
+
+    Returns
+    -------
+    process_count: int
+        Number of processes to use for processing videos.
+    """
+
+    settings = set_defaults(optional_settings)
+    cpu_count = settings["cpu_count"]
+    frame_threads = settings["frame_threads"]
+
+    process_count = max(1, cpu_count // max(1, frame_threads))
+    return process_count
+
+# Modules imported by warm_worker in each worker of a pipeline pool.
+WARM_MODULES = ["skimage.color", "skimage.filters", "skimage.io", "skimage.morphology", "skimage.util",
+                "tifffile", "holoviews"]
+
+def warm_worker() -> None:
+    """
+    Imports the modules in WARM_MODULES.
+
+    Used as the initializer of the workers of pipeline_pool, so each worker
+    imports skimage and holoviews once when it starts instead of during the
+    first video it processes.
+    """
+
+    for module in WARM_MODULES:
+        importlib.import_module(module)
+    pass
+
+@contextlib.contextmanager
+def pipeline_pool(optional_settings: dict = {}) -> typing.Iterator[multiprocessing.pool.Pool]:
+    """
+    Creates a pool of workers to share between pipeline stages.
+
+    The pool has video_process_count(optional_settings) workers of the kind
+    selected by executor (see executor.make_pool), each warmed by
+    warm_worker. Pass the pool to videos_to_binaries, binaries_to_csvs,
+    videos_to_csvs, or videos_to_summaries to reuse the same workers for
+    every stage. The workers are shut down when the with block ends: the
+    pool is closed and joined if the block finishes, and terminated if it
+    raises.
+
+    ex. with pipeline_pool(optional_settings) as pool:
+            videos_to_binaries(videos_folder, images_folder, fname_format,
+                               optional_settings, pool=pool)
+
+    Parameters
+    ----------
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    cpu_count: int
+        How many cores to use for multithreading/multiprocessing. If nothing
+        provided, default will be the maximum number of cores returned from
+        os.cpu_count()
+    frame_threads: int
+        Number of threads converting frames of each video at once. The pool
+        has cpu_count // frame_threads workers.
+        Default is 1.
+    executor: string
+        Kind of pool, one of executor.EXECUTORS.
+        Default is "process".
+
+    Returns
+    -------
+    pool: multiprocessing.pool.Pool
+        Pool of warmed workers, or an executor.SerialPool or
+        executor.FuturesPool with the same methods.
+    """
+
+    settings = set_defaults(optional_settings)
+    pool = executor.make_pool(settings["executor"], video_process_count(optional_settings), warm_worker)
+    try:
+        yield pool
+    except BaseException:
+        pool.terminate()
+        pool.join()
+        raise
+    else:
+        pool.close()
+        pool.join()
+
+def pool_starmap(function: typing.Callable, arguments: typing.Iterable,
+                 pool: typing.Optional[multiprocessing.pool.Pool] = None, optional_settings: dict = {}) -> list:
+    """
+    Runs function on each tuple of arguments in pool.
+
+    If pool is None, a pipeline_pool is created for this call only and shut
+    down before returning.
+
+    Parameters
+    ----------
+    function: callable
+        Function to run, defined at the top level of a module so it can be
+        sent to worker processes.
+    arguments: iterable of tuples
+        Arguments of each call of function.
+    pool: multiprocessing.pool.Pool or None, optional
+        Pool to run function in, e.g. from pipeline_pool.
+        Default is None.
+    optional_settings: dict
+        A dictionary of optional settings, used to create the pool if pool
+        is None.
+
+    Returns
+    -------
+    results: list
+        Results of each call of function, in the order of arguments.
+    """
+
+    settings = set_defaults(optional_settings)
+
+    if pool is None:
+        with pipeline_pool(optional_settings) as stage_pool:
+            return pool_starmap(function, arguments, stage_pool, optional_settings)
+    if not settings["profile"]:
+        return pool.starmap(function, arguments)
+    timing = task_timing(function.__name__)
+    outcomes = pool.starmap(measured_task, [(function, task_arguments, timing) for task_arguments in arguments])
+    for result, pid, peak, events in outcomes:
+        profiling.add_events(events)
+    return [outcome[0] for outcome in outcomes]
+
 def multiprocess_vid_to_bin(file_number: int, fnames: list, exp_videos: list, bg_videos: list,
                             images_folder: typing.Union[str, bytes, os.PathLike], tic: float,
                             optional_settings: dict = {}) -> None:
@@ -352,9 +730,85 @@ def multiprocess_binaries_to_csvs(subfolder_index: int, subfolders: list,
     pass
 
 
+def multiprocess_vid_to_csv(file_number: int, fnames: list, exp_videos: list, bg_videos: list,
+                            images_folder: typing.Union[str, bytes, os.PathLike],
+                            csv_folder: typing.Union[str, bytes, os.PathLike],
+                            short_fname_format: str, tic: float, optional_settings: dict = {}) -> None:
+    """
+    Converts a matched pair of videos directly into a csv of D/D0 vs. time.
+
+    Fused alternative to multiprocess_vid_to_bin followed by
+    multiprocess_binaries_to_csvs, measuring each frame in memory instead of
+    saving and reloading binary images.
+
+    For multiprocessing to work properly, the function that invokes the pool
+    of processors and the function that uses them need to be defined separately.
+    Thus, this function is here, and is called in videos_to_csvs.
+
+    Parameters
+    ----------
+    file_number: int
+        Index to keep track of which folder or video we are processing
+    fnames: list of strings
+        List of base folder names for each matched pair of experimental and
+        background folders.
+    exp_videos: list of paths
+        List of paths to experimental video folders that were matched with
+        backgrounds.
+    bg_videos: list of paths
+        List of paths to background video folders matched with exp_videos.
+    images_folder: path-like
+        Path to a folder in which to save the image parameters and optional
+        binary, cropped, and background-subtracted images.
+    csv_folder: path-like
+        Path to a folder in which to save the csv containing D/D0 vs. time.
+    short_fname_format: str
+        The format of the fname with parameter names separated
+        by the deliminator specified by fname_split with "vtype" and "remove"
+        tags removed. Must contain "fps" tag.
+        ex. "date_sampleinfo_fps_run"
+    tic: float
+        Stores the time that the processing began at. Used in verbose mode
+        to determine how long processing takes.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    verbose: bool
+        Determines whether processing functions print statements as they
+        progress through major steps. True to see print statements, False to
+        hide non-errors/warnings.
+        Default is False.
+    fname_split: string
+        The deliminator for splitting folder/file names, used in fname_format.
+        Default is "_".
+    save_bin: bool
+        True to save binary images as well.
+        Default is False.
+    """
+
+    settings = set_defaults(optional_settings)
+    verbose = settings["verbose"]
+    j = file_number + 1
+    if verbose:
+        print("Processing video " + str(j) + "/" + str(len(fnames)) + ".")
+    fname = fnames[file_number]
+    params_dict = tags.parse_fname(fname,short_fname_format,"",optional_settings)
+    img_folder = os.path.join(images_folder,fname)
+    if not os.path.isdir(img_folder):
+        os.mkdir(img_folder)
+    th.tiffs_to_csv(exp_videos[file_number],bg_videos[file_number],img_folder,csv_folder,params_dict["fps"],optional_settings)
+    if verbose:
+        toc = time.time()
+        print("Video " + str(j)+ " processed to csv." +" (" +str(j) + "/" + str(len(fnames))+")")
+        print("Time elapsed (videos to csvs): " + str(np.round((toc-tic))) + " seconds")
+    pass
+
 def videos_to_binaries(videos_folder: typing.Union[str, bytes, os.PathLike],
                        images_folder: typing.Union[str, bytes, os.PathLike],
-                       fname_format: str, optional_settings: dict = {}):
+                       fname_format: str, optional_settings: dict = {},
+                       pool: typing.Optional[multiprocessing.pool.Pool] = None):
     """
     Converts videos in given folder into binary images.
 
@@ -380,6 +834,11 @@ def videos_to_binaries(videos_folder: typing.Union[str, bytes, os.PathLike],
         separated by the deliminator specified by sample_split.
     optional_settings: dict
         A dictionary of optional settings.
+    pool: multiprocessing.pool.Pool or None, optional
+        Pool of worker processes to use, e.g. from pipeline_pool, so the
+        same workers are reused between stages. None to create a pool for
+        this call only.
+        Default is None.
 
     Optional Settings and Defaults
     ------------------------------
@@ -392,6 +851,30 @@ def videos_to_binaries(videos_folder: typing.Union[str, bytes, os.PathLike],
         How many cores to use for multithreading/multiprocessing. If nothing
         provided, default will be the maximum number of cores returned from
         os.cpu_count()
+    frame_threads: int
+        Number of threads converting frames of each video at once. Videos are
+        processed cpu_count // frame_threads at a time.
+        Default is 1.
+    task_frames: int
+        Number of frames in each task sent to the pool, so ranges of long
+        videos are converted by several workers at once. 0 to send whole
+        videos.
+        Default is 0.
+    max_memory: int
+        Memory budget in bytes for the tasks running in the pool at once. 0
+        for no budget.
+        Default is 0.
+    shard_index: int
+        Index of the shard of videos to process, from 0 to shard_count - 1.
+        Default is 0.
+    shard_count: int
+        Number of shards the videos are split into (see
+        folder.select_shard).
+        Default is 1.
+    profile: bool
+        True to time each stage and step (see profiling). The report is
+        saved by save_profile.
+        Default is False.
     experiment_tag: string
         The tag for identifying experimental videos. May be empty ("").
         Default is "exp".
@@ -422,28 +905,24 @@ def videos_to_binaries(videos_folder: typing.Union[str, bytes, os.PathLike],
     """
     settings = set_defaults(optional_settings)
     verbose = settings["verbose"]
-    cpu_count = settings["cpu_count"]
-    pool = multiprocessing.Pool(cpu_count)
 
     fnames, exp_videos, bg_videos = folder.select_video_folders(videos_folder, fname_format, optional_settings)
+    fnames, exp_videos, bg_videos = folder.select_shard(fnames, exp_videos, bg_videos, optional_settings)
 
-    vid_to_bin_arguments = ((file_number, fnames, exp_videos, bg_videos, images_folder, tic, optional_settings) for file_number in range(0,len(fnames)))
-    tic = time.time()
     if verbose:
         print("Processing " + str(len(fnames)) + " videos.")
-        pool.starmap(multiprocess_vid_to_bin, vid_to_bin_arguments)
-        pool.close()
+    with profiling.timer("videos_to_binaries", settings["profile"]):
+        schedule_video_steps(fnames, exp_videos, bg_videos, images_folder, optional_settings=optional_settings,
+                             pool=pool, last_step="bin")
+    if verbose:
         print("Finished processing videos into binaries.")
-    else:
-        pool.starmap(multiprocess_vid_to_bin, vid_to_bin_arguments)
-        pool.close()
-
     pass
 
 def binaries_to_csvs(images_folder: typing.Union[str, bytes, os.PathLike],
                      csv_folder: typing.Union[str, bytes, os.PathLike],
                      summary_folder: typing.Union[str, bytes, os.PathLike],
-                     short_fname_format: str, sampleinfo_format: str, optional_settings: dict = {}):
+                     short_fname_format: str, sampleinfo_format: str, optional_settings: dict = {},
+                     pool: typing.Optional[multiprocessing.pool.Pool] = None):
     """
     Converts binary image folders into csvs of D/D0 vs. time.
 
@@ -466,6 +945,11 @@ def binaries_to_csvs(images_folder: typing.Union[str, bytes, os.PathLike],
         ex. "date_sampleinfo_fps_run"
     optional_settings: dict
         A dictionary of optional settings.
+    pool: multiprocessing.pool.Pool or None, optional
+        Pool of worker processes to use, e.g. from pipeline_pool, so the
+        same workers are reused between stages. None to create a pool for
+        this call only.
+        Default is None.
 
     Optional Settings and Defaults
     ------------------------------
@@ -480,54 +964,150 @@ def binaries_to_csvs(images_folder: typing.Union[str, bytes, os.PathLike],
     """
     settings = set_defaults(optional_settings)
     verbose = settings["verbose"]
-    cpu_count = settings["cpu_count"]
-    pool = multiprocessing.Pool(cpu_count)
 
     if not os.path.isdir(csv_folder):
         os.mkdir(csv_folder)
 
     subfolders = [ f.name for f in os.scandir(images_folder) if f.is_dir()]
+    tic = time.time()
     bin_to_csv_arguments = ((subfolder_index, subfolders, images_folder, csv_folder, short_fname_format, tic,
                              optional_settings) for subfolder_index in range(0,len(subfolders)))
-    tic = time.time()
 
     if verbose:
         print("Processing " + str(len(subfolders)) + " binary folders.")
-        pool.starmap(multiprocess_binaries_to_csvs, bin_to_csv_arguments)
-        pool.close()
+    with profiling.timer("binaries_to_csvs", settings["profile"]):
+        pool_starmap(multiprocess_binaries_to_csvs, bin_to_csv_arguments, pool, optional_settings)
+    if verbose:
         print("Finished processing binaries into csvs of D/D0 versus time.")
-    else:
-        pool.starmap(multiprocess_binaries_to_csvs, bin_to_csv_arguments)
-        pool.close()
+
+    csvs_to_raw_figure(csv_folder, summary_folder, short_fname_format, sampleinfo_format, optional_settings)
+    save_profile(summary_folder, optional_settings)
+    pass
+
+def unmatched_binaries_to_csvs(videos_folder: typing.Union[str, bytes, os.PathLike],
+                               images_folder: typing.Union[str, bytes, os.PathLike],
+                               csv_folder: typing.Union[str, bytes, os.PathLike],
+                               short_fname_format: str, fname_format: str, optional_settings: dict = {},
+                               pool: typing.Optional[multiprocessing.pool.Pool] = None):
+    """
+    Converts the binaries of folders in images_folder that do not belong to
+    a video in videos_folder into csvs of D/D0 vs. time.
+
+    stream_videos_to_csvs only saves csvs for the videos it finds, so this
+    picks up binaries left in images_folder by earlier or separate runs, as
+    binaries_to_csvs does for every folder.
+
+    Parameters
+    ----------
+    videos_folder: path-like
+        Path to a folder of experimental and background video folders.
+    images_folder: path-like
+        Path to a folder of folders of binary images, one per video.
+    csv_folder: path-like
+        Path to a folder in which to save the csv containing D/D0 vs. time.
+    short_fname_format: str
+        fname_format with the "vtype" and "remove" tags removed.
+    fname_format: str
+        The format of the fname with parameter names separated
+        by the deliminator specified by fname_split. Must contain the "vtype"
+        and "fps" tags.
+        ex. "date_sampleinfo_fps_run_vtype_remove_remove"
+    optional_settings: dict
+        A dictionary of optional settings.
+    pool: multiprocessing.pool.Pool or None, optional
+        Pool of worker processes to use, e.g. from pipeline_pool. None to
+        create a pool for this call only.
+        Default is None.
+
+    Optional Settings and Defaults
+    ------------------------------
+    verbose: bool
+        Determines whether processing functions print statements as they
+        progress through major steps. True to see print statements, False to
+        hide non-errors/warnings.
+        Default is False.
+    """
+
+    settings = set_defaults(optional_settings)
+    verbose = settings["verbose"]
+
+    fnames, exp_videos, bg_videos = folder.select_video_folders(videos_folder, fname_format, optional_settings)
+    subfolders = [f.name for f in os.scandir(images_folder) if f.is_dir() and f.name not in fnames]
+    if subfolders == []:
+        return
+    tic = time.time()
+    bin_to_csv_arguments = ((subfolder_index, subfolders, images_folder, csv_folder, short_fname_format, tic,
+                             optional_settings) for subfolder_index in range(0,len(subfolders)))
+    if verbose:
+        print("Processing " + str(len(subfolders)) + " binary folders without videos.")
+    pool_starmap(multiprocess_binaries_to_csvs, bin_to_csv_arguments, pool, optional_settings)
+    pass
+
+def csvs_to_raw_figure(csv_folder: typing.Union[str, bytes, os.PathLike],
+                       summary_folder: typing.Union[str, bytes, os.PathLike],
+                       short_fname_format: str, sampleinfo_format: str, optional_settings: dict = {}):
+    """
+    Plots the raw D/D0 vs. time data from all csvs in csv_folder.
+
+    Parameters
+    ----------
+    csv_folder: path-like
+        Path to a folder in which to find the csv containing D/D0 vs. time.
+    summary_folder: path-like
+        Path to a folder in which to save the figure.
+    short_fname_format: str
+        The format of the fname with parameter names separated
+        by the deliminator specified by fname_split with "vtype" and "remove"
+        tags removed.
+        ex. "date_sampleinfo_fps_run"
+    sampleinfo_format: str
+        The format of the sampleinfo section of the fname
+        separated by the deliminator specified by sample_split.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Raises
+    ------
+    FileNotFoundError
+        If there are no csvs in csv_folder.
+    """
+
+    settings = set_defaults(optional_settings)
 
     df_list = []
     csvs = dpcsv.get_csvs(csv_folder)
     if len(csvs) == 0:
         raise FileNotFoundError("No CSVs found in csv_folder to process (no binaries were processed.)")
 
-    # Runs the processing for each csv in the folder.
-    for csv in csvs:
-        sample_df = dpcsv.csv_to_dataframe(csv,short_fname_format,sampleinfo_format,optional_settings)
-        df_list.append(sample_df)
-    df = pd.concat(df_list, ignore_index=True)
+    with profiling.timer("csvs_to_raw_figure", settings["profile"]):
+        # Runs the processing for each csv in the folder.
+        for csv in csvs:
+            sample_df = dpcsv.csv_to_dataframe(csv,short_fname_format,sampleinfo_format,optional_settings)
+            df_list.append(sample_df)
+        df = pd.concat(df_list, ignore_index=True)
 
-    plot_normalized = False
-    time_layout = figures.layout_time_csvs(df, plot_normalized)
-    figures.save_figure(time_layout,'_raw',summary_folder, optional_settings)
+        plot_normalized = False
+        time_layout = figures.layout_time_csvs(df, plot_normalized)
+        figures.save_figure(time_layout,'_raw',summary_folder, optional_settings)
     pass
 
 def videos_to_csvs(videos_folder: typing.Union[str, bytes, os.PathLike],
                    images_folder: typing.Union[str, bytes, os.PathLike],
                    csv_folder: typing.Union[str, bytes, os.PathLike],
                    summary_folder: typing.Union[str, bytes, os.PathLike],
-                   fname_format: str, sampleinfo_format: str, optional_settings: dict = {}):
+                   fname_format: str, sampleinfo_format: str, optional_settings: dict = {},
+                   pool: typing.Optional[multiprocessing.pool.Pool] = None):
     """
     Converts videos in given folder into csvs of D/D0 vs. time.
 
     Matches videos in videos_folder into experimental and background pairs,
     converts those paired videos into background-subtracted binaries,
     analyzes the resulting binaries to extract D/D0 vs. time, and
-    saves the results to csvs.
+    saves the results to csvs. Each video's binaries are analyzed as soon as
+    that video is converted (see stream_videos_to_csvs). Unless fused is True
+    or the videos are split into shards, binaries already in images_folder
+    without a video in videos_folder are also saved to csvs (see
+    unmatched_binaries_to_csvs).
 
     Parameters
     ----------
@@ -548,6 +1128,11 @@ def videos_to_csvs(videos_folder: typing.Union[str, bytes, os.PathLike],
         ex. "date_sampleinfo_fps_run_vtype_remove_remove"
     optional_settings: dict
         A dictionary of optional settings.
+    pool: multiprocessing.pool.Pool or None, optional
+        Pool of worker processes to use, e.g. from pipeline_pool, so the
+        same workers are reused between stages. None to create a pool for
+        this call only.
+        Default is None.
 
     Optional Settings and Defaults
     ------------------------------
@@ -586,17 +1171,504 @@ def videos_to_csvs(videos_folder: typing.Union[str, bytes, os.PathLike],
     image_extension: string
         The extension for images in the video folder. TIFF recommended.
         Default is "tif". Do not include ".".
+    fused: bool
+        True to measure each frame in memory and write the csvs directly,
+        skipping saving and reloading binary images.
+        Default is False.
+    save_bin: bool
+        True to save binary images when fused is True.
+        Default is False.
+    stop_after_breakup: int
+        Number of consecutive frames with a minimum diameter of 0 after
+        which the rest of each video is not processed, when fused is True.
+        0 to process every frame.
+        Default is 0.
+    shard_index: int
+        Index of the shard of videos to process, from 0 to shard_count - 1.
+        Default is 0.
+    shard_count: int
+        Number of shards the videos are split into (see
+        folder.select_shard). Above 1, the raw figure is not saved; it is
+        saved by merge_shards.
+        Default is 1.
+    profile: bool
+        True to time each stage and step (see profiling). The report is
+        saved by save_profile.
+        Default is False.
     """
 
-    videos_to_binaries(videos_folder,images_folder, fname_format, optional_settings)
+    settings = set_defaults(optional_settings)
+    shard_count = settings["shard_count"]
+
     short_fname_format = tags.shorten_fname_format(fname_format, optional_settings)
-    binaries_to_csvs(images_folder,csv_folder,summary_folder, short_fname_format,sampleinfo_format, optional_settings)
+    with profiling.timer("videos_to_csvs", settings["profile"]):
+        stream_videos_to_csvs(videos_folder, images_folder, csv_folder, short_fname_format, fname_format,
+                              sampleinfo_format, optional_settings, pool)
+        if shard_count == 1:
+            # With shards, the csv folder is only complete once every shard
+            # is finished (see merge_shards).
+            if not settings["fused"]:
+                unmatched_binaries_to_csvs(videos_folder, images_folder, csv_folder, short_fname_format,
+                                           fname_format, optional_settings, pool)
+            csvs_to_raw_figure(csv_folder, summary_folder, short_fname_format, sampleinfo_format, optional_settings)
+    save_profile(summary_folder, optional_settings)
     pass
 
+def stream_videos_to_csvs(videos_folder: typing.Union[str, bytes, os.PathLike],
+                          images_folder: typing.Union[str, bytes, os.PathLike],
+                          csv_folder: typing.Union[str, bytes, os.PathLike],
+                          short_fname_format: str, fname_format: str, sampleinfo_format: str,
+                          optional_settings: dict = {}, pool: typing.Optional[multiprocessing.pool.Pool] = None,
+                          process_csvs: bool = False) -> dict:
+    """
+    Converts videos in given folder into csvs of D/D0 vs. time, starting
+    each video's next step as soon as its previous step finishes.
+
+    Each video is converted to binary images (multiprocess_vid_to_bin), then
+    to a csv (multiprocess_binaries_to_csvs), and, if process_csvs is True,
+    the csv is processed for fitting (csv.process_csv). Each step is queued
+    in the pool as soon as the same video finishes the step before, so
+    workers start measuring diameters of finished videos while other videos
+    are still being binarized instead of waiting for every video to finish.
+    If fused is True, the first two steps are one step
+    (multiprocess_vid_to_csv).
+
+    Parameters
+    ----------
+    videos_folder: path-like
+        Path to a folder of experimental and background video folders.
+    images_folder: path-like
+        Path to a folder in which to save the results of image processing,
+        binaries and optional cropped and background-subtracted images.
+    csv_folder: path-like
+        Path to a folder in which to save the csv containing D/D0 vs. time.
+    short_fname_format: str
+        fname_format with the "vtype" and "remove" tags removed.
+    fname_format: str
+        The format of the fname with parameter names separated
+        by the deliminator specified by fname_split. Must contain the "vtype"
+        and "fps" tags.
+        ex. "date_sampleinfo_fps_run_vtype_remove_remove"
+    sampleinfo_format: str
+        The format of the sampleinfo section of the fname
+        separated by the deliminator specified by sample_split.
+    optional_settings: dict
+        A dictionary of optional settings.
+    pool: multiprocessing.pool.Pool or None, optional
+        Pool of worker processes to use, e.g. from pipeline_pool. None to
+        create a pool for this call only.
+        Default is None.
+    process_csvs: bool, optional
+        True to also process each csv for fitting once it is saved.
+        Default is False.
+
+    Optional Settings and Defaults
+    ------------------------------
+    verbose: bool
+        Determines whether processing functions print statements as they
+        progress through major steps. True to see print statements, False to
+        hide non-errors/warnings.
+        Default is False.
+    fused: bool
+        True to measure each frame in memory and write the csvs directly,
+        skipping saving and reloading binary images.
+        Default is False.
+    shard_index: int
+        Index of the shard of videos to process, from 0 to shard_count - 1.
+        Default is 0.
+    shard_count: int
+        Number of shards the videos are split into (see
+        folder.select_shard).
+        Default is 1.
+    profile: bool
+        True to time each stage and step (see profiling). The report is
+        saved by save_profile.
+        Default is False.
+
+    Returns
+    -------
+    processed_dfs: dict
+        Dataframes returned by csv.process_csv, keyed by the absolute path of
+        their csv, for use in csv.generate_df. Empty if process_csvs is False.
+    """
+
+    settings = set_defaults(optional_settings)
+    verbose = settings["verbose"]
+
+    if not os.path.isdir(csv_folder):
+        os.mkdir(csv_folder)
+
+    fnames, exp_videos, bg_videos = folder.select_video_folders(videos_folder, fname_format, optional_settings)
+    fnames, exp_videos, bg_videos = folder.select_shard(fnames, exp_videos, bg_videos, optional_settings)
+
+    if verbose:
+        print("Processing " + str(len(fnames)) + " videos.")
+    last_step = "processed" if process_csvs else "csv"
+    with profiling.timer("stream_videos_to_csvs", settings["profile"]):
+        processed_dfs = schedule_video_steps(fnames, exp_videos, bg_videos, images_folder, csv_folder,
+                                             short_fname_format, sampleinfo_format, optional_settings, pool, last_step)
+    if verbose:
+        print("Finished processing videos into csvs of D/D0 versus time.")
+    return processed_dfs
+
+def peak_memory() -> typing.Optional[int]:
+    """
+    Finds the peak resident memory of the current process so far.
+
+    Returns
+    -------
+    peak_memory: int or None
+        Peak resident memory in bytes, or None where the resource module is
+        not available (Windows).
+    """
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    if sys.platform != "darwin":
+        peak = peak * 1024
+    return peak
+
+def task_timing(name: str, args: dict = {}) -> dict:
+    """
+    Describes how measured_task should time a task sent from this thread.
+
+    Parameters
+    ----------
+    name: str
+        Name of the task's event, e.g. the step.
+    args: dict, optional
+        Details to save with the event, e.g. the fname of the video.
+        Default is {}.
+
+    Returns
+    -------
+    timing: dict
+        The name and args of the event, the timers running in this thread
+        ("parents") to nest it in, and the ID of this process ("pid").
+    """
+
+    return {"name": name, "args": args, "parents": profiling.current_path(), "pid": os.getpid()}
+
+def measured_task(function: typing.Callable, arguments: tuple, timing: typing.Optional[dict] = None) -> tuple:
+    """
+    Runs function(*arguments) in a worker, reporting the worker's memory and
+    the events it timed.
+
+    Parameters
+    ----------
+    function: callable
+        Function to run.
+    arguments: tuple
+        Arguments of function.
+    timing: dict or None, optional
+        Event to time the task as, from task_timing. None to not time it.
+        Default is None.
+
+    Returns
+    -------
+    result:
+        The result of function.
+    pid: int
+        Process ID of the worker.
+    peak: int or None
+        Peak resident memory of the worker so far, from peak_memory.
+    events: list of dicts
+        Events timed by the task (see profiling.drain_events), if it ran in
+        another process than the one that sent it. Otherwise empty, as the
+        events are already recorded in that process.
+    """
+
+    if timing is None:
+        return function(*arguments), os.getpid(), peak_memory(), []
+    with profiling.nested(timing["parents"]):
+        with profiling.timer(timing["name"], **timing["args"]):
+            result = function(*arguments)
+    events = []
+    if os.getpid() != timing["pid"]:
+        events = profiling.drain_events()
+    return result, os.getpid(), peak_memory(), events
+
+def schedule_video_steps(fnames: list, exp_videos: list, bg_videos: list,
+                         images_folder: typing.Union[str, bytes, os.PathLike],
+                         csv_folder: typing.Optional[typing.Union[str, bytes, os.PathLike]] = None,
+                         short_fname_format: str = "", sampleinfo_format: str = "", optional_settings: dict = {},
+                         pool: typing.Optional[multiprocessing.pool.Pool] = None, last_step: str = "csv") -> dict:
+    """
+    Runs the steps of processing each matched pair of videos in pool,
+    queueing each step as soon as the step before it finishes.
+
+    Steps for each video are, in order, "bin" (binary images), "csv" (csv of
+    D/D0 vs. time), and "processed" (csv.process_csv), up to last_step. If
+    fused is True and last_step is not "bin", "bin" and "csv" are one step.
+
+    If task_frames is above 0 (see tiff_handling.video_chunks_supported),
+    each video is instead prepared once in a worker
+    (tiff_handling.prepare_video_chunks), then split into ranges of
+    task_frames frames (tiff_handling.convert_video_chunk). All ranges of all
+    videos share the pool's queue, so idle workers take the next range
+    whichever video it belongs to. Once every range of a video is converted,
+    the diameters are joined in frame order and the video is finished here
+    (tiff_handling.finish_video_chunks). Each video's background is published
+    once in shared memory (shared_arrays.SharedArrayRegistry), so the tasks
+    converting its ranges receive a small handle instead of a copy of the
+    background, and the shared memory is freed as soon as the video is
+    finished.
+
+    Parameters
+    ----------
+    fnames: list of strings
+        List of base folder names for each matched pair of experimental and
+        background folders, as returned by folder.select_video_folders.
+    exp_videos: list of paths
+        List of paths to experimental video folders that were matched with
+        backgrounds.
+    bg_videos: list of paths
+        List of paths to background video folders matched with exp_videos.
+    images_folder: path-like
+        Path to a folder in which to save the results of image processing.
+    csv_folder: path-like, optional
+        Path to a folder in which to save the csvs containing D/D0 vs. time.
+        Not used if last_step is "bin".
+        Default is None.
+    short_fname_format: str, optional
+        fname_format with the "vtype" and "remove" tags removed. Must contain
+        "fps" tag. Not used if last_step is "bin".
+        Default is "".
+    sampleinfo_format: str, optional
+        The format of the sampleinfo section of the fname. Only used if
+        last_step is "processed".
+        Default is "".
+    optional_settings: dict
+        A dictionary of optional settings.
+    pool: multiprocessing.pool.Pool or None, optional
+        Pool of worker processes to use, e.g. from pipeline_pool. None to
+        create a pool for this call only.
+        Default is None.
+    last_step: string, optional
+        "bin", "csv", or "processed".
+        Default is "csv".
+
+    Optional Settings and Defaults
+    ------------------------------
+    fused: bool
+        True to measure each frame in memory and write the csvs directly,
+        skipping saving and reloading binary images.
+        Default is False.
+    task_frames: int
+        Number of frames in each task sent to the pool. 0 to send whole
+        videos. Warns and sends whole videos if other settings prevent
+        converting ranges of frames.
+        Default is 0.
+    max_memory: int
+        Memory budget in bytes. Tasks start in the order they are queued,
+        each once its estimated peak memory (tiff_handling.
+        estimate_task_memory) fits in the budget alongside the tasks already
+        running. A task is always started if nothing else is running. The
+        projected and observed peaks are printed after processing if verbose
+        is True, with a warning if they exceed the budget. 0 for no budget.
+        Default is 0.
+    verbose: bool
+        Determines whether processing functions print statements as they
+        progress through major steps. True to see print statements, False to
+        hide non-errors/warnings.
+        Default is False.
+
+    Returns
+    -------
+    processed_dfs: dict
+        Dataframes returned by csv.process_csv, keyed by the absolute path of
+        their csv. Empty unless last_step is "processed".
+    """
+
+    if pool is None:
+        with pipeline_pool(optional_settings) as stage_pool:
+            return schedule_video_steps(fnames, exp_videos, bg_videos, images_folder, csv_folder, short_fname_format,
+                                        sampleinfo_format, optional_settings, stage_pool, last_step)
+
+    settings = set_defaults(optional_settings)
+    verbose = settings["verbose"]
+    task_frames = settings["task_frames"]
+    max_memory = settings["max_memory"]
+    profile = settings["profile"]
+    fused = settings["fused"] and last_step != "bin"
+    chunked = th.video_chunks_supported(optional_settings)
+    if task_frames > 0 and not chunked:
+        warnings.warn("task_frames is ignored, converting whole videos, because ranges of frames cannot be converted with "
+                      + ", ".join(th.video_chunks_conflicts(optional_settings)) + " (see tiff_handling.video_chunks_supported).")
+    step_settings = dict(optional_settings)
+    step_settings["fused"] = fused
+
+    # Finished steps are reported by the pool's callbacks as (step,
+    # file_number, chunk_index, memory, result) and handled here, in the
+    # calling thread.
+    finished = queue.Queue()
+    processed_dfs = {}
+    prepared = {}
+    chunk_diameters = {}
+    running = 0
+    tic = time.time()
+
+    # Tasks wait in order until their estimated memory fits in max_memory.
+    waiting = collections.deque()
+    estimates = {}
+    admitted_memory = 0
+    projected_peak = 0
+    worker_peaks = {}
+
+    def task_memory(file_number: int, parts: list) -> int:
+        # Estimates the peak memory of a task doing the given parts
+        # ("background", "frames") of processing a video.
+        if max_memory <= 0:
+            return 0
+        if file_number not in estimates:
+            estimates[file_number] = th.estimate_task_memory(exp_videos[file_number], bg_videos[file_number], optional_settings)
+        return max([th.WORKER_BASE_BYTES] + [estimates[file_number][part] for part in parts])
+
+    def start(step: str, function: typing.Callable, arguments: tuple, file_number: int, chunk_index: int, memory: int) -> None:
+        timing = None
+        if profile:
+            timing = task_timing(step, {"fname": fnames[file_number], "chunk": chunk_index})
+        pool.apply_async(measured_task, (function, arguments, timing),
+                         callback=lambda result: finished.put((step, file_number, chunk_index, memory, result)),
+                         error_callback=lambda error: finished.put(("error", file_number, chunk_index, memory, error)))
+
+    def admit() -> None:
+        # Starts waiting tasks while they fit in the budget.
+        nonlocal admitted_memory, projected_peak
+        while waiting:
+            memory = waiting[0][5]
+            if max_memory > 0 and admitted_memory > 0 and admitted_memory + memory > max_memory:
+                break
+            admitted_memory = admitted_memory + memory
+            projected_peak = max(projected_peak, admitted_memory)
+            start(*waiting.popleft())
+
+    def submit(step: str, function: typing.Callable, arguments: tuple, file_number: int, chunk_index: int = 0, memory: int = 0) -> None:
+        nonlocal running
+        running = running + 1
+        waiting.append((step, function, arguments, file_number, chunk_index, memory))
+        admit()
+
+    def step_finished(step: str, file_number: int) -> None:
+        # Queues the next step for the video.
+        if step == "bin" and last_step != "bin":
+            submit("csv", multiprocess_binaries_to_csvs, (file_number, fnames, images_folder, csv_folder,
+                   short_fname_format, tic, optional_settings), file_number, memory=task_memory(file_number, ["frames"]))
+        elif step == "csv" and last_step == "processed":
+            csv = os.path.abspath(os.path.join(csv_folder, fnames[file_number] + ".csv"))
+            submit("processed", dpcsv.process_csv, (csv, short_fname_format, sampleinfo_format,
+                   optional_settings), file_number, memory=task_memory(file_number, []))
+
+    def chunks_finished(file_number: int) -> None:
+        # Joins the diameters of every range in frame order.
+        diameters = np.concatenate([np.zeros(0)] + chunk_diameters.pop(file_number))
+        fps = None
+        if fused:
+            fps = tags.parse_fname(fnames[file_number],short_fname_format,"",optional_settings)["fps"]
+        img_folder = os.path.join(images_folder,fnames[file_number])
+        th.finish_video_chunks(img_folder, prepared.pop(file_number), diameters, csv_folder, fps, step_settings)
+        registry.release(file_number)
+        if verbose:
+            print("Video " + str(file_number+1) + " processed in ranges of frames. (" + str(file_number+1) + "/" + str(len(fnames)) + ")")
+        step_finished("csv" if fused else "bin", file_number)
+
+    # Each video's background is shared with the workers converting its
+    # ranges of frames, and freed once the video is finished (or if
+    # processing fails).
+    with shared_arrays.SharedArrayRegistry() as registry:
+        for file_number in range(0,len(fnames)):
+            img_folder = os.path.join(images_folder,fnames[file_number])
+            if chunked:
+                submit("prepare", th.prepare_video_chunks, (exp_videos[file_number], bg_videos[file_number], img_folder,
+                       csv_folder, step_settings), file_number, memory=task_memory(file_number, ["background"]))
+            elif fused:
+                submit("csv", multiprocess_vid_to_csv, (file_number, fnames, exp_videos, bg_videos, images_folder,
+                       csv_folder, short_fname_format, tic, optional_settings), file_number,
+                       memory=task_memory(file_number, ["background", "frames"]))
+            else:
+                submit("bin", multiprocess_vid_to_bin, (file_number, fnames, exp_videos, bg_videos, images_folder,
+                       tic, step_settings), file_number, memory=task_memory(file_number, ["background", "frames"]))
+
+        while running > 0:
+            step, file_number, chunk_index, memory, outcome = finished.get()
+            running = running - 1
+            admitted_memory = admitted_memory - memory
+            if step == "error":
+                raise outcome
+            result, pid, peak, events = outcome
+            worker_peaks[pid] = peak
+            profiling.add_events(events)
+            if step == "prepare" and result is None:
+                # The video was skipped.
+                step_finished("csv" if fused else "bin", file_number)
+            elif step == "prepare":
+                result["bg_median"] = registry.publish(file_number, result["bg_median"])
+                prepared[file_number] = result
+                frame_count = result["frame_count"]
+                ranges = [(first, min(first + task_frames, frame_count)) for first in range(0, frame_count, task_frames)]
+                chunk_diameters[file_number] = [None]*len(ranges)
+                for chunk_index, (first, stop) in enumerate(ranges):
+                    submit("chunk", th.convert_video_chunk, (exp_videos[file_number], os.path.join(images_folder,fnames[file_number]),
+                           result, first, stop, step_settings), file_number, chunk_index, task_memory(file_number, ["frames"]))
+                if ranges == []:
+                    chunks_finished(file_number)
+            elif step == "chunk":
+                chunk_diameters[file_number][chunk_index] = result
+                if all(diameters is not None for diameters in chunk_diameters[file_number]):
+                    chunks_finished(file_number)
+            elif step == "processed":
+                csv = os.path.abspath(os.path.join(csv_folder, fnames[file_number] + ".csv"))
+                processed_dfs[csv] = result
+            else:
+                step_finished(step, file_number)
+            admit()
+
+    if (verbose or max_memory > 0) and worker_peaks != {} and None not in worker_peaks.values():
+        report_memory(projected_peak, worker_peaks, max_memory, verbose)
+    return processed_dfs
+
+def report_memory(projected_peak: int, worker_peaks: dict, max_memory: int = 0, verbose: bool = True) -> None:
+    """
+    Prints the peak memory projected for and observed in the pool's workers.
+
+    Warns if the observed peaks add up to more than max_memory, whether or
+    not verbose is True. Peaks are each worker's peak resident memory, so
+    their sum is an upper bound on the memory the workers used at once
+    (memory shared between workers is counted in each).
+
+    Parameters
+    ----------
+    projected_peak: int
+        Largest total of the estimated memory of the tasks running at once,
+        in bytes.
+    worker_peaks: dict
+        Peak resident memory in bytes of each worker, keyed by process ID.
+    max_memory: int, optional
+        Memory budget in bytes, 0 for no budget.
+        Default is 0.
+    verbose: bool, optional
+        True to print the peaks, False to only warn.
+        Default is True.
+    """
+
+    megabyte = 2**20
+    largest = max(worker_peaks.values())
+    total = sum(worker_peaks.values())
+    if verbose:
+        print("Peak memory: " + str(round(projected_peak/megabyte)) + " MB projected for tasks running at once, "
+              + str(round(largest/megabyte)) + " MB observed in the largest worker, "
+              + str(round(total/megabyte)) + " MB summed over " + str(len(worker_peaks)) + " workers.")
+    if max_memory > 0 and total > max_memory:
+        warnings.warn("Workers' peak memory (" + str(round(total/megabyte)) + " MB summed) exceeded max_memory ("
+                      + str(round(max_memory/megabyte)) + " MB).")
+    pass
 
 def csvs_to_summaries(csv_folder: typing.Union[str, bytes, os.PathLike],
                       summary_folder: typing.Union[str, bytes, os.PathLike],
-                      short_fname_format: str, sampleinfo_format: str, optional_settings: dict = {}):
+                      short_fname_format: str, sampleinfo_format: str, optional_settings: dict = {},
+                      processed_dfs: dict = {}):
     """
     Processes the raw csvs and determines elongational relaxation time, D(tc)/D0, and elongational viscosity.
 
@@ -616,6 +1688,11 @@ def csvs_to_summaries(csv_folder: typing.Union[str, bytes, os.PathLike],
         separated by the deliminator specified by sample_split.
     optional_settings: dict
         A dictionary of optional settings.
+    processed_dfs: dict, optional
+        Dataframes already processed by csv.process_csv, keyed by the
+        absolute path of their csv, e.g. from stream_videos_to_csvs. These
+        csvs are not processed again.
+        Default is {}.
 
     Optional Settings and Defaults
     ------------------------------
@@ -643,22 +1720,27 @@ def csvs_to_summaries(csv_folder: typing.Union[str, bytes, os.PathLike],
 
     settings = set_defaults(optional_settings)
     verbose = settings["verbose"]
+    profile = settings["profile"]
 
     if verbose:
         print("Processing csvs of D/D0 versus time into annotated summary csvs and fitting the elasto-capillary regime.")
 
-    df = dpcsv.generate_df(csv_folder, short_fname_format, sampleinfo_format, optional_settings)
-    summary_df = fitting.make_summary_dataframe(df, sampleinfo_format, optional_settings)
-    if not os.path.isdir(summary_folder):
-        os.mkdir(summary_folder)
-    fitting.save_summary_df(summary_df, summary_folder,optional_settings)
-    processed_df = fitting.calculate_elongational_visc(df, summary_df, optional_settings)
-    fitting.save_processed_df(processed_df, summary_folder, optional_settings)
-    plot_normalized = True
-    t_tc_layout = figures.layout_time_csvs(processed_df, plot_normalized)
-    elongational_viscosity_layout = figures.layout_viscosity_csvs(processed_df)
-    figures.save_figure(t_tc_layout,'_tc_normalized', summary_folder, optional_settings)
-    figures.save_figure(elongational_viscosity_layout,'_elongational_viscosity',summary_folder, optional_settings)
+    with profiling.timer("csvs_to_summaries", profile):
+        with profiling.timer("generate_df", profile):
+            df = dpcsv.generate_df(csv_folder, short_fname_format, sampleinfo_format, optional_settings, processed_dfs)
+        with profiling.timer("fitting", profile):
+            summary_df = fitting.make_summary_dataframe(df, sampleinfo_format, optional_settings)
+            if not os.path.isdir(summary_folder):
+                os.mkdir(summary_folder)
+            fitting.save_summary_df(summary_df, summary_folder,optional_settings)
+            processed_df = fitting.calculate_elongational_visc(df, summary_df, optional_settings)
+            fitting.save_processed_df(processed_df, summary_folder, optional_settings)
+        with profiling.timer("figures", profile):
+            plot_normalized = True
+            t_tc_layout = figures.layout_time_csvs(processed_df, plot_normalized)
+            elongational_viscosity_layout = figures.layout_viscosity_csvs(processed_df)
+            figures.save_figure(t_tc_layout,'_tc_normalized', summary_folder, optional_settings)
+            figures.save_figure(elongational_viscosity_layout,'_elongational_viscosity',summary_folder, optional_settings)
     pass
 
 
@@ -666,10 +1748,21 @@ def videos_to_summaries(videos_folder: typing.Union[str, bytes, os.PathLike],
                         images_folder: typing.Union[str, bytes, os.PathLike],
                         csv_folder: typing.Union[str, bytes, os.PathLike],
                         summary_folder: typing.Union[str, bytes, os.PathLike],
-                        fname_format: str, sampleinfo_format: str, optional_settings: dict = {}):
+                        fname_format: str, sampleinfo_format: str, optional_settings: dict = {},
+                        pool: typing.Optional[multiprocessing.pool.Pool] = None):
     """
     Full integrating function: converts from videos to csv files
 
+    Each video's csv is processed for fitting as soon as it is saved, while
+    other videos are still being converted (see stream_videos_to_csvs).
+    Binaries already in images_folder without a video in videos_folder are
+    also saved to csvs and summarized, unless fused is True (see
+    unmatched_binaries_to_csvs).
+
+    If shard_count is above 1 in optional_settings, only this job's shard of
+    the videos (see folder.select_shard) is converted to csvs, and the
+    summaries are made by merge_shards once every shard is finished.
+
     Parameters
     ----------
     videos_folder: path-like
@@ -693,13 +1786,156 @@ def videos_to_summaries(videos_folder: typing.Union[str, bytes, os.PathLike],
         separated by the deliminator specified by sample_split.
     optional_settings: dict
         A dictionary of optional settings.
+    pool: multiprocessing.pool.Pool or None, optional
+        Pool of worker processes to use, e.g. from pipeline_pool, so the
+        same workers are reused between stages. None to create a pool for
+        this call only.
+        Default is None.
 
     """
     #### This is just a draft, I have written no tests for it...
     #### ... but it should work, right? Just need some optional breakpoints ###
 
-    videos_to_csvs(videos_folder, images_folder, csv_folder, summary_folder, fname_format,
-                   sampleinfo_format, optional_settings)
+    if pool is None:
+        # Shares one pool between the stages.
+        with pipeline_pool(optional_settings) as pool:
+            videos_to_summaries(videos_folder, images_folder, csv_folder, summary_folder, fname_format,
+                                sampleinfo_format, optional_settings, pool)
+        return
+
+    settings = set_defaults(optional_settings)
+    verbose = settings["verbose"]
+    shard_count = settings["shard_count"]
+
     short_fname_format = tags.shorten_fname_format(fname_format, optional_settings)
-    csvs_to_summaries(csv_folder, summary_folder, short_fname_format, sampleinfo_format, optional_settings)
+    with profiling.timer("videos_to_summaries", settings["profile"]):
+        if shard_count > 1:
+            # Summaries need every shard's csvs, so are made by merge_shards.
+            stream_videos_to_csvs(videos_folder, images_folder, csv_folder, short_fname_format, fname_format,
+                                  sampleinfo_format, optional_settings, pool)
+            if verbose:
+                print("Finished shard " + str(settings["shard_index"]) + " of " + str(shard_count)
+                      + ". Run merge_shards once every shard is finished.")
+        else:
+            # Each csv is processed for fitting as soon as it is saved.
+            processed_dfs = stream_videos_to_csvs(videos_folder, images_folder, csv_folder, short_fname_format,
+                                                  fname_format, sampleinfo_format, optional_settings, pool, True)
+            if not settings["fused"]:
+                unmatched_binaries_to_csvs(videos_folder, images_folder, csv_folder, short_fname_format,
+                                           fname_format, optional_settings, pool)
+            csvs_to_raw_figure(csv_folder, summary_folder, short_fname_format, sampleinfo_format, optional_settings)
+            csvs_to_summaries(csv_folder, summary_folder, short_fname_format, sampleinfo_format, optional_settings,
+                              processed_dfs)
+    save_profile(summary_folder, optional_settings)
+    pass
+
+def merge_shards(videos_folder: typing.Union[str, bytes, os.PathLike],
+                 csv_folder: typing.Union[str, bytes, os.PathLike],
+                 summary_folder: typing.Union[str, bytes, os.PathLike],
+                 fname_format: str, sampleinfo_format: str, optional_settings: dict = {}):
+    """
+    Makes the summaries of videos processed in shards by separate jobs.
+
+    Run once every job of videos_to_summaries (or videos_to_csvs) with
+    shard_count above 1 has finished, e.g. as a job depending on the array
+    job. Checks that every video in videos_folder has a csv in csv_folder,
+    then saves the raw figure and the summaries over all csvs as
+    videos_to_summaries does without shards.
+
+    Parameters
+    ----------
+    videos_folder: path-like
+        Path to the folder of experimental and background video folders
+        given to every shard.
+    csv_folder: path-like
+        Path to the folder every shard saved its csvs in.
+    summary_folder: path-like
+        Path to a folder in which to save the csv of the summary and the
+        annotated datatset.
+    fname_format: str
+        The format of the fname with parameter names separated
+        by the deliminator specified by fname_split. Must contain the "vtype"
+        tag.
+        ex. "date_sampleinfo_fps_run_vtype_remove_remove"
+    sampleinfo_format: str
+        The format of the sampleinfo section of the fname
+        separated by the deliminator specified by sample_split.
+    optional_settings: dict
+        A dictionary of optional settings. shard_index and shard_count are
+        ignored.
+
+    Raises
+    ------
+    FileNotFoundError: If a video does not have a csv, e.g. because its
+    shard has not finished.
+    """
+
+    merge_settings = dict(optional_settings)
+    merge_settings["shard_index"] = 0
+    merge_settings["shard_count"] = 1
+
+    fnames, exp_videos, bg_videos = folder.select_video_folders(videos_folder, fname_format, merge_settings)
+    missing = [fname for fname in sorted(fnames) if not os.path.exists(os.path.join(csv_folder, fname + ".csv"))]
+    if missing != []:
+        raise FileNotFoundError(str(len(missing)) + " videos do not have csvs in " + str(csv_folder)
+                                + ", including " + missing[0] + ". Check that every shard finished.")
+
+    short_fname_format = tags.shorten_fname_format(fname_format, merge_settings)
+    if not os.path.isdir(summary_folder):
+        os.mkdir(summary_folder)
+    with profiling.timer("merge_shards", set_defaults(merge_settings)["profile"]):
+        csvs_to_raw_figure(csv_folder, summary_folder, short_fname_format, sampleinfo_format, merge_settings)
+        csvs_to_summaries(csv_folder, summary_folder, short_fname_format, sampleinfo_format, merge_settings)
+    save_profile(summary_folder, merge_settings)
+    pass
+
+def save_profile(summary_folder: typing.Union[str, bytes, os.PathLike], optional_settings: dict = {}) -> None:
+    """
+    Saves a report of where the time went in the stages run so far, if
+    profile is True (see profiling.save_report).
+
+    Events timed since the last report are included, so e.g. a report saved
+    by binaries_to_csvs also covers an earlier videos_to_binaries.
+
+    Parameters
+    ----------
+    summary_folder: path-like
+        Path to a folder in which to save the report.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    profile: bool
+        True to save the report as "<date and time>_DOS_profile.json" (or
+        summary_filename + "_DOS_profile.json"), with "_shard-<shard_index>"
+        before "_profile" if shard_count is above 1.
+        Default is False.
+    profile_trace: bool
+        True to also save a Chrome trace, ending "_trace.json".
+        Default is False.
+    verbose: bool
+        Determines whether processing functions print statements as they
+        progress through major steps. True to see print statements, False to
+        hide non-errors/warnings.
+        Default is False.
+    """
+
+    settings = set_defaults(optional_settings)
+    if not settings["profile"]:
+        return
+
+    filename = settings["summary_filename"].replace("_DOS-summary.csv", "").replace(".csv", "")
+    if filename == "":
+        date_and_time = datetime.datetime.now()
+        # No colons or periods in filename string.
+        filename = (str(date_and_time.date()) + '_' + str(date_and_time.hour) + '-' + str(date_and_time.minute)
+                    + '-' + str(date_and_time.second))
+    filename = filename + "_DOS"
+    if settings["shard_count"] > 1:
+        filename = filename + "_shard-" + str(settings["shard_index"])
+    report = profiling.save_report(summary_folder, filename, settings["profile_trace"])
+    if settings["verbose"]:
+        print("Profile saved as " + filename + "_profile.json (" + str(np.round(report["wall_seconds"], 1))
+              + " seconds timed).")
     pass
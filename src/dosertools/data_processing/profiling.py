@@ -0,0 +1,304 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import typing
+
+# Events recorded in this process, waiting to be collected (see
+# drain_events).
+_events = []
+_events_lock = threading.Lock()
+
+# Names of the enclosing timers and the frame phases being timed in each
+# thread.
+_local = threading.local()
+
+def _clear_after_fork() -> None:
+    # A forked worker starts without the events of the process it was
+    # forked from, which are that process's to report.
+    global _events, _events_lock
+    _events = []
+    _events_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_clear_after_fork)
+
+def _stack() -> list:
+    # Names of the timers running in this thread, outermost first.
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def _record(name: str, path: list, start: float, duration: float, args: dict) -> None:
+    # Adds an event to the events of this process.
+    event = {"name": name, "path": path, "start": start, "duration": duration, "pid": os.getpid(),
+             "tid": threading.get_ident(), "args": args}
+    with _events_lock:
+        _events.append(event)
+    pass
+
+@contextlib.contextmanager
+def timer(name: str, enabled: bool = True, **args) -> typing.Iterator[None]:
+    """
+    Times the with block as an event, nested in any timers already running
+    in the same thread.
+
+    ex. with timer("background", profile, fname=fname):
+            ...
+
+    Parameters
+    ----------
+    name: str
+        Name of the event, e.g. the stage or step being timed.
+    enabled: bool, optional
+        False to time nothing, e.g. the "profile" setting.
+        Default is True.
+    **args:
+        Details to save with the event, e.g. the fname of the video. Must be
+        JSON serializable.
+    """
+
+    if not enabled:
+        yield
+        return
+    stack = _stack()
+    path = stack + [name]
+    stack.append(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        _record(name, path, start, duration, args)
+
+@contextlib.contextmanager
+def frame_phases(name: str, enabled: bool = True, **args) -> typing.Iterator[None]:
+    """
+    Times the with block as an event, split into the phases marked by lap.
+
+    Phases of each frame (e.g. "decode", "rescale", "threshold") are summed
+    over the frames converted in the block rather than saved for every
+    frame, then saved as events one after the other inside the block's
+    event, so the trace shows how the block's time was spent without an
+    event per frame. Time not covered by a lap is left as a gap.
+
+    Parameters
+    ----------
+    name: str
+        Name of the event, e.g. "frames".
+    enabled: bool, optional
+        False to time nothing, e.g. the "profile" setting.
+        Default is True.
+    **args:
+        Details to save with the event, e.g. the range of frames.
+    """
+
+    if not enabled:
+        yield
+        return
+    previous = getattr(_local, "phases", None)
+    phases = {"totals": {}, "counts": {}, "mark": time.perf_counter()}
+    _local.phases = phases
+    stack = _stack()
+    path = stack + [name]
+    stack.append(name)
+    start = phases["mark"]
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        _local.phases = previous
+        _record(name, path, start, duration, args)
+        phase_start = start
+        for phase, total in phases["totals"].items():
+            _record(phase, path + [phase], phase_start, total, {"laps": phases["counts"][phase]})
+            phase_start = phase_start + total
+
+def lap(phase: str) -> None:
+    """
+    Adds the time since the last lap (or since frame_phases started) to
+    phase, if frame_phases is timing this thread. Otherwise does nothing.
+
+    Parameters
+    ----------
+    phase: str
+        Name of the phase that just finished, e.g. "threshold".
+    """
+
+    phases = getattr(_local, "phases", None)
+    if phases is None:
+        return
+    now = time.perf_counter()
+    phases["totals"][phase] = phases["totals"].get(phase, 0) + now - phases["mark"]
+    phases["counts"][phase] = phases["counts"].get(phase, 0) + 1
+    phases["mark"] = now
+    pass
+
+@contextlib.contextmanager
+def nested(parents: typing.Sequence[str]) -> typing.Iterator[None]:
+    """
+    Nests the timers of the with block in timers named parents, e.g. so the
+    events of a task run in a worker are nested in the stage that sent it.
+
+    Parameters
+    ----------
+    parents: sequence of str
+        Names of the enclosing timers, outermost first, e.g. from
+        current_path in the process that sent the task.
+    """
+
+    previous = _stack()
+    _local.stack = list(parents)
+    try:
+        yield
+    finally:
+        _local.stack = previous
+
+def drain_events() -> list:
+    """
+    Removes and returns the events recorded in this process so far.
+
+    Used to send the events of a worker process back with its results.
+
+    Returns
+    -------
+    events: list of dicts
+        Recorded events, each with its name, path of enclosing timer names,
+        start and duration in seconds (from time.perf_counter), process and
+        thread IDs, and args.
+    """
+
+    global _events
+    with _events_lock:
+        events = _events
+        _events = []
+    return events
+
+def add_events(events: list) -> None:
+    """
+    Adds events collected from another process to the events of this
+    process.
+
+    Parameters
+    ----------
+    events: list of dicts
+        Events, as returned by drain_events.
+    """
+
+    with _events_lock:
+        _events.extend(events)
+    pass
+
+def current_path() -> list:
+    """
+    Returns the names of the timers running in this thread, outermost first.
+    """
+
+    return list(_stack())
+
+def summarize_events(events: list) -> dict:
+    """
+    Totals events that have the same path of timer names.
+
+    Parameters
+    ----------
+    events: list of dicts
+        Events, as returned by drain_events.
+
+    Returns
+    -------
+    report: dict
+        "wall_seconds": time from the start of the first event to the end of
+        the last event.
+        "processes": number of processes events were recorded in.
+        "stages": for each path of timer names (joined by "/"), the number
+        of events ("count"), and their total, mean, and longest duration in
+        seconds ("total_seconds", "mean_seconds", "max_seconds"), and for
+        frame phases, the number of laps summed (usually one per frame,
+        "laps"). Sorted by total time, longest first.
+        "videos": total seconds of the events timed with an fname, for each
+        fname.
+    """
+
+    stages = {}
+    videos = {}
+    for event in events:
+        key = "/".join(event["path"])
+        stage = stages.setdefault(key, {"count": 0, "total_seconds": 0, "max_seconds": 0})
+        stage["count"] = stage["count"] + 1
+        stage["total_seconds"] = stage["total_seconds"] + event["duration"]
+        stage["max_seconds"] = max(stage["max_seconds"], event["duration"])
+        if "laps" in event["args"]:
+            stage["laps"] = stage.get("laps", 0) + event["args"]["laps"]
+        if "fname" in event["args"]:
+            videos[event["args"]["fname"]] = videos.get(event["args"]["fname"], 0) + event["duration"]
+    for stage in stages.values():
+        stage["mean_seconds"] = stage["total_seconds"] / stage["count"]
+    stages = dict(sorted(stages.items(), key=lambda item: -item[1]["total_seconds"]))
+
+    wall_seconds = 0
+    if events != []:
+        wall_seconds = (max(event["start"] + event["duration"] for event in events)
+                        - min(event["start"] for event in events))
+    return {"wall_seconds": wall_seconds, "processes": len(set(event["pid"] for event in events)),
+            "stages": stages, "videos": videos}
+
+def chrome_trace(events: list) -> dict:
+    """
+    Converts events to the Chrome trace event format.
+
+    The trace can be opened in chrome://tracing or https://ui.perfetto.dev,
+    with one row per process and thread.
+
+    Parameters
+    ----------
+    events: list of dicts
+        Events, as returned by drain_events.
+
+    Returns
+    -------
+    trace: dict
+        Complete ("X") events with times in microseconds from the start of
+        the first event.
+    """
+
+    first = min([event["start"] for event in events], default=0)
+    trace_events = [{"name": event["name"], "cat": "/".join(event["path"][:-1]), "ph": "X",
+                     "ts": (event["start"] - first) * 1e6, "dur": event["duration"] * 1e6,
+                     "pid": event["pid"], "tid": event["tid"], "args": event["args"]} for event in events]
+    return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+def save_report(save_location: typing.Union[str, bytes, os.PathLike], filename: str, trace: bool = False) -> dict:
+    """
+    Saves a report of the events recorded so far, and clears them.
+
+    Parameters
+    ----------
+    save_location: path-like
+        Folder in which to save the report, e.g. summary_folder.
+    filename: str
+        Base filename (no extension). The report is saved as filename +
+        "_profile.json" and the trace as filename + "_trace.json".
+    trace: bool, optional
+        True to also save a Chrome trace of every event (see chrome_trace).
+        Default is False.
+
+    Returns
+    -------
+    report: dict
+        The report, as returned by summarize_events.
+    """
+
+    events = drain_events()
+    report = summarize_events(events)
+    if not os.path.isdir(save_location):
+        os.makedirs(save_location)
+    with open(os.path.join(save_location, filename + "_profile.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    if trace:
+        with open(os.path.join(save_location, filename + "_trace.json"), "w") as f:
+            json.dump(chrome_trace(events), f)
+    return report
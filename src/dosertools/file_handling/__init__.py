@@ -1 +1 @@
-__all__ = ["folder","tags"]
+__all__ = ["cache","folder","tags"]
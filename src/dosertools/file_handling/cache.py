@@ -0,0 +1,486 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import typing
+
+from ..data_processing import integration as integration
+
+# Name of the manifest saved in each video's images folder.
+MANIFEST_NAME = "cache_manifest.json"
+
+# Name of the file recording how many frames of a video have been saved.
+PROGRESS_NAME = "progress.json"
+
+# Settings that change the output of each stage. Settings that only change
+# how the work is done (e.g. reader, frame_threads) are not included.
+CROP_SETTINGS = ["nozzle_row", "crop_width_coefficient", "crop_height_coefficient",
+                 "crop_nozzle_coefficient", "image_extension", "frame_step", "stop_after_breakup"]
+STAGE_SETTINGS = {
+    "params": CROP_SETTINGS + ["bg_drop_removal"],
+    "crop": CROP_SETTINGS + ["intermediate_format", "intermediate_compression"],
+    "bg_sub": CROP_SETTINGS + ["bg_drop_removal", "streaming_median", "intermediate_format", "intermediate_compression"],
+    "bin": CROP_SETTINGS + ["bg_drop_removal", "streaming_median", "bin_format"],
+    "csv": CROP_SETTINGS + ["bg_drop_removal", "streaming_median"],
+}
+
+# Folders holding the images of each image stage, in the order of the
+# booleans returned by folder.make_destination_folders.
+IMAGE_STAGES = ["bin", "crop", "bg_sub"]
+
+def video_files(video_location: typing.Union[str, bytes, os.PathLike], optional_settings: dict = {}) -> typing.List[str]:
+    """
+    Lists the files holding the frames of a video.
+
+    Parameters
+    ----------
+    video_location: path-like
+        Path to a video folder, or to a .mraw file if image_extension is
+        "mraw".
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    image_extension: string
+        The extension for images in the video folder. "mraw" for Photron
+        .mraw recordings, whose .cihx or .cih header is included.
+        Default is "tif". Do not include ".".
+
+    Returns
+    -------
+    video_files: list of strings
+        Paths to the files of the video, sorted.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    image_extension = settings["image_extension"]
+
+    if image_extension == "mraw":
+        base = os.path.splitext(video_location)[0]
+        files = [str(video_location)] + [base + extension for extension in [".cihx", ".cih"] if os.path.exists(base + extension)]
+    else:
+        files = glob.glob(os.path.join(video_location, "*." + image_extension))
+    return sorted(files)
+
+def file_identity(path: typing.Union[str, bytes, os.PathLike], digest: bool = False) -> list:
+    """
+    Identifies a file by its name and either its size and modification time or its contents.
+
+    Parameters
+    ----------
+    path: path-like
+        Path to the file.
+    digest: bool, optional
+        True to identify the file by a SHA-256 digest of its contents, which
+        is slower but does not change when the file is copied or touched.
+        Default is False.
+
+    Returns
+    -------
+    file_identity: list
+        [name, size, modification time in ns] or [name, digest].
+    """
+
+    name = os.path.basename(path)
+    if digest:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        return [name, sha.hexdigest()]
+    stat = os.stat(path)
+    return [name, stat.st_size, stat.st_mtime_ns]
+
+def stage_settings(stage: str, optional_settings: dict = {}) -> dict:
+    """
+    Selects the settings that change the output of a stage.
+
+    tc_bounds and fitting_bounds are included when frame_step is above 1,
+    since they choose which frames are processed.
+
+    Parameters
+    ----------
+    stage: string
+        One of the stages in STAGE_SETTINGS.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Returns
+    -------
+    stage_settings: dict
+        The settings (with defaults filled in) that change the stage output.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    names = list(STAGE_SETTINGS[stage])
+    if settings["frame_step"] > 1:
+        names = names + ["tc_bounds", "fitting_bounds"]
+    return {name: settings[name] for name in names}
+
+def hash_key(contents: dict) -> str:
+    """
+    Hashes a JSON-serializable dictionary into a cache key.
+    """
+
+    encoded = json.dumps(contents, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+def stage_key(stage: str, experimental_video_location: typing.Union[str, bytes, os.PathLike], background_video_location: typing.Union[str, bytes, os.PathLike], optional_settings: dict = {}, extra: dict = {}) -> str:
+    """
+    Finds the cache key of a stage from its input videos and settings.
+
+    Parameters
+    ----------
+    stage: string
+        One of the stages in STAGE_SETTINGS.
+    experimental_video_location: path-like
+        Path to the experimental video.
+    background_video_location: path-like
+        Path to the background video.
+    optional_settings: dict
+        A dictionary of optional settings.
+    extra: dict, optional
+        Other inputs of the stage (e.g. {"fps": fps} for csvs).
+
+    Optional Settings and Defaults
+    ------------------------------
+    cache_digest: bool
+        True to identify video files by a digest of their contents rather
+        than their size and modification time.
+        Default is False.
+
+    Returns
+    -------
+    stage_key: string
+        Key that changes if the video files, the stage settings, or extra
+        change.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    digest = settings["cache_digest"]
+
+    contents = {
+        "stage": stage,
+        "experimental": [file_identity(path, digest) for path in video_files(experimental_video_location, optional_settings)],
+        "background": [file_identity(path, digest) for path in video_files(background_video_location, optional_settings)],
+        "settings": stage_settings(stage, optional_settings),
+        "extra": extra,
+    }
+    return hash_key(contents)
+
+def derived_key(parent_key: typing.Optional[str], stage: str, optional_settings: dict = {}, extra: dict = {}) -> typing.Optional[str]:
+    """
+    Finds the cache key of a stage computed from the output of another stage.
+
+    Parameters
+    ----------
+    parent_key: string or None
+        Key of the stage whose output is the input (e.g. the "bin" key for
+        csvs from binary images), or None if that output is not cached.
+    stage: string
+        One of the stages in STAGE_SETTINGS.
+    optional_settings: dict
+        A dictionary of optional settings.
+    extra: dict, optional
+        Other inputs of the stage (e.g. {"fps": fps} for csvs).
+
+    Returns
+    -------
+    derived_key: string or None
+        Key that changes if parent_key, the stage settings, or extra change.
+        None if parent_key is None, so the stage is never cached.
+    """
+
+    if parent_key is None:
+        return None
+    contents = {"stage": stage, "parent": parent_key, "settings": stage_settings(stage, optional_settings), "extra": extra}
+    return hash_key(contents)
+
+def read_manifest(images_location: typing.Union[str, bytes, os.PathLike]) -> dict:
+    """
+    Reads the cache manifest of a video, or an empty manifest if there is none.
+
+    Parameters
+    ----------
+    images_location: path-like
+        The folder where the images and parameters of the video are saved.
+
+    Returns
+    -------
+    manifest: dict
+        Cache key of each completed stage, keyed by stage.
+    """
+
+    path = os.path.join(images_location, MANIFEST_NAME)
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+    return manifest
+
+def write_manifest(images_location: typing.Union[str, bytes, os.PathLike], manifest: dict) -> None:
+    """
+    Saves the cache manifest of a video.
+
+    The manifest is written with write_json, so it is never left
+    half-written.
+
+    Parameters
+    ----------
+    images_location: path-like
+        The folder where the images and parameters of the video are saved.
+    manifest: dict
+        Cache key of each completed stage, keyed by stage.
+    """
+
+    write_json(os.path.join(images_location, MANIFEST_NAME), manifest)
+    pass
+
+def write_json(path: typing.Union[str, bytes, os.PathLike], contents: dict) -> None:
+    """
+    Saves a dictionary as JSON through a temporary file moved into place.
+
+    The file at path is always either the previous or the new contents,
+    never half-written.
+    """
+
+    partial_path = str(path) + ".partial"
+    with open(partial_path, "w") as f:
+        json.dump(contents, f, indent=1, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial_path, path)
+    pass
+
+def is_cached(images_location: typing.Union[str, bytes, os.PathLike], stage: str, key: typing.Optional[str]) -> bool:
+    """
+    Checks if a stage was completed with the given cache key.
+
+    Parameters
+    ----------
+    images_location: path-like
+        The folder where the images and parameters of the video are saved.
+    stage: string
+        The stage to check.
+    key: string or None
+        The current cache key of the stage. None is never cached.
+
+    Returns
+    -------
+    is_cached: bool
+        True if the manifest records the stage as completed with key.
+    """
+
+    return key is not None and read_manifest(images_location).get(stage) == key
+
+def start_stage(images_location: typing.Union[str, bytes, os.PathLike], stage: str) -> None:
+    """
+    Removes a stage from the manifest before its output is written.
+
+    If processing stops before finish_stage, the stage is not cached.
+    """
+
+    manifest = read_manifest(images_location)
+    if stage in manifest:
+        del manifest[stage]
+        write_manifest(images_location, manifest)
+    pass
+
+def finish_stage(images_location: typing.Union[str, bytes, os.PathLike], stage: str, key: typing.Optional[str]) -> None:
+    """
+    Records a stage as completed with the given cache key.
+    """
+
+    if key is not None:
+        manifest = read_manifest(images_location)
+        manifest[stage] = key
+        write_manifest(images_location, manifest)
+    pass
+
+def saved_image_stages(optional_settings: dict = {}) -> typing.List[str]:
+    """
+    Lists the image stages whose images are saved with the given settings.
+
+    Parameters
+    ----------
+    optional_settings: dict
+        A dictionary of optional settings (see folder.make_destination_folders).
+
+    Returns
+    -------
+    saved_image_stages: list of strings
+        The stages of IMAGE_STAGES that are saved.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    saved = {"bin": not settings["fused"] or settings["save_bin"],
+             "crop": settings["save_crop"],
+             "bg_sub": settings["save_bg_sub"]}
+    return [stage for stage in IMAGE_STAGES if saved[stage]]
+
+def prepare_image_stages(images_location: typing.Union[str, bytes, os.PathLike], keys: dict, folders_exist: typing.Sequence[bool], optional_settings: dict = {}) -> typing.Tuple[typing.List[bool], typing.List[str]]:
+    """
+    Finds which image stages are cached and clears the folders of the others.
+
+    Folders of stages that are saved but not cached are emptied, so stale
+    or half-written images are never mixed with new ones.
+
+    Parameters
+    ----------
+    images_location: path-like
+        The folder where the images and parameters of the video are saved.
+    keys: dict
+        Current cache key of each of IMAGE_STAGES.
+    folders_exist: sequence of three bools
+        As returned by folder.make_destination_folders. True for stages
+        that are not saved.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Returns
+    -------
+    folders_exist: list of three bools
+        True for stages that are cached or not saved, False for stages to
+        compute. Use with skip_existing True.
+    stages_to_compute: list of strings
+        Stages to compute, to pass to finish_stage once they are saved.
+    """
+
+    saved = saved_image_stages(optional_settings)
+
+    cached_folders = list(folders_exist)
+    stages_to_compute = []
+    for i, stage in enumerate(IMAGE_STAGES):
+        if stage not in saved:
+            continue
+        if is_cached(images_location, stage, keys[stage]):
+            cached_folders[i] = True
+        else:
+            start_stage(images_location, stage)
+            # Progress through the video no longer matches the saved images.
+            clear_progress(images_location)
+            stage_folder = os.path.join(images_location, stage)
+            shutil.rmtree(stage_folder, ignore_errors=True)
+            os.mkdir(stage_folder)
+            cached_folders[i] = False
+            stages_to_compute.append(stage)
+    return cached_folders, stages_to_compute
+
+def read_progress(images_location: typing.Union[str, bytes, os.PathLike]) -> dict:
+    """
+    Reads how much of a video has been saved, or an empty dict if unknown.
+
+    Parameters
+    ----------
+    images_location: path-like
+        The folder where the images and parameters of the video are saved.
+
+    Returns
+    -------
+    progress: dict
+        "frames_completed": number of frames whose images are all saved,
+        "frames_total": number of frames in the video,
+        "settings": hash of the settings the images were saved with,
+        "complete": True once every output of the video is saved.
+    """
+
+    path = os.path.join(images_location, PROGRESS_NAME)
+    try:
+        with open(path, "r") as f:
+            progress = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        progress = {}
+    return progress
+
+def record_progress(images_location: typing.Union[str, bytes, os.PathLike], frames_completed: int, frames_total: int, optional_settings: dict = {}, complete: bool = False) -> None:
+    """
+    Records how many frames of a video have all their images saved.
+
+    Only record frames once their images are on disk (e.g. after flushing
+    an AsyncImageWriter).
+
+    Parameters
+    ----------
+    images_location: path-like
+        The folder where the images and parameters of the video are saved.
+    frames_completed: int
+        Number of frames, from the first, whose images are all saved.
+    frames_total: int
+        Number of frames in the video.
+    optional_settings: dict
+        A dictionary of optional settings, the images are saved with.
+    complete: bool, optional
+        True once every output of the video (including parameters) is saved.
+        Default is False.
+    """
+
+    progress = {"frames_completed": int(frames_completed), "frames_total": int(frames_total),
+                "settings": settings_hash(optional_settings), "complete": complete}
+    write_json(os.path.join(images_location, PROGRESS_NAME), progress)
+    pass
+
+def complete_progress(images_location: typing.Union[str, bytes, os.PathLike], optional_settings: dict = {}) -> None:
+    """
+    Records that every output of a video is saved.
+    """
+
+    progress = read_progress(images_location)
+    frames_total = progress.get("frames_total", 0)
+    record_progress(images_location, frames_total, frames_total, optional_settings, True)
+    pass
+
+def clear_progress(images_location: typing.Union[str, bytes, os.PathLike]) -> None:
+    """
+    Removes the record of how much of a video has been saved.
+    """
+
+    path = os.path.join(images_location, PROGRESS_NAME)
+    if os.path.exists(path):
+        os.remove(path)
+    pass
+
+def resume_frame(images_location: typing.Union[str, bytes, os.PathLike], frames_total: int, optional_settings: dict = {}) -> int:
+    """
+    Finds the frame to continue saving a video from after an interruption.
+
+    Parameters
+    ----------
+    images_location: path-like
+        The folder where the images and parameters of the video are saved.
+    frames_total: int
+        Number of frames in the video.
+    optional_settings: dict
+        A dictionary of optional settings, the images are saved with.
+
+    Returns
+    -------
+    resume_frame: int
+        Number of frames already saved, or 0 if the progress is unknown,
+        complete, or for a different video length or settings.
+    """
+
+    progress = read_progress(images_location)
+    if (progress.get("complete", True) or progress.get("frames_total") != frames_total
+            or progress.get("settings") != settings_hash(optional_settings)):
+        return 0
+    return progress.get("frames_completed", 0)
+
+def interrupted(images_location: typing.Union[str, bytes, os.PathLike]) -> bool:
+    """
+    Checks if saving a video started but did not finish.
+    """
+
+    progress = read_progress(images_location)
+    return progress != {} and not progress.get("complete", False)
+
+def settings_hash(optional_settings: dict = {}) -> str:
+    """
+    Hashes the settings that change which images are saved and what they hold.
+    """
+
+    names = sorted(set(STAGE_SETTINGS["bin"] + STAGE_SETTINGS["crop"] + STAGE_SETTINGS["bg_sub"] + ["save_crop", "save_bg_sub"]))
+    settings = integration.set_defaults(optional_settings)
+    return hash_key({name: settings[name] for name in names})
@@ -33,11 +33,19 @@ def make_destination_folders(save_location: typing.Union[str, bytes, os.PathLike
         True to save background-subtracted images (i.e. experimental video
         images cropped and background-subtracted but not binarized).
         Default is False.
+    fused: bool
+        True to measure diameters in memory without saving binary images
+        unless save_bin is True.
+        Default is False.
+    save_bin: bool
+        True to save binary images when fused is True.
+        Default is False.
 
     Returns
     -------
     bin_exists: bool
-        True if binary folder already exists, False if does not exist
+        True if binary folder already exists or fused is True and save_bin is
+        False, False otherwise
     crop_exists: bool
         True if save_crop is True or crop folder already exists, False
         otherwise
@@ -50,6 +58,8 @@ def make_destination_folders(save_location: typing.Union[str, bytes, os.PathLike
     skip_existing = settings["skip_existing"]
     save_crop = settings["save_crop"]
     save_bg_sub = settings["save_bg_sub"]
+    fused = settings["fused"]
+    save_bin = settings["save_bin"]
     bin_exists = False
     crop_exists = False
     bg_sub_exists = False
@@ -59,8 +69,12 @@ def make_destination_folders(save_location: typing.Union[str, bytes, os.PathLike
         os.mkdir(save_location)
 
     # Makes binary folder.
-    if not make_folder(save_location,"bin"):
-        #warnings.warn("Binary folder already exists in" + str(save_location), UserWarning)
+    if not fused or save_bin:
+        if not make_folder(save_location,"bin"):
+            #warnings.warn("Binary folder already exists in" + str(save_location), UserWarning)
+            bin_exists = True
+    else:
+        # If fused and not save_bin, returns True.
         bin_exists = True
 
     # Makes crop folder.
@@ -257,13 +271,18 @@ def identify_background_video_folder(parent_folder: typing.Union[str, bytes, os.
         True to use one background for a group of experiments only differing by
         run number. False to pair backgrounds and experiments 1:1.
         Default is False.
+    image_extension: string
+        The extension for images in the video folder. If "mraw", looks for
+        background .mraw files instead of folders.
+        Default is "tif". Do not include ".".
 
     Returns
     -------
     matched_bg: bool
         True if a matching background is found, False otherwise.
     bg_folder: string
-        Name of background folder if a matching one is found, '' otherwise.
+        Name of background folder (or .mraw file, including the extension) if
+        a matching one is found, '' otherwise.
 
     Raises
     ------
@@ -280,6 +299,13 @@ def identify_background_video_folder(parent_folder: typing.Union[str, bytes, os.
     fname_split = settings["fname_split"]
     background_tag = settings["background_tag"]
     one_background = settings["one_background"]
+    image_extension = settings["image_extension"]
+
+    # .mraw recordings are single files rather than folders of images.
+    if image_extension == "mraw":
+        video_suffix = ".mraw"
+    else:
+        video_suffix = ""
 
     # Checks for "vtype" tag since it is needed for further processing.
     if not tags.check_fname_format_for_tag(fname_format,"vtype",fname_split):
@@ -301,10 +327,10 @@ def identify_background_video_folder(parent_folder: typing.Union[str, bytes, os.
         # every run.
 
         bg_norun_fname = tags.remove_tag_from_fname(bg_fname,fname_format,"run",fname_split)
-        bg_norun_folders = glob.glob(os.path.join(parent_folder,bg_norun_fname))
+        bg_norun_folders = glob.glob(os.path.join(parent_folder,bg_norun_fname + video_suffix))
         # 2nd case, sub the run tag with *, then search.
         bg_run_fname = tags.replace_tag_in_fname(bg_fname,fname_format,"run","*",fname_split)
-        bg_run_folders = glob.glob(os.path.join(parent_folder,bg_run_fname))
+        bg_run_folders = glob.glob(os.path.join(parent_folder,bg_run_fname + video_suffix))
 
         # Combines, sorts, then takes the 1st.
         bg_folders = bg_run_folders + bg_norun_folders
@@ -319,7 +345,7 @@ def identify_background_video_folder(parent_folder: typing.Union[str, bytes, os.
 
     else:
         # If matched backgrounds, matchs by run number.
-        bg_folders = glob.glob(os.path.join(parent_folder,bg_fname))
+        bg_folders = glob.glob(os.path.join(parent_folder,bg_fname + video_suffix))
         bg_folders = sorted(bg_folders)
 
         if bg_folders == []:
@@ -372,6 +398,11 @@ def select_video_folders(parent_folder: typing.Union[str, bytes, os.PathLike], f
         True to use one background for a group of experiments only differing by
         run number. False to pair backgrounds and experiments 1:1.
         Default is False.
+    image_extension: string
+        The extension for images in the video folder. If "mraw", pairs Photron
+        .mraw files (named like video folders plus ".mraw") instead of
+        folders.
+        Default is "tif". Do not include ".".
 
     Returns
     -------
@@ -379,8 +410,8 @@ def select_video_folders(parent_folder: typing.Union[str, bytes, os.PathLike], f
         List of base folder names for each matched pair of experimental and
         background folders.
     exp_videos: list of paths
-        List of paths to experimental video folders that were matched with
-        backgrounds.
+        List of paths to experimental video folders (or .mraw files) that were
+        matched with backgrounds.
     bg_videos: list of paths
         List of paths to background video folders matched with exp_videos.
 
@@ -404,10 +435,19 @@ def select_video_folders(parent_folder: typing.Union[str, bytes, os.PathLike], f
     exp_video_folders = []
     bg_video_folders = []
 
-    subfolders = [ f.name for f in os.scandir(parent_folder) if f.is_dir()]
+    image_extension = settings["image_extension"]
+    if image_extension == "mraw":
+        # .mraw recordings are single files, named like the video folders.
+        subfolders = [ f.name for f in os.scandir(parent_folder) if f.is_file() and f.name.lower().endswith(".mraw")]
+    else:
+        subfolders = [ f.name for f in os.scandir(parent_folder) if f.is_dir()]
 
     for subfolder in subfolders:
-        fname, experiment_video = identify_experimental_video_folder(subfolder, fname_format, optional_settings)
+        if image_extension == "mraw":
+            video_name = os.path.splitext(subfolder)[0]
+        else:
+            video_name = subfolder
+        fname, experiment_video = identify_experimental_video_folder(video_name, fname_format, optional_settings)
         if experiment_video:
             # Tries to find a matching background video if the folder
             # appears to be an experimental video.
@@ -425,3 +465,57 @@ def select_video_folders(parent_folder: typing.Union[str, bytes, os.PathLike], f
             bg_video_folders.append(os.path.join(parent_folder,bg_folder))
 
     return fnames, exp_video_folders, bg_video_folders
+
+def select_shard(fnames: list, exp_videos: list, bg_videos: list, optional_settings: dict = {}) -> typing.Tuple[list,list,list]:
+    """
+    Selects the videos of one shard of a batch split across separate jobs.
+
+    Videos are sorted by fname and dealt out in turn to shard_count shards,
+    so every job given the same videos selects the same shard for the same
+    shard_index, and together the shards cover every video exactly once.
+
+    Parameters
+    ----------
+    fnames: list of strings
+        List of base folder names, from select_video_folders.
+    exp_videos: list of paths
+        List of paths to experimental video folders matched with fnames.
+    bg_videos: list of paths
+        List of paths to background video folders matched with fnames.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    shard_index: int
+        Index of the shard to select, from 0 to shard_count - 1.
+        Default is 0.
+    shard_count: int
+        Number of shards the videos are split into.
+        Default is 1.
+
+    Returns
+    -------
+    fnames: list of strings
+        Base folder names of the videos in the shard, sorted.
+    exp_videos: list of paths
+        Paths to the experimental video folders matched with fnames.
+    bg_videos: list of paths
+        Paths to the background video folders matched with fnames.
+
+    Raises
+    ------
+    ValueError: If shard_count is below 1 or shard_index is not between 0
+    and shard_count - 1.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    shard_index = settings["shard_index"]
+    shard_count = settings["shard_count"]
+    if shard_count < 1:
+        raise ValueError("shard_count must be at least 1.")
+    if shard_index < 0 or shard_index >= shard_count:
+        raise ValueError("shard_index must be between 0 and shard_count - 1.")
+
+    order = sorted(range(0, len(fnames)), key=lambda i: fnames[i])[shard_index::shard_count]
+    return [fnames[i] for i in order], [exp_videos[i] for i in order], [bg_videos[i] for i in order]
@@ -0,0 +1,97 @@
+import queue
+import threading
+import typing
+
+class AsyncImageWriter:
+    """
+    Saves images on background threads so saving does not block processing.
+
+    Images are handed to save, which returns as soon as the image is queued.
+    The queue holds at most max_queue images; save blocks while it is full,
+    so processing cannot run far ahead of a slow disk. Errors raised while
+    saving are raised again by the next call to save, flush, or close.
+
+    Parameters
+    ----------
+    save_function: callable
+        Called on a background thread with the arguments given to save, e.g.
+        tiff_handling.save_image.
+    threads: int, optional
+        Number of background threads saving images.
+        Default is 2.
+    max_queue: int, optional
+        Maximum number of images waiting to be saved.
+        Default is 64.
+    """
+
+    def __init__(self, save_function: typing.Callable, threads: int = 2, max_queue: int = 64):
+        self.save_function = save_function
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.error = None
+        self.closed = False
+        self.threads = [threading.Thread(target=self.run, daemon=True) for i in range(0, max(1, threads))]
+        for thread in self.threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def run(self) -> None:
+        """
+        Saves queued images until the writer is closed.
+        """
+
+        while True:
+            arguments = self.queue.get()
+            if arguments is None:
+                self.queue.task_done()
+                break
+            # Images queued after an error are discarded.
+            if self.error is None:
+                try:
+                    self.save_function(*arguments)
+                except Exception as error:
+                    self.error = error
+            self.queue.task_done()
+
+    def raise_error(self) -> None:
+        """
+        Raises the first error from saving images, if any.
+        """
+
+        if self.error is not None:
+            raise self.error
+
+    def save(self, *arguments) -> None:
+        """
+        Queues an image to be saved with save_function(*arguments).
+
+        Blocks while the queue is full.
+        """
+
+        self.raise_error()
+        self.queue.put(arguments)
+
+    def flush(self) -> None:
+        """
+        Waits until every queued image is saved.
+        """
+
+        self.queue.join()
+        self.raise_error()
+
+    def close(self) -> None:
+        """
+        Saves every queued image, then stops the background threads.
+        """
+
+        if not self.closed:
+            self.closed = True
+            for thread in self.threads:
+                self.queue.put(None)
+            for thread in self.threads:
+                thread.join()
+        self.raise_error()
@@ -5,8 +5,12 @@ import os
 import pandas as pd
 from pathlib import Path
 
+from . import binary_stack as binary_stack
+from . import reader as reader
 from ..file_handling import folder as folder
+from ..file_handling import cache as cache
 from ..data_processing import integration as integration
+from ..data_processing import profiling as profiling
 
 def add_saved_params_to_dict(save_location: typing.Union[str, bytes, os.PathLike],params_dict: dict):
     """
@@ -75,6 +79,105 @@ def bottom_border(image : np.ndarray) -> int:
     return bottom+half # return index from top of image
 
 
+def bottom_borders(images: np.ndarray) -> np.ndarray:
+    """
+    Finds the bottom border of every image in a stack of images.
+
+    Vectorized version of bottom_border for a (frames, rows, columns) stack.
+
+    Parameters
+    ----------
+    images : np.ndarray
+        Stack of binary images with shape (frames, rows, columns)
+
+    Returns
+    -------
+    bottom_borders : np.ndarray
+        Index of last row to include in analysis for each image, chosen as
+        row with the most white pixels in the bottom half of the image
+    """
+
+    # Pixel values across the rows of every image.
+    sum_rows = np.sum(images, axis = 2)
+    height = np.shape(images)[1]
+
+    # Bottom for the crop should be below the halfway mark for the image.
+    half = int(round(height/2,0))
+
+    # In the case of multiple maximums, argmax picks the highest one.
+    bottoms = np.argmax(sum_rows[:,half:], axis = 1)
+    return bottoms+half
+
+def calculate_min_diameters(images: np.ndarray, window: np.array) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the diameter profile and minimum diameter for a stack of images.
+
+    Vectorized version of calculate_min_diameter. The diameter profile of
+    each image is the number of pixels from the first white pixel to the last
+    white pixel in each row, found for every row and every image at once from
+    argmax on both ends of the rows. The minimum diameter is 0 if there are
+    any rows that are fully black within the window (bottom is calculated on
+    a per-image basis using bottom_borders), otherwise it is the average of
+    the values that are within 2 pixels of the minimum of the profile.
+
+    Parameters
+    ----------
+    images : np.ndarray
+        binary images with shape (frames, rows, columns), or a single image
+        with shape (rows, columns)
+    window : np.array
+        array of the boundaries of the image to analyze in the format
+        [left, top, right, bottom]
+        bottom will be replaced with the result of bottom_borders(images)
+
+    Returns
+    -------
+    diameter_profiles : np.ndarray
+        (frames, rows) array of the diameter of each row of each image.
+        Rows outside of the window are -1.
+    min_diameters : np.ndarray
+        minimum diameter measured for each image in the window
+    """
+
+    images = np.asarray(images)
+    if images.ndim == 2:
+        images = images[np.newaxis]
+
+    # Extracts image analysis boundaries from window and bottom_borders.
+    left = int(window[0])
+    top = int(window[1])
+    right = int(window[2])
+    bottoms = bottom_borders(images)
+
+    # Finds the first and last white pixel in every row of every image.
+    white = images[:,:,left:right] != 0
+    width = np.shape(white)[2]
+    any_white = np.any(white, axis = 2)
+    first_non_zero = np.argmax(white, axis = 2)
+    last_non_zero = width - 1 - np.argmax(white[:,:,::-1], axis = 2)
+    # If the row is all black, the diameter at that height is 0.
+    diameter_profiles = np.where(any_white, last_non_zero - first_non_zero + 1, 0)
+
+    # Only rows from top to the bottom border of each image are analyzed.
+    rows = np.arange(np.shape(images)[1])
+    in_window = (rows[np.newaxis,:] >= top) & (rows[np.newaxis,:] < bottoms[:,np.newaxis])
+    diameter_profiles = np.where(in_window, diameter_profiles, -1)
+
+    # If liquid bridge is broken at any point, minimum diameter is 0.
+    broken = np.any(in_window & ~any_white, axis = 1)
+
+    # Includes all values within 2 pixels of minimum in average,
+    # avoids effects due to arbitrary stepping from the discrete nature of
+    # pixels.
+    window_max = np.iinfo(diameter_profiles.dtype).max
+    minimums = np.min(np.where(in_window, diameter_profiles, window_max), axis = 1)
+    near_minimum = in_window & (diameter_profiles <= (minimums[:,np.newaxis]+2))
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        # Images with no rows in the window have no diameter (NaN).
+        averages = np.sum(np.where(near_minimum, diameter_profiles, 0), axis = 1)/np.sum(near_minimum, axis = 1)
+    min_diameters = np.where(broken, 0, averages)
+    return diameter_profiles, min_diameters
+
 def calculate_min_diameter(image: np.ndarray, window: np.array) -> float:
     """
     Finds the minimum diameter of the liquid bridge for a given image
@@ -86,7 +189,8 @@ def calculate_min_diameter(image: np.ndarray, window: np.array) -> float:
     basis using bottom_border). Returns the average of any values that are
     within 2 pixels of the minimum measured diameter if there are no fully
     black rows. Averaging attempting to reduce stepping due to the finite size
-    of pixels relative to the thin liquid bridge.
+    of pixels relative to the thin liquid bridge. See calculate_min_diameters
+    to process a stack of images at once.
 
     Parameters
     ----------
@@ -103,53 +207,23 @@ def calculate_min_diameter(image: np.ndarray, window: np.array) -> float:
         minimum diameter measured for the image in the window
     """
 
-    # Extracts image analysis boundaries from window and bottom_border.
-    left = int(window[0])
-    top = int(window[1])
-    right = int(window[2])
-    bottom = int(bottom_border(image))
-
-    # Initializes diameter_profile variable.
-    diameter_profile = []
-
-    for i in range(top,bottom):
-        if np.all(image[i,left:right] == 0):
-            # If the row is all black, the diameter at that height is 0.
-            diameter_profile.append(0)
-        else: # If the row is not all black, calculate diameter.
-            # Finds indices of all white pixels.
-            non_zero_indicies = np.nonzero(image[i,left:right])
-            # The width of the liquid bridge is the first white pixel minus
-            # the last white pixel plus one (count first pixel).
-            first_non_zero = non_zero_indicies[0][0]
-            last_non_zero = non_zero_indicies[0][-1]
-            diameter = last_non_zero - first_non_zero + 1
-            diameter_profile.append(diameter)
-    if diameter_profile.count(0) > 0:
-        # If liquid bridge is broken at any point,
-        # minimum diameter is 0.
-        min_diameter_avg = 0
-    else:
-        # Includes all values within 2 pixels of minimum in average,
-        # avoids effects due to arbitrary stepping from the discrete nature of
-        # pixels.
-
-        # Collects and average all values within 2 pixels of minimum.
-        min_diameters = []
-        for i, value in enumerate(diameter_profile):
-            if value <= (min(diameter_profile)+2):
-                min_diameters.append(value)
-        min_diameter_avg = np.mean(min_diameters)
-    return min_diameter_avg
-
-def binaries_to_diameter_time(binary_location: typing.Union[str, bytes, os.PathLike], window: np.array, params_dict: dict) -> pd.DataFrame:
+    diameter_profiles, min_diameters = calculate_min_diameters(image, window)
+    return min_diameters[0]
+
+def binaries_to_diameter_time(binary_location: typing.Union[str, bytes, os.PathLike], window: np.array, params_dict: dict, chunk_size: int = 256, optional_settings: dict = {}) -> pd.DataFrame:
     """
     Converts binary image series into normalized diameter vs. time data
 
+    If binary_location holds a packed binary stack, the whole stack is read
+    at once and unpacked chunk_size frames at a time. Otherwise every image
+    in binary_location is read. Images named by frame number (e.g. 012.png)
+    are timed by that number, so a video saved with frame_step above 1 keeps
+    the correct times.
+
     Parameters
     ----------
     binary_location: path-like
-        folder where binary images are located
+        folder where binary images (or the packed binary stack) are located
     window : np.array
         array of the boundaries of the image to analyze in the format
         [left, top, right, bottom]
@@ -157,6 +231,23 @@ def binaries_to_diameter_time(binary_location: typing.Union[str, bytes, os.PathL
         dictionary of parameters from file name and metadata saved with
         binary images
         requires parameters nozzle_diameter and fps
+    chunk_size: int, optional
+        number of images to load and measure at once
+        default is 256
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    prefetch_depth: int
+        Number of binary images read ahead on a background thread while
+        images are measured. 0 to turn off reading ahead.
+        Default is 4.
+    frame_step: int
+        Measures every frame_step-th frame first, then every frame in the
+        region where D/D0 passes through tc_bounds and fitting_bounds (see
+        measure_sampled_frames). 1 to measure every frame.
+        Default is 1.
 
     Returns
     -------
@@ -164,29 +255,345 @@ def binaries_to_diameter_time(binary_location: typing.Union[str, bytes, os.PathL
         dataframe of time and D/D0 from the binary images
     """
 
-    image_list = skimage.io.imread_collection(os.path.join(binary_location,"*"))
-    time_data = []
-    diameter_data = []
+    settings = integration.set_defaults(optional_settings)
+    prefetch_depth = settings["prefetch_depth"]
+
+    stack_path = os.path.join(binary_location, binary_stack.BINARY_STACK_NAME)
+    if os.path.exists(stack_path):
+        header, packed = binary_stack.read_packed_binary_stack(stack_path)
+        frame_numbers = np.arange(header["frames"])
+        # The whole stack is already in memory, so nothing is read ahead.
+        prefetch_depth = 0
+        image_list = []
+    else:
+        image_list = skimage.io.imread_collection(os.path.join(binary_location,"*"))
+        frame_numbers = frame_numbers_from_files(image_list.files)
+
+    def measure(positions):
+        # Finds minimum diameter for stacks of images at a time, limiting the
+        # number of images held in memory at once.
+        diameter_data = []
+        with reader.PrefetchingVideo(reader.SampledVideo(image_list, positions), prefetch_depth) as frames:
+            for start in range(0, len(positions), chunk_size):
+                stop = min(start + chunk_size, len(positions))
+                if os.path.exists(stack_path):
+                    images = binary_stack.unpack_binary_frames(packed[positions[start:stop]], header["cols"])
+                else:
+                    images = np.stack([frames[i] for i in range(start, stop)])
+                diameter_profiles, min_diameters = calculate_min_diameters(images,window)
+                diameter_data.extend(min_diameters)
+        return np.asarray(diameter_data)
+
+    diameter_data, measured_data = measure_sampled_frames(measure, frame_numbers, params_dict, optional_settings)
+
+    # Places each diameter at its frame number, leaving frames without an
+    # image unmeasured.
+    frame_count = frame_numbers[-1] + 1 if len(frame_numbers) > 0 else 0
+    diameters = np.full(frame_count, np.nan)
+    diameters[frame_numbers] = diameter_data
+    measured = np.zeros(frame_count, dtype=bool)
+    measured[frame_numbers] = measured_data
+    df = diameters_to_dataframe(diameters, params_dict, measured)
+    return df
+
+def frame_numbers_from_files(files: typing.Sequence[str]) -> np.ndarray:
+    """
+    Finds the frame number of each image from its file name.
+
+    Parameters
+    ----------
+    files: sequence of strings
+        Paths to images in frame order, as in ImageCollection.files.
+
+    Returns
+    -------
+    frame_numbers: np.ndarray
+        Frame number of each image, from file names that are integers (e.g.
+        "012.png"). If any file name is not an integer, the index of each
+        image.
+    """
+
+    stems = [Path(file).stem for file in files]
+    if all(stem.isdigit() for stem in stems):
+        frame_numbers = np.array([int(stem) for stem in stems], dtype=int)
+    else:
+        frame_numbers = np.arange(len(files))
+    return frame_numbers
+
+def refinement_frames(frame_numbers: np.ndarray, normalized_diameters: np.ndarray, optional_settings: dict = {}) -> typing.Tuple[int, int]:
+    """
+    Finds the frames to measure at the full frame rate from sampled frames.
+
+    The region starts at the sampled frame before D/D0 first falls to the
+    largest value in tc_bounds and fitting_bounds, and ends at the sampled
+    frame after D/D0 then falls below the smallest value, so it includes
+    every frame add_critical_time and find_EC_slope use.
+
+    Parameters
+    ----------
+    frame_numbers: np.ndarray
+        Frame numbers of the sampled frames, in order.
+    normalized_diameters: np.ndarray
+        D/D0 of each sampled frame.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    fitting_bounds: 2 element list of floats
+        [start, end]
+        The D/D0 to bound the start and end of fitting of EC region.
+        Default is [0.1, 0.045].
+    tc_bounds: 2 element list of floats
+        [start, end]
+        The D/D0 to bound the start and end for finding the critical time.
+        Default is [0.3,0.07].
+
+    Returns
+    -------
+    first: int
+        First frame number of the region, or 0 if D/D0 never falls to the
+        bounds.
+    last: int
+        Last frame number of the region, or -1 if D/D0 never falls to the
+        bounds.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    bounds = list(settings["tc_bounds"]) + list(settings["fitting_bounds"])
+    upper = max(bounds)
+    lower = min(bounds)
+
+    below_upper = np.flatnonzero(normalized_diameters <= upper)
+    if len(below_upper) == 0:
+        return 0, -1
+    start = max(below_upper[0] - 1, 0)
+    below_lower = np.flatnonzero(normalized_diameters[below_upper[0]:] < lower)
+    if len(below_lower) == 0:
+        end = len(frame_numbers) - 1
+    else:
+        end = min(below_upper[0] + below_lower[0] + 1, len(frame_numbers) - 1)
+    return int(frame_numbers[start]), int(frame_numbers[end])
+
+def measure_sampled_frames(measure: typing.Callable, frame_numbers: np.ndarray, params_dict: dict, optional_settings: dict = {}) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Measures the minimum diameter of frames, coarsely first if frame_step is above 1.
+
+    With frame_step above 1, the frames whose frame number is a multiple of
+    frame_step are measured first. Every other frame in the region found by
+    refinement_frames (extended to the last frame if it ends at the last
+    sampled frame) is then measured. Frames outside that region are not
+    measured, so D/D0 there is only known every frame_step frames.
+
+    Parameters
+    ----------
+    measure: callable
+        Called as measure(positions) with an array of positions in
+        frame_numbers, in order. Returns the minimum diameter of the frame
+        at each position. May return fewer diameters (e.g. after stopping at
+        filament breakup), which are taken as the first positions.
+    frame_numbers: np.ndarray
+        Frame number of each frame that can be measured, in order.
+    params_dict: dict
+        dictionary of parameters, requires nozzle_diameter
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    frame_step: int
+        Measures every frame_step-th frame before refining. 1 to measure
+        every frame.
+        Default is 1.
+    fitting_bounds: 2 element list of floats
+        The D/D0 to bound the start and end of fitting of EC region.
+        Default is [0.1, 0.045].
+    tc_bounds: 2 element list of floats
+        The D/D0 to bound the start and end for finding the critical time.
+        Default is [0.3,0.07].
+
+    Returns
+    -------
+    diameters: np.ndarray
+        Minimum diameter of each frame in frame_numbers, np.nan where not
+        measured or where measure found no diameter.
+    measured: np.ndarray
+        True for each frame in frame_numbers that was measured.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    frame_step = settings["frame_step"]
+
+    frame_numbers = np.asarray(frame_numbers)
+    diameters = np.full(len(frame_numbers), np.nan)
+    measured = np.zeros(len(frame_numbers), dtype=bool)
+
+    def measure_positions(positions):
+        # Stores the diameters measure returns, which may stop early.
+        results = measure(positions)
+        diameters[positions[:len(results)]] = results
+        measured[positions[:len(results)]] = True
+        return positions[:len(results)]
+
+    if frame_step <= 1:
+        measure_positions(np.arange(len(frame_numbers)))
+        return diameters, measured
+
+    # Coarse pass over every frame_step-th frame.
+    coarse = measure_positions(np.flatnonzero(frame_numbers % frame_step == 0))
+
+    # Fine pass over the region used for the critical time and fitting.
+    nozzle_diameter = int(params_dict["nozzle_diameter"])
+    first, last = refinement_frames(frame_numbers[coarse], diameters[coarse]/nozzle_diameter, optional_settings)
+    if len(coarse) > 0 and last == frame_numbers[coarse[-1]]:
+        # D/D0 may fall below the bounds after the last sampled frame.
+        last = frame_numbers[-1]
+    in_region = (frame_numbers >= first) & (frame_numbers <= last)
+    fine = np.flatnonzero(in_region & ~measured)
+    if len(fine) > 0:
+        measure_positions(fine)
+    return diameters, measured
+
+    ## TODO: errors if missing parameters
+
+def diameters_to_dataframe(diameters: np.array, params_dict: dict, measured: typing.Optional[np.ndarray] = None) -> pd.DataFrame:
+    """
+    Converts minimum diameters for each frame into normalized diameter vs. time data
+
+    Parameters
+    ----------
+    diameters: np.array
+        minimum diameter (in pixels) of each frame of the video, in order
+    params_dict:
+        dictionary of parameters from file name and metadata saved with
+        binary images
+        requires parameters nozzle_diameter and fps
+    measured: np.ndarray, optional
+        True for each frame that was measured (see measure_sampled_frames).
+        Frames that were not measured are left out of the dataframe. Frames
+        that were measured keep their diameter, even if it is np.nan.
+        Default is None, which keeps every frame.
+
+    Returns
+    -------
+    diameters_to_dataframe: pd.DataFrame
+        dataframe of time and D/D0 for each frame
+    """
 
     # Collects needed parameters from params_dict.
     nozzle_diameter = int(params_dict["nozzle_diameter"])
     fps = params_dict["fps"]
 
-    # Iterates through images and find minimum diameter for each image.
-    for count, image in enumerate(image_list):
-        diameter = calculate_min_diameter(image,window)
-        normalized_diameter = diameter/nozzle_diameter
-        frame_time = count/fps
-        diameter_data.append(normalized_diameter)
-        time_data.append(frame_time)
+    # Normalizes diameters and finds the time of each frame from its number.
+    diameter_data = np.asarray(diameters)/nozzle_diameter
+    time_data = np.arange(len(diameter_data))/fps
 
     # Constructs DataFrame.
     # Note that normalized diameter and normalized diameter are equivalent.
     data = {"time (s)" : time_data, "D/D0" : diameter_data}
     df = pd.DataFrame(data)
+    if measured is not None:
+        # Drops frames that were not measured (e.g. skipped by frame_step).
+        df = df[np.asarray(measured)].reset_index(drop=True)
     return df
 
-    ## TODO: errors if missing parameters
+def save_diameter_csv(df: pd.DataFrame, csv_location: typing.Union[str, bytes, os.PathLike], folder_name: str, optional_settings: dict = {}) -> None:
+    """
+    Saves dataframe of normalized diameter vs. time to csv_location
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        dataframe of time and D/D0 to save
+    csv_location: path-like
+        The path to the folder in which csv should be saved.
+    folder_name: str
+        Base name (no extension) of the csv, named after the folder of
+        processed images.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    skip_existing: bool
+        Determines the behavior when a file already appears exists
+        when a function would generate it. True to skip any existing files.
+        False to overwrite (or delete and then write, where overwriting would
+        generate an error).
+        Default is True.
+    verbose: bool
+        Determines whether processing functions print statements as they
+        progress through major steps. True to see print statements, False to
+        hide non-errors/warnings.
+        Default is False.
+
+    Returns
+    -------
+    Saved csv on disk.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    skip_existing = settings["skip_existing"]
+    verbose = settings["verbose"]
+
+    save_path = os.path.join(csv_location,folder_name + ".csv")
+    if os.path.exists(save_path):
+        if not skip_existing:
+            # Replaces existing csv with new csv
+            write_csv_atomic(df, save_path)
+            if verbose:
+                #If verbose, prints that csv overwritten.
+                print(folder_name + ".csv already exists and skip_existing is False. Existing file overwritten.")
+    else:
+        write_csv_atomic(df, save_path)
+        if verbose:
+            #If verbose, prints that csv overwritten.
+            print(folder_name + ".csv saved.")
+    pass
+
+def write_csv_atomic(df: pd.DataFrame, save_path: typing.Union[str, bytes, os.PathLike]) -> None:
+    """
+    Saves a dataframe to a csv through a temporary file moved into place.
+
+    An interrupted save never leaves a truncated csv at save_path, which
+    would otherwise be skipped as complete by later runs.
+    """
+
+    partial_path = str(save_path) + ".partial"
+    df.to_csv(partial_path)
+    os.replace(partial_path, save_path)
+    pass
+
+def binary_image_shape(binary_location: typing.Union[str, bytes, os.PathLike]) -> typing.Tuple[int,int]:
+    """
+    Finds the shape of the binary images of a video.
+
+    Parameters
+    ----------
+    binary_location: path-like
+        folder where binary images (or the packed binary stack) are located
+
+    Returns
+    -------
+    height: int
+        number of rows in each binary image
+    width: int
+        number of columns in each binary image
+
+    Raises
+    ------
+    FileNotFoundError: If there are no binary images in binary_location.
+    """
+
+    stack_path = os.path.join(binary_location, binary_stack.BINARY_STACK_NAME)
+    if os.path.exists(stack_path):
+        header = binary_stack.read_binary_stack_header(stack_path)
+        return header["rows"], header["cols"]
+    image_list = skimage.io.imread_collection(os.path.join(binary_location,"*"))
+    if len(image_list) == 0:
+        raise FileNotFoundError("No binary images found in " + str(binary_location))
+    (height, width) = np.shape(image_list[0])
+    return height, width
 
 def binary_images_to_csv(images_location: typing.Union[str, bytes, os.PathLike], csv_location: typing.Union[str, bytes, os.PathLike], fps: float, optional_settings: dict = {}) -> None:
     """
@@ -214,6 +621,15 @@ def binary_images_to_csv(images_location: typing.Union[str, bytes, os.PathLike],
         False to overwrite (or delete and then write, where overwriting would
         generate an error).
         Default is True.
+    use_cache: bool
+        True to skip the csv only if the cache manifest in images_location
+        records it as made from the current binary images with the current
+        settings and fps, and overwrite it otherwise. Replaces skip_existing.
+        Default is False.
+    profile: bool
+        True to time measuring the binary images ("measure") and saving the
+        csv ("write_csv") as events (see profiling.timer).
+        Default is False.
 
     Returns
     -------
@@ -223,6 +639,7 @@ def binary_images_to_csv(images_location: typing.Union[str, bytes, os.PathLike],
     settings = integration.set_defaults(optional_settings)
     skip_existing = settings["skip_existing"]
     verbose = settings["verbose"]
+    use_cache = settings["use_cache"]
 
     binary_location = os.path.join(images_location,"bin")
 
@@ -231,33 +648,33 @@ def binary_images_to_csv(images_location: typing.Union[str, bytes, os.PathLike],
     params_dict = {"fps": fps}
     params_dict = add_saved_params_to_dict(images_location,params_dict)
 
+    csv_exists = os.path.exists(os.path.join(csv_location,folder_name + ".csv"))
+    if use_cache:
+        # The csv is only cached if the binary images it was made from are.
+        csv_key = cache.derived_key(cache.read_manifest(images_location).get("bin"), "csv", optional_settings, {"fps": fps})
+        csv_exists = csv_exists and cache.is_cached(images_location, "csv", csv_key)
+        skip_existing = True
+        optional_settings = dict(optional_settings)
+        optional_settings["skip_existing"] = False
+
     # Skips processing if csv already exists and skip_existing is True
-    if not os.path.exists(os.path.join(csv_location,folder_name + ".csv")) or not skip_existing:
-        # Constructs window based on first image.
-        first_image = os.path.join(binary_location,"000.png")
-        image = skimage.io.imread(first_image)
-        (height, width) = image.shape
+    if not csv_exists or not skip_existing:
+        if use_cache:
+            cache.start_stage(images_location, "csv")
+        # Constructs window based on the shape of the binary images.
+        (height, width) = binary_image_shape(binary_location)
         ### window: [left, top, right, bottom]
         window_top = int(params_dict["window_top"])
         window = [0,window_top,width,height]
 
 
         # Converts binaries to DataFrame to csv.
-        df = binaries_to_diameter_time(binary_location,window,params_dict)
-        save_path = os.path.join(csv_location,folder_name + ".csv")
-        if os.path.exists(save_path):
-            if not skip_existing:
-                # Deletes existing csv to replace it with new csv
-                os.remove(save_path)
-                df.to_csv(save_path)
-                if verbose:
-                    #If verbose, prints that csv overwritten.
-                    print(folder_name + ".csv already exists and skip_existing is False. Existing file overwritten.")
-        else:
-            df.to_csv(save_path)
-            if verbose:
-                #If verbose, prints that csv overwritten.
-                print(folder_name + ".csv saved.")
+        with profiling.timer("measure", settings["profile"]):
+            df = binaries_to_diameter_time(binary_location,window,params_dict,optional_settings=optional_settings)
+        with profiling.timer("write_csv", settings["profile"]):
+            save_diameter_csv(df, csv_location, folder_name, optional_settings)
+        if use_cache:
+            cache.finish_stage(images_location, "csv", csv_key)
     elif verbose:
         # If verbose, prints that csv save was skipped.
         print(folder_name + ".csv already exists and skip_existing is True. binary_images_to_csv skipped.")
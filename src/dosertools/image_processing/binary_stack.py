@@ -0,0 +1,236 @@
+import numpy as np
+import os
+import typing
+
+# Name of the packed binary stack file saved in the "bin" folder.
+BINARY_STACK_NAME = "binary_stack.dbs"
+
+# First bytes of every packed binary stack file.
+MAGIC = b"DOSBIN01"
+
+# Extension added to stack files while they are being written.
+PARTIAL_EXTENSION = ".partial"
+
+# Header after MAGIC: frames, rows, columns, frames per chunk.
+HEADER_DTYPE = np.dtype([("frames", "<u4"), ("rows", "<u4"), ("cols", "<u4"), ("chunk_frames", "<u4")])
+HEADER_SIZE = len(MAGIC) + HEADER_DTYPE.itemsize
+
+class BinaryStackWriter:
+    """
+    Writes binary images one at a time to a packed binary stack file.
+
+    Each frame is stored bit-packed with np.packbits along its rows (one bit
+    per pixel, rows padded to a whole byte), after a header holding the
+    number of frames, the shape of the frames, and the chunk size. Frames
+    are written to disk chunk_frames at a time. The number of frames in the
+    header is set when the writer is closed. The file is written as path +
+    PARTIAL_EXTENSION and only moved to path when the writer is closed, so an
+    interrupted video never leaves a stack at path.
+
+    Parameters
+    ----------
+    path: path-like
+        Path of the file to write.
+    chunk_frames: int, optional
+        Number of frames held in memory before they are written to disk.
+        Default is 256.
+    """
+
+    def __init__(self, path: typing.Union[str, bytes, os.PathLike], chunk_frames: int = 256):
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.frames = 0
+        self.shape = None
+        self.chunk = []
+        self.partial_path = str(path) + PARTIAL_EXTENSION
+        self.file = open(self.partial_path, "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def append(self, image: np.ndarray) -> None:
+        """
+        Adds a binary image (nonzero pixels are white) to the stack.
+
+        Raises
+        ------
+        ValueError: If the image is not the same shape as the first image.
+        """
+
+        image = np.asarray(image)
+        if self.shape is None:
+            self.shape = np.shape(image)
+            self.write_header()
+        elif np.shape(image) != self.shape:
+            raise ValueError("All images in a binary stack must be the same shape.")
+        self.chunk.append(np.packbits(image != 0, axis=-1))
+        self.frames = self.frames + 1
+        if len(self.chunk) >= self.chunk_frames:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the frames held in memory to disk.
+        """
+
+        if self.chunk != []:
+            self.file.write(np.stack(self.chunk).tobytes())
+            self.chunk = []
+
+    def write_header(self) -> None:
+        """
+        Writes the header at the start of the file.
+        """
+
+        (rows, cols) = self.shape if self.shape is not None else (0, 0)
+        header = np.array([(self.frames, rows, cols, self.chunk_frames)], dtype=HEADER_DTYPE)
+        position = self.file.tell()
+        self.file.seek(0)
+        self.file.write(MAGIC + header.tobytes())
+        if position > 0:
+            self.file.seek(position)
+
+    def close(self) -> None:
+        """
+        Writes remaining frames and the final header, then closes the file.
+        """
+
+        if not self.file.closed:
+            self.flush()
+            self.write_header()
+            self.file.close()
+            os.replace(self.partial_path, self.path)
+
+    def abort(self) -> None:
+        """
+        Stops writing and removes the temporary file.
+        """
+
+        if not self.file.closed:
+            self.file.close()
+            os.remove(self.partial_path)
+
+def write_binary_stack(path: typing.Union[str, bytes, os.PathLike], images: np.ndarray, chunk_frames: int = 256) -> None:
+    """
+    Saves a stack of binary images as a packed binary stack file.
+
+    Parameters
+    ----------
+    path: path-like
+        Path of the file to write.
+    images: np.ndarray
+        Binary images with shape (frames, rows, columns), or any iterable of
+        binary images of the same shape. Nonzero pixels are white.
+    chunk_frames: int, optional
+        Number of frames written to disk at once.
+        Default is 256.
+
+    Returns
+    -------
+    Packed binary stack saved at path.
+    """
+
+    with BinaryStackWriter(path, chunk_frames) as writer:
+        for image in images:
+            writer.append(image)
+
+def read_binary_stack_header(path: typing.Union[str, bytes, os.PathLike]) -> dict:
+    """
+    Reads the header of a packed binary stack file.
+
+    Parameters
+    ----------
+    path: path-like
+        Path of the packed binary stack file.
+
+    Returns
+    -------
+    header: dict
+        Dictionary with the number of frames ("frames"), the shape of each
+        frame ("rows" and "cols"), and the chunk size ("chunk_frames").
+
+    Raises
+    ------
+    ValueError: If the file is not a packed binary stack.
+    """
+
+    with open(path, "rb") as f:
+        contents = f.read(HEADER_SIZE)
+    if len(contents) < HEADER_SIZE or contents[:len(MAGIC)] != MAGIC:
+        raise ValueError(str(path) + " is not a packed binary stack.")
+    header = np.frombuffer(contents[len(MAGIC):], dtype=HEADER_DTYPE)[0]
+    return {name: int(header[name]) for name in HEADER_DTYPE.names}
+
+def read_packed_binary_stack(path: typing.Union[str, bytes, os.PathLike]) -> typing.Tuple[dict, np.ndarray]:
+    """
+    Reads a whole packed binary stack file in one read, without unpacking.
+
+    Parameters
+    ----------
+    path: path-like
+        Path of the packed binary stack file.
+
+    Returns
+    -------
+    header: dict
+        The header of the file, as returned by read_binary_stack_header.
+    packed: np.ndarray
+        np.uint8 array with shape (frames, rows, ceil(cols/8)) of the packed
+        frames. Use unpack_binary_frames to unpack.
+    """
+
+    header = read_binary_stack_header(path)
+    packed_cols = (header["cols"] + 7) // 8
+    count = header["frames"] * header["rows"] * packed_cols
+    packed = np.fromfile(path, dtype=np.uint8, count=count, offset=HEADER_SIZE)
+    if np.size(packed) != count:
+        raise ValueError(str(path) + " is too short for the frames in its header.")
+    packed = packed.reshape(header["frames"], header["rows"], packed_cols)
+    return header, packed
+
+def unpack_binary_frames(packed: np.ndarray, cols: int) -> np.ndarray:
+    """
+    Unpacks packed frames into binary images with values 0 and 255.
+
+    Parameters
+    ----------
+    packed: np.ndarray
+        Packed frames, as returned by read_packed_binary_stack.
+    cols: int
+        Number of columns in each frame.
+
+    Returns
+    -------
+    images: np.ndarray
+        np.uint8 binary images with values 0 and 255, the same as binary
+        images saved as .png.
+    """
+
+    images = np.unpackbits(packed, axis=-1, count=cols)
+    return images*np.uint8(255)
+
+def read_binary_stack(path: typing.Union[str, bytes, os.PathLike]) -> np.ndarray:
+    """
+    Reads a whole packed binary stack file into a stack of binary images.
+
+    Parameters
+    ----------
+    path: path-like
+        Path of the packed binary stack file.
+
+    Returns
+    -------
+    images: np.ndarray
+        np.uint8 binary images with shape (frames, rows, columns) and values
+        0 and 255.
+    """
+
+    header, packed = read_packed_binary_stack(path)
+    images = unpack_binary_frames(packed, header["cols"])
+    return images
@@ -0,0 +1,75 @@
+import numpy as np
+import os
+import typing
+
+import tifffile
+
+# Extension added to stack files while they are being written.
+PARTIAL_EXTENSION = ".partial"
+
+class TiffStackWriter:
+    """
+    Writes images one at a time as the pages of a single multi-page TIFF.
+
+    Pages are written through tifffile's buffered writer to a temporary file
+    (path + PARTIAL_EXTENSION), which is renamed to path when the writer is
+    closed. A stack at path is therefore always complete; an interrupted
+    video only leaves the temporary file.
+
+    Parameters
+    ----------
+    path: path-like
+        Path of the TIFF to write.
+    compression: string or None, optional
+        Lossless compression passed to tifffile (e.g. "zlib", "zstd", "lzma").
+        None to save uncompressed pages, which are stored contiguously so the
+        stack can be memory-mapped.
+        Default is None.
+    """
+
+    def __init__(self, path: typing.Union[str, bytes, os.PathLike], compression: typing.Optional[str] = None):
+        self.path = path
+        self.compression = compression
+        self.partial_path = str(path) + PARTIAL_EXTENSION
+        self.tif = tifffile.TiffWriter(self.partial_path, bigtiff=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def append(self, image: np.ndarray) -> None:
+        """
+        Adds an image to the stack as a new page.
+        """
+
+        if self.compression is None:
+            self.tif.write(image, contiguous=True)
+        else:
+            # Pages without metadata are read back as one series of uniform
+            # pages.
+            self.tif.write(image, compression=self.compression, metadata=None)
+
+    def close(self) -> None:
+        """
+        Finishes writing and moves the stack to path.
+        """
+
+        if self.tif is not None:
+            self.tif.close()
+            self.tif = None
+            os.replace(self.partial_path, self.path)
+
+    def abort(self) -> None:
+        """
+        Stops writing and removes the temporary file.
+        """
+
+        if self.tif is not None:
+            self.tif.close()
+            self.tif = None
+            os.remove(self.partial_path)
@@ -0,0 +1,229 @@
+import numpy as np
+import os
+import typing
+import xml.etree.ElementTree as ElementTree
+
+# Locations of header values in .cihx files, keyed by the name used for the
+# same value in .cih files.
+CIHX_FIELDS = {
+    "Record Rate(fps)": "recordInfo/recordRate",
+    "Shutter Speed(s)": "recordInfo/shutterSpeed",
+    "Total Frame": "frameInfo/totalFrame",
+    "Start Frame": "frameInfo/startFrame",
+    "Image Width": "imageDataInfo/resolution/width",
+    "Image Height": "imageDataInfo/resolution/height",
+    "Color Type": "imageDataInfo/colorInfo/type",
+    "Color Bit": "imageDataInfo/colorInfo/bit",
+    "EffectiveBit Depth": "imageDataInfo/effectiveBit/depth",
+    "EffectiveBit Side": "imageDataInfo/effectiveBit/side",
+    "File Format": "imageFileInfo/fileFormat",
+}
+
+# Header values converted to integers.
+INTEGER_FIELDS = ["Total Frame", "Start Frame", "Image Width", "Image Height", "Color Bit", "EffectiveBit Depth"]
+
+def read_cih(header_path: typing.Union[str, bytes, os.PathLike]) -> dict:
+    """
+    Reads the header of a Photron recording from a .cihx or .cih file.
+
+    .cihx files are XML (possibly preceded by binary data) and .cih files are
+    text with one "Key : Value" entry per line. Values from .cihx files are
+    returned under the keys used in .cih files, so either header gives the
+    same dictionary.
+
+    Parameters
+    ----------
+    header_path: path-like
+        Path to the .cihx or .cih file.
+
+    Returns
+    -------
+    header: dict
+        Header values, keyed as in .cih files (e.g. "Image Width",
+        "Total Frame", "Color Bit"). Values listed in INTEGER_FIELDS are
+        integers, all other values are strings.
+
+    Raises
+    ------
+    ValueError: If a .cihx file does not contain a <cih> element.
+    """
+
+    with open(header_path, "rb") as f:
+        contents = f.read()
+
+    header = {}
+    if str(header_path).lower().endswith(".cihx"):
+        start = contents.find(b"<cih>")
+        end = contents.find(b"</cih>")
+        if start == -1 or end == -1:
+            raise ValueError("No <cih> element found in " + str(header_path))
+        root = ElementTree.fromstring(contents[start:end + len(b"</cih>")])
+        for key, location in CIHX_FIELDS.items():
+            element = root.find(location)
+            if element is not None and element.text is not None:
+                header[key] = element.text.strip()
+    else:
+        for line in contents.decode("latin-1").splitlines():
+            if " : " in line:
+                key, value = line.split(" : ", 1)
+                header[key.strip()] = value.strip()
+
+    for key in INTEGER_FIELDS:
+        if key in header:
+            header[key] = int(header[key])
+    return header
+
+def find_cih(mraw_path: typing.Union[str, bytes, os.PathLike]) -> str:
+    """
+    Finds the header file (.cihx preferred, then .cih) for a .mraw file.
+
+    Parameters
+    ----------
+    mraw_path: path-like
+        Path to the .mraw file.
+
+    Returns
+    -------
+    header_path: string
+        Path to the header file with the same name as the .mraw file.
+
+    Raises
+    ------
+    FileNotFoundError: If neither a .cihx nor a .cih file exists.
+    """
+
+    base = os.path.splitext(mraw_path)[0]
+    for extension in [".cihx", ".cih"]:
+        if os.path.exists(base + extension):
+            return base + extension
+    raise FileNotFoundError("No .cihx or .cih header found for " + str(mraw_path))
+
+def unpack_12bit(packed: np.ndarray) -> np.ndarray:
+    """
+    Unpacks 12-bit pixels packed into bytes, two pixels per three bytes.
+
+    The first pixel is the first byte and the high half of the second byte,
+    the second pixel is the low half of the second byte and the third byte.
+
+    Parameters
+    ----------
+    packed: np.ndarray
+        Array of np.uint8 with a last axis that is a multiple of 3 in length.
+
+    Returns
+    -------
+    unpacked: np.ndarray
+        Array of np.uint16 with the last axis 2/3 of the length of the input
+        last axis.
+    """
+
+    packed = np.asarray(packed, dtype=np.uint8)
+    groups = packed.reshape(packed.shape[:-1] + (packed.shape[-1] // 3, 3)).astype(np.uint16)
+    unpacked = np.empty(groups.shape[:-1] + (2,), dtype=np.uint16)
+    unpacked[..., 0] = (groups[..., 0] << 4) | (groups[..., 1] >> 4)
+    unpacked[..., 1] = ((groups[..., 1] & 15) << 8) | groups[..., 2]
+    return unpacked.reshape(packed.shape[:-1] + (packed.shape[-1] // 3 * 2,))
+
+class MrawVideo:
+    """
+    A video read from a Photron .mraw file.
+
+    The .mraw file is memory-mapped, so frames are read from disk only as
+    they are indexed. 8-bit and 16-bit frames are views of the file, 12-bit
+    frames are unpacked into new np.uint16 arrays.
+
+    Parameters
+    ----------
+    mraw_path: path-like
+        Path to the .mraw file.
+    header: dict
+        The header of the recording, as returned by read_cih.
+
+    Raises
+    ------
+    ValueError: If the recording is not a monochrome MRaw recording with 8,
+        12, or 16 bits per pixel, or if the .mraw file is too short for the
+        frames in the header.
+    """
+
+    def __init__(self, mraw_path: typing.Union[str, bytes, os.PathLike], header: dict):
+        self.mraw_path = mraw_path
+        self.header = header
+        self.width = header["Image Width"]
+        self.height = header["Image Height"]
+        self.bit = header["Color Bit"]
+        frame_count = header["Total Frame"]
+
+        if header.get("File Format", "MRaw").lower() != "mraw":
+            raise ValueError("Only MRaw recordings can be read, not " + str(header["File Format"]))
+        if header.get("Color Type", "Mono").lower() != "mono":
+            raise ValueError("Only monochrome recordings can be read.")
+        if self.bit not in [8, 12, 16]:
+            raise ValueError("Color Bit must be 8, 12, or 16.")
+        if self.bit == 12 and (self.width * self.height) % 2 != 0:
+            raise ValueError("12-bit recordings must have an even number of pixels per frame.")
+
+        # Number of bytes in each frame.
+        frame_bytes = self.width * self.height * self.bit // 8
+        if os.path.getsize(mraw_path) < frame_bytes * frame_count:
+            raise ValueError(str(mraw_path) + " is too short for the frames in its header.")
+
+        if self.bit == 16:
+            self.frames = np.memmap(mraw_path, dtype='<u2', mode='r', shape=(frame_count, self.height, self.width))
+        else:
+            self.frames = np.memmap(mraw_path, dtype=np.uint8, mode='r', shape=(frame_count, frame_bytes))
+
+    def __len__(self) -> int:
+        return np.shape(self.frames)[0]
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.read_roi(index, slice(None), slice(None))
+
+    def __iter__(self):
+        for index in range(0, len(self)):
+            yield self[index]
+
+    def read_roi(self, index: int, row_slice: slice, col_slice: slice) -> np.ndarray:
+        """
+        Reads a region of interest of a frame.
+
+        12-bit frames only unpack the rows in row_slice when each row starts
+        on a whole byte (even image width).
+        """
+
+        frame = self.frames[index]
+        if self.bit == 8:
+            image = np.asarray(frame).reshape(self.height, self.width)[row_slice, col_slice]
+        elif self.bit == 16:
+            image = np.asarray(frame)[row_slice, col_slice]
+            depth = self.header.get("EffectiveBit Depth", 16)
+            if str(self.header.get("EffectiveBit Side", "Lower")).lower() == "higher" and depth < 16:
+                # Moves pixels stored in the high bits down to the low bits.
+                image = image >> (16 - depth)
+        elif self.width % 2 == 0:
+            # Rows are whole bytes, so only the needed rows are unpacked.
+            rows = np.asarray(frame).reshape(self.height, self.width * 3 // 2)
+            image = unpack_12bit(rows[row_slice])[:, col_slice]
+        else:
+            image = unpack_12bit(frame).reshape(self.height, self.width)[row_slice, col_slice]
+        return image
+
+def read_mraw(mraw_path: typing.Union[str, bytes, os.PathLike]) -> MrawVideo:
+    """
+    Reads a Photron .mraw recording using the .cihx or .cih header beside it.
+
+    Parameters
+    ----------
+    mraw_path: path-like
+        Path to the .mraw file. The header must have the same name with the
+        extension .cihx or .cih.
+
+    Returns
+    -------
+    video: MrawVideo
+        The frames of the recording, read from disk as they are indexed.
+    """
+
+    header = read_cih(find_cih(mraw_path))
+    video = MrawVideo(mraw_path, header)
+    return video
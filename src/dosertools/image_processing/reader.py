@@ -0,0 +1,302 @@
+import numpy as np
+import os
+import threading
+import typing
+import collections
+import concurrent.futures
+
+import tifffile
+
+def read_tiff_roi(path: typing.Union[str, bytes, os.PathLike], row_slice: slice, col_slice: slice) -> np.ndarray:
+    """
+    Reads a region of interest of a single-page TIFF, decoding only the strips it needs.
+
+    For striped TIFFs (the common layout for camera exports), only the strips
+    that overlap the rows in row_slice are read from disk and decoded. Other
+    layouts (tiled, multi-sample, or multi-page files) are decoded in full and
+    then sliced, so the result is always the same as slicing the full image.
+
+    Parameters
+    ----------
+    path: path-like
+        Path to the TIFF file to read.
+    row_slice: slice
+        Rows of the image to return, as used to index the full image.
+    col_slice: slice
+        Columns of the image to return, as used to index the full image.
+
+    Returns
+    -------
+    read_tiff_roi: np.ndarray
+        The image, indexed by [row_slice, col_slice].
+    """
+
+    with tifffile.TiffFile(path) as tif:
+        page = tif.pages[0]
+        height = page.imagelength
+        width = page.imagewidth
+        (row_start, row_stop, row_step) = row_slice.indices(height)
+
+        # Falls back to decoding the full image for layouts where strips are
+        # not full rows of single-sample pixels.
+        striped = (not page.is_tiled and page.samplesperpixel == 1 and
+                   page.planarconfig == 1 and len(tif.pages) == 1)
+        if not striped or row_step != 1 or row_stop <= row_start:
+            return page.asarray()[row_slice, col_slice]
+
+        rows_per_strip = min(page.rowsperstrip, height)
+        first_strip = row_start // rows_per_strip
+        last_strip = (row_stop - 1) // rows_per_strip
+        strips = range(first_strip, last_strip + 1)
+
+        roi = np.empty((row_stop - row_start, width), dtype=page.dtype)
+        offsets = [page.dataoffsets[i] for i in strips]
+        bytecounts = [page.databytecounts[i] for i in strips]
+        segments = tif.filehandle.read_segments(offsets, bytecounts, indices=strips, sort=False)
+        for data, index in segments:
+            strip, strip_index, shape = page.decode(data, index)
+            strip = np.reshape(strip, (shape[1], shape[2]))
+            # Copies the rows of the strip that overlap the region of interest.
+            strip_start = strip_index[2]
+            start = max(strip_start, row_start)
+            stop = min(strip_start + np.shape(strip)[0], row_stop)
+            roi[start - row_start:stop - row_start] = strip[start - strip_start:stop - strip_start]
+    return roi[:, col_slice]
+
+def memmap_tiff(path: typing.Union[str, bytes, os.PathLike]) -> typing.Optional[np.ndarray]:
+    """
+    Memory-maps the pixel data of a single-page TIFF as a read-only array.
+
+    Parameters
+    ----------
+    path: path-like
+        Path to the TIFF file to map.
+
+    Returns
+    -------
+    memmap_tiff: np.ndarray or None
+        A view of the pixel data in the file. None if the file cannot be
+        memory-mapped (compressed, striped with gaps, bit-packed such as
+        12-bit camera exports, or multi-page).
+    """
+
+    with tifffile.TiffFile(path) as tif:
+        page = tif.pages[0]
+        if len(tif.pages) != 1 or not page.is_memmappable:
+            return None
+        dtype = np.dtype(tif.byteorder + page.dtype.char)
+        offset = page.dataoffsets[0]
+        shape = page.shape
+    image = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape, order='C')
+    # Views the memory map as an ndarray so results of arithmetic on the image
+    # are not memmap instances.
+    return np.asarray(image)
+
+def read_tiff_memmap(path: typing.Union[str, bytes, os.PathLike]) -> np.ndarray:
+    """
+    Reads a single-page TIFF as a read-only view of the file on disk.
+
+    Uncompressed TIFFs with contiguous pixel data are memory-mapped, so no
+    pixel data is copied until it is used. Other TIFFs are decoded into a
+    new array as usual.
+
+    Parameters
+    ----------
+    path: path-like
+        Path to the TIFF file to read.
+
+    Returns
+    -------
+    read_tiff_memmap: np.ndarray
+        The image, as a view of the memory-mapped file where possible.
+    """
+
+    image = memmap_tiff(path)
+    if image is None:
+        image = tifffile.imread(path)
+    return image
+
+class MemmapVideo:
+    """
+    A video read from single-page TIFF files as memory-mapped views.
+
+    Frames are read with read_tiff_memmap as they are indexed, so frames of
+    uncompressed TIFFs are views of the files on disk rather than new arrays.
+
+    Parameters
+    ----------
+    files: list of path-like
+        The TIFF files of the video, one frame per file, in order.
+    """
+
+    def __init__(self, files: typing.List[typing.Union[str, bytes, os.PathLike]]):
+        self.files = list(files)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return read_tiff_memmap(self.files[index])
+
+    def __iter__(self):
+        for index in range(0, len(self)):
+            yield self[index]
+
+    def read_roi(self, index: int, row_slice: slice, col_slice: slice) -> np.ndarray:
+        """
+        Reads a region of interest of a frame.
+
+        Memory-mapped frames are sliced without copying. Frames that cannot be
+        memory-mapped are read with read_tiff_roi.
+        """
+        image = memmap_tiff(self.files[index])
+        if image is None:
+            return read_tiff_roi(self.files[index], row_slice, col_slice)
+        return image[row_slice, col_slice]
+
+class CroppedVideo:
+    """
+    Lazily crops each frame of a video as it is indexed.
+
+    Frames from TIFF files are read with read_tiff_roi, so only the part of
+    the file that covers the crop is decoded. Frames of videos with a
+    read_roi method (MemmapVideo, mraw.MrawVideo) are read with that method. Frames from any other video are loaded
+    in full and then sliced.
+
+    Parameters
+    ----------
+    video: skimage.io.collection.ImageCollection or sequence of np.ndarray
+        The video to crop. If it has a "files" attribute listing TIFF files
+        (as an ImageCollection does), frames are read from those files.
+    row_slice: slice
+        Rows of each frame to keep.
+    col_slice: slice
+        Columns of each frame to keep.
+    """
+
+    def __init__(self, video, row_slice: slice, col_slice: slice):
+        self.video = video
+        self.row_slice = row_slice
+        self.col_slice = col_slice
+        files = getattr(video, "files", None)
+        tiff_extensions = (".tif", ".tiff")
+        # Each file must hold exactly one frame for files to map onto frames.
+        if files and len(files) == len(video) and all(str(file).lower().endswith(tiff_extensions) for file in files):
+            self.files = list(files)
+        else:
+            self.files = None
+        # Other videos (e.g. an ImageCollection caching its last frame) may
+        # not be safe to read from several threads at once.
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.video)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        if hasattr(self.video, "read_roi"):
+            return self.video.read_roi(index, self.row_slice, self.col_slice)
+        if self.files is not None:
+            return read_tiff_roi(self.files[index], self.row_slice, self.col_slice)
+        with self.lock:
+            image = np.asarray(self.video[index])
+        return image[self.row_slice, self.col_slice]
+
+    def __iter__(self):
+        for index in range(0, len(self)):
+            yield self[index]
+
+class SampledVideo:
+    """
+    A view of chosen frames of a video, in the order given.
+
+    Parameters
+    ----------
+    video: sequence of np.ndarray
+        The video to take frames from.
+    frames: sequence of int
+        Indices of the frames of video to include.
+    """
+
+    def __init__(self, video, frames: typing.Sequence[int]):
+        self.video = video
+        self.frames = frames
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.video[int(self.frames[index])]
+
+    def __iter__(self):
+        for index in range(0, len(self)):
+            yield self[index]
+
+class PrefetchingVideo:
+    """
+    Reads upcoming frames of a video on a background thread.
+
+    While frame i is being processed, frames i+1 to i+depth are already being
+    read and decoded, so reading overlaps with processing. Frames are
+    prefetched assuming they are indexed in order; indexing any other frame
+    reads it directly and restarts the prefetching from there. Only index a
+    PrefetchingVideo from one thread.
+
+    Parameters
+    ----------
+    video: sequence of np.ndarray
+        The video to read (e.g. an ImageCollection or a CroppedVideo).
+    depth: int
+        Number of frames to read ahead. 0 to read each frame only when it
+        is indexed.
+    """
+
+    def __init__(self, video, depth: int):
+        self.video = video
+        self.depth = depth
+        self.futures = collections.deque()
+        # Index of the frame held by the first future in self.futures.
+        self.next_index = 0
+        self.executor = None
+        if depth > 0:
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.video)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        if self.executor is None:
+            return self.video[index]
+        if index != self.next_index or not self.futures:
+            # Restarts prefetching from this frame.
+            for future in self.futures:
+                future.cancel()
+            self.futures = collections.deque(self.executor.submit(self.video.__getitem__, i) for i in range(index, min(index + self.depth, len(self))))
+            self.next_index = index
+        future = self.futures.popleft()
+        self.next_index = index + 1
+        upcoming = index + len(self.futures) + 1
+        if upcoming < len(self):
+            self.futures.append(self.executor.submit(self.video.__getitem__, upcoming))
+        return future.result()
+
+    def __iter__(self):
+        for index in range(0, len(self)):
+            yield self[index]
+
+    def close(self) -> None:
+        """
+        Stops reading ahead and waits for the background thread to finish.
+        """
+
+        if self.executor is not None:
+            for future in self.futures:
+                future.cancel()
+            self.futures.clear()
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,136 @@
+import contextlib
+import numpy as np
+import typing
+
+from multiprocessing import shared_memory
+
+def share_array(array: np.ndarray) -> typing.Tuple[dict, shared_memory.SharedMemory]:
+    """
+    Copies an array into a new block of shared memory.
+
+    Parameters
+    ----------
+    array: np.ndarray
+        The array to share.
+
+    Returns
+    -------
+    handle: dict
+        Name of the block ("name"), shape ("shape"), and dtype ("dtype") of
+        the array. Small enough to send to worker processes, which read the
+        array with attached_array.
+    block: shared_memory.SharedMemory
+        The block of shared memory. The process that created it must close
+        and unlink it once no worker needs the array.
+    """
+
+    array = np.ascontiguousarray(array)
+    # Blocks cannot be empty.
+    block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    shared[...] = array
+    handle = {"name": block.name, "shape": array.shape, "dtype": array.dtype.str}
+    return handle, block
+
+def is_handle(value: typing.Any) -> bool:
+    """
+    Determines whether value is a handle returned by share_array.
+    """
+
+    return isinstance(value, dict) and set(value.keys()) == {"name", "shape", "dtype"}
+
+@contextlib.contextmanager
+def attached_array(value: typing.Union[np.ndarray, dict]) -> typing.Iterator[np.ndarray]:
+    """
+    Reads an array shared with share_array without copying it.
+
+    ex. with attached_array(prepared["bg_median"]) as bg_median:
+            ...
+
+    Parameters
+    ----------
+    value: np.ndarray or dict
+        A handle returned by share_array, or an array, which is used as is.
+
+    Returns
+    -------
+    array: np.ndarray
+        Read-only view of the shared array, valid until the with block ends.
+        Delete any other references to the view before the block ends so the
+        block can be closed.
+    """
+
+    if not is_handle(value):
+        yield value
+        return
+    block = shared_memory.SharedMemory(name=value["name"])
+    array = np.ndarray(value["shape"], dtype=np.dtype(value["dtype"]), buffer=block.buf)
+    array.flags.writeable = False
+    try:
+        yield array
+    finally:
+        del array
+        try:
+            block.close()
+        except BufferError:
+            # A view of the block is still referenced (e.g. by a traceback);
+            # the block is unmapped once the view is garbage collected.
+            pass
+
+class SharedArrayRegistry:
+    """
+    Shares arrays with worker processes, keeping each block of shared memory
+    until the work that needs it is done.
+
+    Arrays are published under a key (e.g. the number of a video), and every
+    array published under that key is released together once the key's work
+    is complete. Closing the registry releases every remaining array, so
+    blocks are not left behind if processing fails.
+
+    ex. with SharedArrayRegistry() as registry:
+            handle = registry.publish(file_number, bg_median)
+            ...
+            registry.release(file_number)
+    """
+
+    def __init__(self):
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def publish(self, key: typing.Hashable, array: np.ndarray) -> dict:
+        """
+        Copies array into shared memory, kept until key is released.
+
+        Returns
+        -------
+        handle: dict
+            Handle to send to worker processes, for attached_array.
+        """
+
+        handle, block = share_array(array)
+        self.blocks.setdefault(key, []).append(block)
+        return handle
+
+    def release(self, key: typing.Hashable) -> None:
+        """
+        Frees the shared memory of every array published under key.
+        """
+
+        for block in self.blocks.pop(key, []):
+            block.close()
+            block.unlink()
+        pass
+
+    def close(self) -> None:
+        """
+        Frees the shared memory of every array still published.
+        """
+
+        for key in list(self.blocks.keys()):
+            self.release(key)
+        pass
@@ -4,17 +4,30 @@ import json
 import typing
 from pathlib import Path
 import pandas as pd
-import time
+import collections
+import concurrent.futures
+import functools
+import glob
 
 import skimage.filters
 import skimage.io
 import skimage.morphology
 from skimage.filters import (threshold_otsu, threshold_mean, threshold_li)
 from skimage import exposure
+import tifffile
 
 from ..data_processing import array as dparray
 from ..data_processing import integration as integration
+from ..data_processing import profiling as profiling
 from ..file_handling import folder as folder
+from ..file_handling import cache as cache
+from . import binary as binary
+from . import reader as reader
+from . import mraw as mraw
+from . import binary_stack as binary_stack
+from . import intermediate as intermediate
+from . import async_writer as async_writer
+from . import shared_arrays as shared_arrays
 
 def define_image_parameters(video: skimage.io.collection.ImageCollection, optional_settings: dict = {}) -> dict:
     """
@@ -45,14 +58,13 @@ def define_image_parameters(video: skimage.io.collection.ImageCollection, option
     if len(first_frame.shape) == 3:
         first_frame = skimage.color.rgb2gray(first_frame)
     thresh_otsu = threshold_otsu(first_frame)
-    binary_otsu = first_frame < thresh_otsu
-    binary_otsu = np.array(binary_otsu)*255
-    binary_otsu = np.uint8(binary_otsu)
+    # Only the nozzle row is needed, so only that row is binarized.
+    binary_otsu = first_frame[nozzle_row,:] < thresh_otsu
 
     # Crop down to nozzle:
     ## width = nozzle + 2%
     ## height = nozzle * 2.5
-    non_zero_indicies = np.nonzero(binary_otsu[nozzle_row,:])
+    non_zero_indicies = np.nonzero(binary_otsu)
     first_non_zero = non_zero_indicies[0][0]
     last_non_zero = non_zero_indicies[0][-1]
     nozzle_diameter = last_non_zero - first_non_zero + 1 #pix
@@ -92,15 +104,20 @@ def save_image(image: np.ndarray, image_number: int, save_location: typing.Union
     """
     filename = f"{image_number:03}."+extension
     full_filename = os.path.join(save_location,filename)
-    skimage.io.imsave(full_filename, image, check_contrast=False)
+    # Saves to a hidden temporary file first, so an interrupted save never
+    # leaves a partial image under the final name.
+    partial_filename = os.path.join(save_location,"."+filename)
+    skimage.io.imsave(partial_filename, image, check_contrast=False)
+    os.replace(partial_filename, full_filename)
     pass
 
-def convert_tiff_image(image: np.ndarray, bg_median: np.ndarray, params_dict: dict, image_number: int, images_location: typing.Union[str, bytes, os.PathLike], folders_exist: typing.Tuple[bool,bool,bool], optional_settings: dict = {}) -> None:
+def convert_tiff_image(image: np.ndarray, bg_median: np.ndarray, params_dict: dict, image_number: int, images_location: typing.Union[str, bytes, os.PathLike], folders_exist: typing.Tuple[bool,bool,bool], optional_settings: dict = {}) -> np.ndarray:
     """
     Fully converts a raw tiff to binary png image.
 
     Crops, perforns background subtraction, and binarizies. Always saves the
-    binarized image as a .png, optional to save the intermediate steps.
+    binarized image as a .png (unless fused is True and save_bin is False),
+    optional to save the intermediate steps.
 
     Parameters
     ----------
@@ -135,43 +152,345 @@ def convert_tiff_image(image: np.ndarray, bg_median: np.ndarray, params_dict: di
         False to overwrite (or delete and then write, where overwriting would
         generate an error).
         Default is True.
+    fused: bool
+        True to always binarize the image so it can be measured in memory.
+        Binary image is then only saved if save_bin is True.
+        Default is False.
+    save_bin: bool
+        True to save binary images when fused is True.
+        Default is False.
 
     Returns
     ------
+    binary_image: np.ndarray
+        The binarized image. None if binarization was skipped because the
+        binary image already exists and skip_existing is True.
     Image sequence (video) saved on the hard drive at save_location
 
     """
 
+    cropped_image = crop_single_image(image, params_dict, optional_settings)
+    binary_image = convert_cropped_image(cropped_image, bg_median, image_number, images_location, folders_exist, optional_settings)
+    return binary_image
+
+def convert_cropped_image(cropped_image: np.ndarray, bg_median: np.ndarray, image_number: int, images_location: typing.Union[str, bytes, os.PathLike], folders_exist: typing.Tuple[bool,bool,bool], optional_settings: dict = {}, writers: dict = {}) -> np.ndarray:
+    """
+    Converts a raw tiff that has already been cropped to a binary png image.
+
+    Rescales the intensity of the cropped image only, performs background
+    subtraction, and binarizes, saving the same images as convert_tiff_image.
+    If bin_format is "packed" or intermediate_format is "stack", images are
+    instead added to the per-video stacks in writers (see
+    open_stack_writers), and are not saved if there is no writer for them.
+    Individual images are queued on the image writer in writers, if any,
+    rather than saved directly.
+
+    Parameters
+    ----------
+    cropped_image: np.ndarray
+        The raw image, cropped according to the parameters dictionary
+    bg_median: np.ndarray
+        The single background image produced from produce_background_image
+    image_number: int
+        The frame number of this image in the video
+    images_location: path-like
+        The folder where file should be saved
+    folders_exist: Tuple of three bools
+        Booleans indicating whether the binary, crop, and bg_sub folders
+        already existed to allow the relevant saves to be skipped if
+        optional_settings has skip_existing = True
+    optional_settings: dict
+        A dictionary of optional settings. See convert_tiff_image.
+    writers: dict, optional
+        Writers for the per-video stacks, as returned by open_stack_writers.
+        Default is {} (no stacks).
+
+    Returns
+    ------
+    binary_image: np.ndarray
+        The binarized image. None if binarization was skipped because the
+        binary image already exists and skip_existing is True.
+    """
+
     settings = integration.set_defaults(optional_settings)
     save_crop = settings["save_crop"]
     save_bg_sub = settings["save_bg_sub"]
     skip_existing = settings["skip_existing"]
+    fused = settings["fused"]
+    bin_format = settings["bin_format"]
+    intermediate_format = settings["intermediate_format"]
     [bin_exists, crop_exists, bg_sub_exists] = folders_exist
 
-    image = exposure.rescale_intensity(image, in_range='uint12', out_range='uint16')
-    cropped_image = crop_single_image(image, params_dict, optional_settings)
+    # Images are saved on background threads if there is an image writer.
+    if writers.get("images") is not None:
+        save = writers["images"].save
+    else:
+        save = save_image
+
+    # The rescale acts on each pixel, so only the cropped pixels are rescaled.
+    # Each step is timed as a phase if profiling.frame_phases is timing.
+    cropped_image = exposure.rescale_intensity(cropped_image, in_range='uint12', out_range='uint16')
+    profiling.lap("rescale")
     if save_crop:
-        if not crop_exists or not skip_existing:
-            save_image(cropped_image, image_number, os.path.join(images_location,"crop"),"tiff")
+        if writers.get("crop") is not None:
+            writers["crop"].append(cropped_image)
+        elif intermediate_format == "tiff" and (not crop_exists or not skip_existing):
+            save(cropped_image, image_number, os.path.join(images_location,"crop"),"tiff")
+        profiling.lap("write")
     background_subtracted_image = subtract_background_single_image(cropped_image, bg_median)
+    profiling.lap("bg_subtract")
     if save_bg_sub:
-        if not bg_sub_exists or not skip_existing:
-            save_image(background_subtracted_image, image_number, os.path.join(images_location,"bg_sub"), "tiff")
-    if not bin_exists or not skip_existing:
+        if writers.get("bg_sub") is not None:
+            writers["bg_sub"].append(background_subtracted_image)
+        elif intermediate_format == "tiff" and (not bg_sub_exists or not skip_existing):
+            save(background_subtracted_image, image_number, os.path.join(images_location,"bg_sub"), "tiff")
+        profiling.lap("write")
+    # In fused mode, binaries are only saved on request, but are always needed
+    # to measure the diameter.
+    save_binary = binary_save_needed(folders_exist, optional_settings)
+    binary_image = None
+    if save_binary or fused:
         binary_image = mean_binarize_single_image(background_subtracted_image)
-        save_image(binary_image, image_number, os.path.join(images_location,"bin"),"png")
+        profiling.lap("threshold")
+    if save_binary:
+        if writers.get("bin") is not None:
+            writers["bin"].append(binary_image)
+        elif bin_format == "png":
+            save(binary_image, image_number, os.path.join(images_location,"bin"),"png")
+        profiling.lap("write")
+    return binary_image
+
+def binary_save_needed(folders_exist: typing.Tuple[bool,bool,bool], optional_settings: dict = {}) -> bool:
+    """
+    Determines whether binary images should be saved.
+
+    Parameters
+    ----------
+    folders_exist: Tuple of three bools
+        Booleans indicating whether the binary, crop, and bg_sub folders
+        already existed.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    skip_existing: bool
+        True to skip saving binary images if the binary folder already
+        existed.
+        Default is True.
+    fused: bool
+        True to only save binary images if save_bin is True.
+        Default is False.
+    save_bin: bool
+        True to save binary images when fused is True.
+        Default is False.
+
+    Returns
+    -------
+    binary_save_needed: bool
+        True if binary images should be saved, False otherwise.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    skip_existing = settings["skip_existing"]
+    fused = settings["fused"]
+    save_bin = settings["save_bin"]
+    bin_exists = folders_exist[0]
+
+    return (not fused or save_bin) and (not bin_exists or not skip_existing)
+
+def open_binary_stack_writer(save_location: typing.Union[str, bytes, os.PathLike], folders_exist: typing.Tuple[bool,bool,bool], optional_settings: dict = {}) -> typing.Optional[binary_stack.BinaryStackWriter]:
+    """
+    Opens a writer for the packed binary stack of a video, if one is needed.
+
+    Parameters
+    ----------
+    save_location: path-like
+        The folder containing the "bin" folder in which to save the stack.
+    folders_exist: Tuple of three bools
+        Booleans indicating whether the binary, crop, and bg_sub folders
+        already existed.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    bin_format: string
+        "png" to save binary images as one .png per frame, "packed" to save
+        them as one packed binary stack per video.
+        Default is "png".
+
+    Returns
+    -------
+    writer: binary_stack.BinaryStackWriter or None
+        Writer for the packed binary stack, None if bin_format is not
+        "packed" or binary images should not be saved.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    bin_format = settings["bin_format"]
+
+    if bin_format not in ["png", "packed"]:
+        raise ValueError("bin_format must be 'png' or 'packed'.")
+
+    writer = None
+    if bin_format == "packed" and binary_save_needed(folders_exist, optional_settings):
+        writer = binary_stack.BinaryStackWriter(os.path.join(save_location, "bin", binary_stack.BINARY_STACK_NAME))
+    return writer
+
+def open_stack_writers(save_location: typing.Union[str, bytes, os.PathLike], folders_exist: typing.Tuple[bool,bool,bool], optional_settings: dict = {}) -> dict:
+    """
+    Opens writers for every per-video stack of images that should be saved.
+
+    Binary images are saved as a packed binary stack if bin_format is
+    "packed". Cropped and background-subtracted images are saved as one
+    multi-page TIFF each (crop/crop.tif and bg_sub/bg_sub.tif) if
+    intermediate_format is "stack". Because stacks are only moved into place
+    once complete, an existing stack is only skipped if the stack file itself
+    exists, not just its folder.
+
+    Parameters
+    ----------
+    save_location: path-like
+        The folder containing the "bin", "crop", and "bg_sub" folders.
+    folders_exist: Tuple of three bools
+        Booleans indicating whether the binary, crop, and bg_sub folders
+        already existed.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    save_crop: bool
+        True to save intermediate cropped images.
+        Default is False.
+    save_bg_sub: bool
+        True to save background-subtracted images.
+        Default is False.
+    skip_existing: bool
+        True to skip stacks that already exist.
+        Default is True.
+    bin_format: string
+        "png" to save binary images as one .png per frame, "packed" to save
+        them as one packed binary stack per video.
+        Default is "png".
+    intermediate_format: string
+        "tiff" to save cropped and background-subtracted images as one TIFF
+        per frame, "stack" to save them as one multi-page TIFF per video.
+        Default is "tiff".
+    intermediate_compression: string or None
+        Lossless compression for intermediate stacks (e.g. "zlib"), None for
+        uncompressed stacks.
+        Default is None.
+
+    async_write: bool
+        True to save individual images on background threads.
+        Default is False.
+    write_threads: int
+        Number of background threads saving images if async_write is True.
+        Default is 2.
+
+    Returns
+    -------
+    writers: dict
+        Writers keyed by "bin", "crop", and "bg_sub", and the image writer
+        for individual images keyed by "images". Values are None for stacks
+        that should not be written (and "images" is None if async_write is
+        False). Close with close_stack_writers, or abort_stack_writers after
+        an error.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    save_crop = settings["save_crop"]
+    save_bg_sub = settings["save_bg_sub"]
+    skip_existing = settings["skip_existing"]
+    intermediate_format = settings["intermediate_format"]
+    intermediate_compression = settings["intermediate_compression"]
+    async_write = settings["async_write"]
+    write_threads = settings["write_threads"]
+
+    if intermediate_format not in ["tiff", "stack"]:
+        raise ValueError("intermediate_format must be 'tiff' or 'stack'.")
+
+    writers = {"bin": open_binary_stack_writer(save_location, folders_exist, optional_settings)}
+    for stage, save_stage in [("crop", save_crop), ("bg_sub", save_bg_sub)]:
+        writers[stage] = None
+        if save_stage and intermediate_format == "stack":
+            stack_path = os.path.join(save_location, stage, stage + ".tif")
+            if not os.path.exists(stack_path) or not skip_existing:
+                writers[stage] = intermediate.TiffStackWriter(stack_path, intermediate_compression)
+    writers["images"] = None
+    if async_write:
+        writers["images"] = async_writer.AsyncImageWriter(save_image, write_threads)
+    return writers
+
+def close_stack_writers(writers: dict) -> None:
+    """
+    Closes every writer opened by open_stack_writers.
+
+    Waits for every image queued on the image writer to be saved.
+
+    Parameters
+    ----------
+    writers: dict
+        Writers as returned by open_stack_writers.
+    """
+
+    for writer in writers.values():
+        if writer is not None:
+            writer.close()
+    pass
+
+def abort_stack_writers(writers: dict) -> None:
+    """
+    Stops every writer opened by open_stack_writers after an error.
+
+    Unfinished stacks are removed rather than moved into place, and the image
+    writer's threads are stopped without raising errors from saving, so the
+    error that stopped the video is the one raised.
+
+    Parameters
+    ----------
+    writers: dict
+        Writers as returned by open_stack_writers.
+    """
+
+    for stage in ["bin", "crop", "bg_sub"]:
+        if writers[stage] is not None:
+            writers[stage].abort()
+    if writers["images"] is not None:
+        try:
+            writers["images"].close()
+        except Exception:
+            # The error that stopped the video is already being raised.
+            pass
     pass
 
 def produce_background_image(background_video: skimage.io.collection.ImageCollection, params_dict: dict, optional_settings: dict = {}) -> np.ndarray:
     """
     Produces the background image from which the experimental video will be subtracted.
 
+    Each frame is cropped before the median is taken, so only the cropped
+    frames are held in memory. With streaming_median, the median is instead
+    found from per-pixel histograms so memory does not depend on the number
+    of frames in the background video.
+
     Parameters
     ----------
     background_video: skimage.io.collection.ImageCollection
          The video identified as the background video from the researcher
     params_dict: dict
         Dictionary of parameters with the crop information added
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    streaming_median: bool
+        True to find the median of the background video with a fixed memory
+        ceiling using streaming_median. Requires integer (at most 12-bit)
+        images. False to load all cropped background frames at once.
+        Default is False.
 
     Returns
     -------
@@ -181,24 +500,121 @@ def produce_background_image(background_video: skimage.io.collection.ImageCollec
     """
 
     settings = integration.set_defaults(optional_settings)
-    nozzle_row = settings["nozzle_row"]
-    crop_width_start = params_dict["crop_width_start"]
-    crop_width_end = params_dict["crop_width_end"]
-    crop_bottom = params_dict["crop_bottom"]
-    crop_top = params_dict["crop_top"]
+    streaming = settings["streaming_median"]
 
-    bg_median = np.median(background_video, axis=0)
+    if streaming:
+        bg_median = streaming_median(background_video, params_dict, optional_settings)
+    else:
+        # Cropping commutes with the per-pixel median and rescale, so frames
+        # are cropped first to limit memory.
+        cropped_frames = list(crop_video(background_video, params_dict, optional_settings))
+        bg_median = np.median(cropped_frames, axis=0)
     bg_median = exposure.rescale_intensity(bg_median, in_range='uint12', out_range='uint16')
-    bg_median = bg_median[nozzle_row+crop_top:crop_bottom+crop_top, crop_width_start:crop_width_end]
 
     return bg_median
 
+def streaming_median(background_video: skimage.io.collection.ImageCollection, params_dict: dict, optional_settings: dict = {}) -> np.ndarray:
+    """
+    Finds the exact per-pixel median of the cropped background frames with bounded memory.
+
+    Reads through the video twice. The first pass counts, for every pixel,
+    how many frames fall into each of 64 coarse bins (the top 6 bits of the
+    12-bit value), which locates the bins holding the middle values. The
+    second pass counts the bottom 6 bits of the values within those bins,
+    which gives the middle values exactly. Memory is set by the crop size
+    alone, not the number of frames. For an even number of frames, the median
+    is the mean of the two middle values, as in np.median.
+
+    Parameters
+    ----------
+    background_video: skimage.io.collection.ImageCollection
+         The video identified as the background video from the researcher.
+         Images must be integer valued, with values from 0 to 4095
+         (12-bit).
+    params_dict: dict
+        Dictionary of parameters with the crop information added
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Returns
+    -------
+    streaming_median: np.ndarray
+        The median of the cropped frames in the background, not yet rescaled.
+
+    Raises
+    ------
+    TypeError
+        If the background video images are not integer valued.
+    ValueError
+        If any cropped background value is outside 0 to 4095, e.g. 16-bit
+        images. Set streaming_median to False for these videos.
+    """
+
+    bins = 64
+    bin_bits = 6
+    frame_count = len(background_video)
+    lower_rank = (frame_count - 1)//2
+    upper_rank = frame_count//2
+
+    cropped_video = crop_video(background_video, params_dict, optional_settings)
+
+    def cropped_values(cropped):
+        # Checks a cropped frame has 12-bit values, flattened to one row of
+        # pixels.
+        if not np.issubdtype(np.asarray(cropped).dtype, np.integer):
+            raise TypeError("streaming_median requires integer images")
+        if np.min(cropped) < 0 or np.max(cropped) > 4095:
+            raise ValueError("streaming_median requires 12-bit images (values from 0 to 4095); set streaming_median to False for other bit depths")
+        return np.asarray(cropped).astype(np.uint16).ravel(), np.shape(cropped)
+
+    # First pass: histogram of the coarse bin of every pixel.
+    coarse_counts = None
+    for cropped in cropped_video:
+        values, shape = cropped_values(cropped)
+        pixels = np.arange(values.size)
+        if coarse_counts is None:
+            coarse_counts = np.zeros((bins, values.size), dtype=np.uint32)
+        # Each pixel appears once per frame, so no index is repeated.
+        coarse_counts[values >> bin_bits, pixels] += 1
+    cumulative_counts = np.cumsum(coarse_counts, axis=0)
+    del coarse_counts
+
+    def locate_bin(cumulative, rank):
+        # Finds the bin holding the value of given rank for every pixel and
+        # the number of values below that bin.
+        found_bin = np.argmax(cumulative > rank, axis=0)
+        below = np.where(found_bin > 0, cumulative[found_bin - 1, pixels], 0)
+        return found_bin, below
+
+    lower_bin, lower_below = locate_bin(cumulative_counts, lower_rank)
+    upper_bin, upper_below = locate_bin(cumulative_counts, upper_rank)
+    del cumulative_counts
+
+    # Second pass: histogram of the fine part of the values in the located
+    # coarse bins.
+    lower_counts = np.zeros((bins, pixels.size), dtype=np.uint32)
+    upper_counts = np.zeros((bins, pixels.size), dtype=np.uint32)
+    for cropped in cropped_video:
+        values, shape = cropped_values(cropped)
+        coarse = values >> bin_bits
+        fine = values & (bins - 1)
+        lower_counts[fine, pixels] += (coarse == lower_bin)
+        upper_counts[fine, pixels] += (coarse == upper_bin)
+
+    lower_fine, _ = locate_bin(np.cumsum(lower_counts, axis=0), lower_rank - lower_below)
+    upper_fine, _ = locate_bin(np.cumsum(upper_counts, axis=0), upper_rank - upper_below)
+    lower_value = (lower_bin << bin_bits) + lower_fine
+    upper_value = (upper_bin << bin_bits) + upper_fine
+
+    median = (lower_value + upper_value)/2
+    return median.reshape(shape)
+
 def remove_bg_drop(bg_median: np.ndarray):
     """
     Removes the background drop on the substrate from the background image.
 
     Using the edge from bg_drop_top_edge, replaces all pixels at or below it
-    with the maximum in the background.
+    with the maximum in the background. Does not modify bg_median.
 
     Parameters
     ----------
@@ -208,11 +624,11 @@ def remove_bg_drop(bg_median: np.ndarray):
     Returns
     -------
     bg_new: np.ndarray
-        bg_median with the drop at the bottom set to the maximum value
+        copy of bg_median with the drop at the bottom set to the maximum value
     """
 
     # Creates a duplicate of the background
-    bg_new = bg_median
+    bg_new = bg_median.copy()
 
     # Finds the maximum of the bg_median array
     #max_value = np.iinfo(bg_median.dtype).max
@@ -221,12 +637,10 @@ def remove_bg_drop(bg_median: np.ndarray):
     # Selects pixels below the top of the background drop that are in the drop
     # based on edge detection and sets those pixels to the maximum available
     # for the background
-    top_edge = bg_drop_top_edge(bg_median)
-
-    for i in range(0,np.shape(bg_new)[0]):
-        for j in range (0,np.shape(bg_new)[1]):
-            if i >= top_edge[j]:
-                bg_new[i][j] = max_value
+    top_edge = np.array(bg_drop_top_edge(bg_median))
+    rows = np.arange(np.shape(bg_new)[0])
+    in_drop = rows[:,np.newaxis] >= top_edge[np.newaxis,:]
+    bg_new[in_drop] = max_value
 
     # Returns the bg_median with the drop set to max
     return bg_new
@@ -255,18 +669,25 @@ def bg_drop_top_edge(bg_median: np.ndarray):
     binary_sobel = (edge_sobel < sobel_otsu)*1
     # binary sobel: edge = 0, nonedge = 1
 
+    (rows, columns) = np.shape(binary_sobel)
     height = np.shape(bg_median)[1]
-    bg_drop_top_edge = []
-    for i in range(0, np.shape(binary_sobel)[1]):
-        edge = dparray.continuous_zero(binary_sobel[:,i])
-        if len(edge):
-            # Returns top pixel of bottom edge if there is an edge detected
-            bg_drop_top_edge.append(edge[-1][0])
-        else:
-            # Returns the bottom pixel if no edge exists
-            bg_drop_top_edge.append(height-1)
+    is_edge = binary_sobel == 0
+    row_index = np.arange(rows)[:,np.newaxis]
+
+    # Finds the last edge pixel in every column, which is the bottom of the
+    # bottom edge.
+    has_edge = np.any(is_edge, axis=0)
+    last_edge = rows - 1 - np.argmax(is_edge[::-1,:], axis=0)
+    # The top pixel of the bottom edge is one below the last non-edge pixel
+    # above the bottom of the bottom edge (or the first row if there is none).
+    above_edge = ~is_edge & (row_index < last_edge[np.newaxis,:])
+    top_of_edge = np.max(np.where(above_edge, row_index, -1), axis=0) + 1
 
-    return bg_drop_top_edge
+    # Returns top pixel of bottom edge if there is an edge detected, the bottom
+    # pixel if no edge exists
+    bg_drop_top_edge = np.where(has_edge, top_of_edge, height-1)
+
+    return bg_drop_top_edge.tolist()
 
 def convert_tiff_sequence_to_binary(experimental_video: skimage.io.collection.ImageCollection, bg_median: np.ndarray, params_dict: dict, save_location: typing.Union[str, bytes, os.PathLike], folders_exist: typing.Tuple[bool,bool,bool], optional_settings: dict = {}):
     """
@@ -301,121 +722,706 @@ def convert_tiff_sequence_to_binary(experimental_video: skimage.io.collection.Im
         True to save background-subtracted images (i.e. experimental video
         images cropped and background-subtracted but not binarized).
         Default is False.
+    bin_format: string
+        "png" to save binary images as one .png per frame, "packed" to save
+        them as one packed binary stack per video.
+        Default is "png".
+    intermediate_format: string
+        "tiff" to save cropped and background-subtracted images as one TIFF
+        per frame, "stack" to save them as one multi-page TIFF per video.
+        Default is "tiff".
+    frame_threads: int
+        Number of threads converting chunks of frames of the video at once.
+        Results are the same and in the same order for any number of threads.
+        Default is 1.
+    prefetch_depth: int
+        Number of frames read ahead while converting frames, when
+        frame_threads is 1. 0 to turn off reading ahead.
+        Default is 4.
+    resume: bool
+        True to continue from the last frame recorded in the progress file
+        in save_location (see cache.record_progress) if an earlier run was
+        interrupted with the same video and settings. Only used when no
+        per-video stacks are saved. False to convert every frame.
+        Default is False.
 
     Returns
     -------
-    Image(s) saved locally in save_location
+    Image(s) saved locally in save_location. Progress through the video is
+    recorded every CHECKPOINT_FRAMES frames in save_location.
     """
 
-    for image_number in range(0,len(experimental_video)):
-        image = experimental_video[image_number]
-        convert_tiff_image(image, bg_median, params_dict, image_number, save_location, folders_exist, optional_settings)
+    settings = integration.set_defaults(optional_settings)
+    resume = settings["resume"]
+
+    writers = open_stack_writers(save_location, folders_exist, optional_settings)
+    stages = [stage for stage in ["bin", "crop", "bg_sub"] if writers[stage] is not None]
+    cropped_video = crop_video(experimental_video, params_dict, optional_settings)
+    frame_count = len(cropped_video)
+
+    # Per-video stacks are rewritten from the start, so only videos saved
+    # as individual images can resume.
+    start = 0
+    if resume and stages == []:
+        start = cache.resume_frame(save_location, frame_count, optional_settings)
+    checkpoint = start
+    cache.record_progress(save_location, start, frame_count, optional_settings)
+    try:
+        with prefetch_video(cropped_video, optional_settings) as frames:
+            convert_chunk = functools.partial(convert_cropped_frames, frames, bg_median=bg_median,
+                                              save_location=save_location, folders_exist=folders_exist,
+                                              optional_settings=optional_settings, stages=stages,
+                                              image_writer=writers["images"])
+            for stop, (diameters, collected) in zip(range(start + FRAME_CHUNK_SIZE, frame_count + FRAME_CHUNK_SIZE, FRAME_CHUNK_SIZE),
+                                                    map_frame_chunks(convert_chunk, frame_count, optional_settings, start)):
+                write_collected_images(writers, collected)
+                if stages == [] and min(stop, frame_count) - checkpoint >= CHECKPOINT_FRAMES:
+                    # Records frames only once their images are on disk.
+                    if writers["images"] is not None:
+                        writers["images"].flush()
+                    checkpoint = min(stop, frame_count)
+                    cache.record_progress(save_location, checkpoint, frame_count, optional_settings)
+        close_stack_writers(writers)
+    except BaseException:
+        abort_stack_writers(writers)
+        raise
+    cache.record_progress(save_location, frame_count, frame_count, optional_settings)
     pass
 
-def crop_single_image(image: np.ndarray, params_dict: dict,optional_settings: dict = {}) -> np.ndarray:
+def convert_tiff_sequence_to_diameters(experimental_video: skimage.io.collection.ImageCollection, bg_median: np.ndarray, params_dict: dict, window: np.array, save_location: typing.Union[str, bytes, os.PathLike], folders_exist: typing.Tuple[bool,bool,bool], optional_settings: dict = {}) -> typing.Tuple[np.ndarray, np.ndarray]:
     """
-    Crops a single image according to parameters from params_dict
+    Measures the minimum diameter of each frame of the experimental video in memory.
+
+    Performs, sequentially, cropping, background subtraction, binarization by
+    the Mean method, and measurement of the minimum diameter for each frame
+    without reading binaries back from disk. Binaries are only saved if
+    save_bin is True.
 
     Parameters
     ----------
-    image: np.ndarray (scikit.io.imread)
+    experimental_video: skimage.io.collection.ImageCollection
          The video identified as the experiment video from the researcher
+    bg_median: np.ndarray
+        The single background image produced from produce_background_image
     params_dict: dict
         Dictionary of parameters with the crop information added
+    window : np.array
+        array of the boundaries of the cropped image to analyze in the format
+        [left, top, right, bottom]
+    save_location: path-like
+        The folder where optional images should be saved
+    folders_exist: Tuple of three bools
+        Booleans indicating whether the binary, crop, and bg_sub folders
+        already existed to allow convert_tiff_image image to skip the relevant
+        saves if optional_settings has skip_existing = True
+    optional_settings: dict
+        A dictionary of optional settings. fused is always treated as True.
+
+    Optional Settings and Defaults
+    ------------------------------
+    save_crop: bool
+        True to save intermediate cropped images (i.e. experimental video
+        images cropped but not background-subtracted or binarized).
+        Default is False.
+    save_bg_sub: bool
+        True to save background-subtracted images (i.e. experimental video
+        images cropped and background-subtracted but not binarized).
+        Default is False.
+    save_bin: bool
+        True to save binary images.
+        Default is False.
+    bin_format: string
+        "png" to save binary images as one .png per frame, "packed" to save
+        them as one packed binary stack per video.
+        Default is "png".
+    intermediate_format: string
+        "tiff" to save cropped and background-subtracted images as one TIFF
+        per frame, "stack" to save them as one multi-page TIFF per video.
+        Default is "tiff".
+    frame_threads: int
+        Number of threads converting chunks of frames of the video at once.
+        Results are the same and in the same order for any number of threads.
+        Default is 1.
+    prefetch_depth: int
+        Number of frames read ahead while converting frames, when
+        frame_threads is 1. 0 to turn off reading ahead.
+        Default is 4.
+    stop_after_breakup: int
+        Number of consecutive frames with a minimum diameter of 0 after
+        which the rest of the video is not processed. 0 to process every
+        frame.
+        Default is 0.
+    frame_step: int
+        Converts every frame_step-th frame first, then every frame in the
+        region where D/D0 passes through tc_bounds and fitting_bounds (see
+        binary.measure_sampled_frames). 1 to convert every frame. Above 1,
+        requires bin_format "png" and intermediate_format "tiff".
+        Default is 1.
 
     Returns
     -------
-    cropped_image: np.ndarray
-        The input image, cropped according to values in parameters dictionary
+    diameters: np.ndarray
+        Minimum diameter (in pixels) of each frame of the video, in order,
+        up to and including the last frame processed. np.nan for frames
+        skipped by frame_step.
+    measured: np.ndarray
+        True for each frame in diameters that was processed.
+
+    Raises
+    ------
+    ValueError: If frame_step is above 1 and bin_format or
+        intermediate_format save per-video stacks.
     """
 
-    settings = integration.set_defaults(optional_settings)
-    nozzle_row = settings["nozzle_row"]
-    crop_width_start = params_dict["crop_width_start"]
-    crop_width_end = params_dict["crop_width_end"]
-    crop_bottom = params_dict["crop_bottom"]
-    crop_top = params_dict["crop_top"]
-
-    cropped_image = image[nozzle_row+crop_top:crop_bottom+crop_top, crop_width_start:crop_width_end]
-    return cropped_image
+    fused_settings = dict(optional_settings)
+    fused_settings["fused"] = True
 
-def subtract_background_single_image(cropped_image: np.ndarray, bg_median: np.ndarray) -> np.ndarray:
+    settings = integration.set_defaults(optional_settings)
+    stop_after_breakup = settings["stop_after_breakup"]
+    frame_step = settings["frame_step"]
+
+    # Per-video stacks hold frames in the order they are converted, which is
+    # not frame order when sampling.
+    if frame_step > 1 and (settings["bin_format"] != "png" or settings["intermediate_format"] != "tiff"):
+        raise ValueError("frame_step above 1 requires bin_format \"png\" and intermediate_format \"tiff\".")
+
+    writers = open_stack_writers(save_location, folders_exist, fused_settings)
+    stages = [stage for stage in ["bin", "crop", "bg_sub"] if writers[stage] is not None]
+    cropped_video = crop_video(experimental_video, params_dict, optional_settings)
+
+    def measure(frame_numbers):
+        sampled_video = reader.SampledVideo(cropped_video, frame_numbers)
+        diameters = np.zeros(len(sampled_video))
+        frames_measured = len(sampled_video)
+        zero_run = 0
+        with prefetch_video(sampled_video, optional_settings) as frames:
+            convert_chunk = functools.partial(convert_cropped_frames, frames, bg_median=bg_median,
+                                              save_location=save_location, folders_exist=folders_exist,
+                                              optional_settings=fused_settings, stages=stages, window=window,
+                                              image_writer=writers["images"], frame_numbers=frame_numbers)
+            chunk_results = map_frame_chunks(convert_chunk, len(frames), optional_settings)
+            for start, (chunk_diameters, collected) in zip(range(0, len(frames), FRAME_CHUNK_SIZE), chunk_results):
+                diameters[start:start + len(chunk_diameters)] = chunk_diameters
+                stop, zero_run = find_breakup_stop(chunk_diameters, zero_run, stop_after_breakup)
+                if stop is not None:
+                    # Stacks end at the same frame as the diameters.
+                    write_collected_images(writers, {stage: images[:stop] for stage, images in collected.items()})
+                    frames_measured = start + stop
+                    break
+                write_collected_images(writers, collected)
+            # Stops any chunks still being converted.
+            chunk_results.close()
+        return diameters[:frames_measured]
+
+    try:
+        diameters, measured = binary.measure_sampled_frames(measure, np.arange(len(cropped_video)), params_dict, optional_settings)
+        close_stack_writers(writers)
+    except BaseException:
+        abort_stack_writers(writers)
+        raise
+
+    # Ends the diameters at the last frame measured.
+    measured_frames = np.flatnonzero(measured)
+    frames_measured = measured_frames[-1] + 1 if len(measured_frames) > 0 else 0
+    return diameters[:frames_measured], measured[:frames_measured]
+
+def find_breakup_stop(chunk_diameters: np.ndarray, zero_run: int, stop_after_breakup: int) -> typing.Tuple[typing.Optional[int], int]:
     """
-    Performs background subtraction from a cropped image.
+    Finds where a chunk of frames completes a sustained filament breakup.
 
-    Assumes cropped_image and bg_median are the same size.
+    Breakup is sustained once stop_after_breakup consecutive frames have a
+    minimum diameter of 0, counting frames from earlier chunks.
 
     Parameters
     ----------
-    cropped_image: np.ndarray
-        The initial image, cropped according to values in parameters dictionary
-    bg_median: np.ndarray
-        The single background image produced from produce_background_image
+    chunk_diameters: np.ndarray
+        Minimum diameter of each frame in the chunk, in order.
+    zero_run: int
+        Number of consecutive frames with a minimum diameter of 0 at the end
+        of the earlier chunks.
+    stop_after_breakup: int
+        Number of consecutive frames with a minimum diameter of 0 needed to
+        stop. 0 to never stop.
 
     Returns
     -------
-    background_subtracted_image: np.ndarray
-        The cropped image with the background subtraction performed
+    stop: int or None
+        Number of frames of the chunk up to and including the frame that
+        completes the breakup, or None if the chunk does not complete it.
+    zero_run: int
+        Number of consecutive frames with a minimum diameter of 0 at the end
+        of the chunk.
     """
 
-    background_subtracted_image_org = np.int32(cropped_image) - np.int32(bg_median)
-    if np.any(background_subtracted_image_org < 0):
-        #this means image is darker than background
-        background_subtracted_image = np.abs((background_subtracted_image_org < 0)*background_subtracted_image_org)
-        background_subtracted_image = background_subtracted_image/np.max(background_subtracted_image)
-        #eliminates half the noise
-        background_subtracted_image = skimage.util.invert(background_subtracted_image)
-        background_subtracted_image = skimage.img_as_uint(background_subtracted_image)
-    if np.all(background_subtracted_image_org > 0):
-        # this means that background is darker than image:
-        background_subtracted_image = np.abs((background_subtracted_image_org > 0)*background_subtracted_image_org)
-        background_subtracted_image = background_subtracted_image/np.max(background_subtracted_image)
-        background_subtracted_image = skimage.img_as_uint(background_subtracted_image)
-    return background_subtracted_image
+    stop = None
+    for i, diameter in enumerate(chunk_diameters):
+        if diameter == 0:
+            zero_run = zero_run + 1
+        else:
+            zero_run = 0
+        if stop_after_breakup > 0 and zero_run >= stop_after_breakup:
+            stop = i + 1
+            break
+    return stop, zero_run
 
-def mean_binarize_single_image(background_subtracted_image: np.ndarray) -> np.ndarray:
+def prefetch_video(video: reader.CroppedVideo, optional_settings: dict = {}) -> reader.PrefetchingVideo:
     """
-    Performs global binarization on an image according to the Otsu method
+    Wraps a video so upcoming frames are read while frames are processed.
+
+    Frames are only read ahead when frames are converted on one thread;
+    with frame_threads above 1, frames are already read concurrently.
 
     Parameters
     ----------
-    background_subtracted_image: np.ndarray
-        The cropped image with the background subtraction performed
+    video: reader.CroppedVideo
+        The video to read ahead in, as returned by crop_video.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    prefetch_depth: int
+        Number of frames to read ahead. 0 to turn off reading ahead (e.g. for
+        memory-constrained runs).
+        Default is 4.
+    frame_threads: int
+        Number of threads converting chunks of frames at once.
+        Default is 1.
 
     Returns
     -------
-    binary_otsu: np.ndarray
-        The binarized version of the input image
-
+    prefetching_video: reader.PrefetchingVideo
+        The video, reading ahead when indexed in order. Close when done, or
+        use in a with statement.
     """
-    #thresh_mean = threshold_mean(background_subtracted_image)
-    thresh_otsu = threshold_otsu(background_subtracted_image)
-    binary_otsu = background_subtracted_image < thresh_otsu
-    binary_otsu = np.array(binary_otsu)*255
-    binary_otsu = np.uint8(binary_otsu)
-    return binary_otsu
 
-def tiffs_to_binary(experimental_video_folder: typing.Union[str, bytes, os.PathLike], background_video_folder: typing.Union[str, bytes, os.PathLike], images_location: typing.Union[str, bytes, os.PathLike], optional_settings: dict = {}):
-    """
+    settings = integration.set_defaults(optional_settings)
+    prefetch_depth = settings["prefetch_depth"]
+    frame_threads = settings["frame_threads"]
 
-    Processes experimental and background video into binarized video.
+    if frame_threads > 1:
+        prefetch_depth = 0
+    return reader.PrefetchingVideo(video, prefetch_depth)
 
-    Given a experimental video folder and a background video folder, processes
-    the videos into a folder of binarized images in the target directory.
-    Can also produce cropped and background subtracted images given optional
-    settings.
+# Number of frames saved between records of progress through a video.
+CHECKPOINT_FRAMES = 256
+
+# Number of frames converted together by each task of map_frame_chunks.
+FRAME_CHUNK_SIZE = 16
+
+def convert_cropped_frames(cropped_video: typing.Union[reader.CroppedVideo, reader.PrefetchingVideo], start: int, stop: int, bg_median: np.ndarray, save_location: typing.Union[str, bytes, os.PathLike], folders_exist: typing.Tuple[bool,bool,bool], optional_settings: dict = {}, stages: list = [], window: np.array = None, image_writer: async_writer.AsyncImageWriter = None, frame_numbers: typing.Optional[typing.Sequence[int]] = None) -> typing.Tuple[np.ndarray, dict]:
+    """
+    Converts a range of frames of a cropped video with convert_cropped_image.
+
+    Images for per-video stacks are collected and returned rather than
+    written, so that ranges of frames can be converted at the same time and
+    the stacks written in order afterwards with write_collected_images.
 
     Parameters
     ----------
-    experimental_video_folder: path-like
-        Points to the folder which contains the experimental video to analyse.
-    background_video_folder: path-like
-        Points to the folder which contains the background video used in analysis.
-    images_location: path-like
-        The folder where folders of images should be saved.
-    optional_settings: dict
-        A dictionary of optional settings.
-
+    cropped_video: reader.CroppedVideo or reader.PrefetchingVideo
+        The cropped experimental video, as returned by crop_video or
+        prefetch_video.
+    start: int
+        First frame to convert.
+    stop: int
+        Frame after the last frame to convert.
+    bg_median: np.ndarray
+        The single background image produced from produce_background_image
+    save_location: path-like
+        The folder where images should be saved
+    folders_exist: Tuple of three bools
+        Booleans indicating whether the binary, crop, and bg_sub folders
+        already existed.
+    optional_settings: dict
+        A dictionary of optional settings. See convert_tiff_image.
+    stages: list of strings
+        Stages ("bin", "crop", "bg_sub") for which to collect images for
+        per-video stacks.
+    window : np.array, optional
+        array of the boundaries of the cropped image to analyze in the format
+        [left, top, right, bottom]. If given, the minimum diameter of each
+        frame is measured.
+    image_writer: async_writer.AsyncImageWriter, optional
+        Writer to queue individual images on. If None, images are saved
+        directly.
+    frame_numbers: sequence of int, optional
+        Frame number of each frame of cropped_video, used to name saved
+        images (e.g. when cropped_video is a reader.SampledVideo). If None,
+        frames are named by their index in cropped_video.
+
+    Optional Settings and Defaults
+    ------------------------------
+    profile: bool
+        True to time the range of frames as a "frames" event, split into
+        the time spent reading ("decode"), rescaling ("rescale"), background
+        subtracting ("bg_subtract"), binarizing ("threshold"), saving
+        ("write", including encoding), and measuring ("measure") the frames
+        (see profiling.frame_phases).
+        Default is False.
+
+    Returns
+    -------
+    diameters: np.ndarray
+        Minimum diameter of each frame if window is given, otherwise an empty
+        array.
+    collected: dict
+        Lists of images for each of stages, in frame order.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+
+    collected = {stage: [] for stage in stages}
+    frame_writers = dict(collected)
+    frame_writers["images"] = image_writer
+    binary_images = []
+    with profiling.frame_phases("frames", settings["profile"], start=start, stop=stop):
+        for image_number in range(start, stop):
+            frame_number = image_number if frame_numbers is None else int(frame_numbers[image_number])
+            # Frames are cropped as they are read (see crop_video), so
+            # "decode" includes cropping.
+            cropped_image = cropped_video[image_number]
+            profiling.lap("decode")
+            binary_image = convert_cropped_image(cropped_image, bg_median, frame_number, save_location, folders_exist, optional_settings, frame_writers)
+            binary_images.append(binary_image)
+        diameters = np.zeros(0)
+        if window is not None and binary_images != []:
+            diameter_profiles, diameters = binary.calculate_min_diameters(np.stack(binary_images), window)
+            profiling.lap("measure")
+    return diameters, collected
+
+def write_collected_images(writers: dict, collected: dict) -> None:
+    """
+    Adds images collected by convert_cropped_frames to the per-video stacks.
+
+    Parameters
+    ----------
+    writers: dict
+        Writers as returned by open_stack_writers.
+    collected: dict
+        Lists of images keyed by stage, as returned by convert_cropped_frames.
+    """
+
+    for stage, images in collected.items():
+        for image in images:
+            writers[stage].append(image)
+    pass
+
+def map_frame_chunks(function: typing.Callable, frame_count: int, optional_settings: dict = {}, start: int = 0) -> typing.Iterator:
+    """
+    Calls function on consecutive chunks of frames, yielding results in order.
+
+    With more than one frame thread, chunks are run on a thread pool. NumPy,
+    scikit-image, and tifffile release the GIL for most of the work on each
+    frame, so chunks run concurrently. At most two chunks per thread are in
+    progress or waiting to be used at once, limiting memory.
+
+    Parameters
+    ----------
+    function: callable
+        Called as function(start, stop) for each chunk of FRAME_CHUNK_SIZE
+        frames.
+    frame_count: int
+        Number of frames in the video.
+    optional_settings: dict
+        A dictionary of optional settings.
+    start: int, optional
+        First frame of the first chunk.
+        Default is 0.
+
+    Optional Settings and Defaults
+    ------------------------------
+    frame_threads: int
+        Number of threads converting chunks of frames at once.
+        Default is 1.
+
+    Returns
+    -------
+    map_frame_chunks: iterator
+        Results of function for each chunk, in frame order. Closing the
+        iterator early stops chunks that have not started.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    frame_threads = settings["frame_threads"]
+
+    chunks = [(first, min(first + FRAME_CHUNK_SIZE, frame_count)) for first in range(start, frame_count, FRAME_CHUNK_SIZE)]
+    if frame_threads <= 1:
+        for start, stop in chunks:
+            yield function(start, stop)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=frame_threads) as executor:
+            futures = collections.deque()
+            try:
+                for start, stop in chunks:
+                    futures.append(executor.submit(function, start, stop))
+                    if len(futures) >= 2*frame_threads:
+                        yield futures.popleft().result()
+                while futures:
+                    yield futures.popleft().result()
+            finally:
+                # Chunks not yet started are dropped if the iterator is
+                # closed early.
+                for future in futures:
+                    future.cancel()
+
+def crop_single_image(image: np.ndarray, params_dict: dict,optional_settings: dict = {}) -> np.ndarray:
+    """
+    Crops a single image according to parameters from params_dict
+
+    Parameters
+    ----------
+    image: np.ndarray (scikit.io.imread)
+         The video identified as the experiment video from the researcher
+    params_dict: dict
+        Dictionary of parameters with the crop information added
+
+    Returns
+    -------
+    cropped_image: np.ndarray
+        The input image, cropped according to values in parameters dictionary
+    """
+
+    row_slice, col_slice = crop_slices(params_dict, optional_settings)
+    cropped_image = image[row_slice, col_slice]
+    return cropped_image
+
+def crop_slices(params_dict: dict, optional_settings: dict = {}) -> typing.Tuple[slice, slice]:
+    """
+    Returns the rows and columns of the crop according to parameters from params_dict
+
+    Parameters
+    ----------
+    params_dict: dict
+        Dictionary of parameters with the crop information added
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    nozzle_row: int
+        Row to use for determining the nozzle diameter.
+        Default is 1.
+
+    Returns
+    -------
+    row_slice: slice
+        Rows of the full image included in the crop
+    col_slice: slice
+        Columns of the full image included in the crop
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    nozzle_row = settings["nozzle_row"]
+    crop_width_start = params_dict["crop_width_start"]
+    crop_width_end = params_dict["crop_width_end"]
+    crop_bottom = params_dict["crop_bottom"]
+    crop_top = params_dict["crop_top"]
+
+    row_slice = slice(nozzle_row+crop_top, crop_bottom+crop_top)
+    col_slice = slice(crop_width_start, crop_width_end)
+    return row_slice, col_slice
+
+def crop_video(video: skimage.io.collection.ImageCollection, params_dict: dict, optional_settings: dict = {}) -> reader.CroppedVideo:
+    """
+    Crops every frame of a video according to parameters from params_dict as it is read
+
+    Frames are cropped lazily, and TIFF frames only decode the part of the
+    file covering the crop.
+
+    Parameters
+    ----------
+    video: skimage.io.collection.ImageCollection
+         The video to crop
+    params_dict: dict
+        Dictionary of parameters with the crop information added
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Returns
+    -------
+    cropped_video: reader.CroppedVideo
+        The video, with frames cropped according to values in parameters
+        dictionary when indexed
+    """
+
+    row_slice, col_slice = crop_slices(params_dict, optional_settings)
+    cropped_video = reader.CroppedVideo(video, row_slice, col_slice)
+    return cropped_video
+
+def subtract_background_single_image(cropped_image: np.ndarray, bg_median: np.ndarray) -> np.ndarray:
+    """
+    Performs background subtraction from a cropped image.
+
+    Assumes cropped_image and bg_median are the same size.
+
+    Parameters
+    ----------
+    cropped_image: np.ndarray
+        The initial image, cropped according to values in parameters dictionary
+    bg_median: np.ndarray
+        The single background image produced from produce_background_image
+
+    Returns
+    -------
+    background_subtracted_image: np.ndarray
+        The cropped image with the background subtraction performed
+    """
+
+    background_subtracted_image_org = np.int32(cropped_image) - np.int32(bg_median)
+    if np.any(background_subtracted_image_org < 0):
+        #this means image is darker than background
+        background_subtracted_image = np.abs((background_subtracted_image_org < 0)*background_subtracted_image_org)
+        background_subtracted_image = background_subtracted_image/np.max(background_subtracted_image)
+        #eliminates half the noise
+        background_subtracted_image = skimage.util.invert(background_subtracted_image)
+        background_subtracted_image = skimage.img_as_uint(background_subtracted_image)
+    if np.all(background_subtracted_image_org > 0):
+        # this means that background is darker than image:
+        background_subtracted_image = np.abs((background_subtracted_image_org > 0)*background_subtracted_image_org)
+        background_subtracted_image = background_subtracted_image/np.max(background_subtracted_image)
+        background_subtracted_image = skimage.img_as_uint(background_subtracted_image)
+    return background_subtracted_image
+
+def mean_binarize_single_image(background_subtracted_image: np.ndarray) -> np.ndarray:
+    """
+    Performs global binarization on an image according to the Otsu method
+
+    Parameters
+    ----------
+    background_subtracted_image: np.ndarray
+        The cropped image with the background subtraction performed
+
+    Returns
+    -------
+    binary_otsu: np.ndarray
+        The binarized version of the input image
+
+    """
+    #thresh_mean = threshold_mean(background_subtracted_image)
+    thresh_otsu = threshold_otsu(background_subtracted_image)
+    binary_otsu = background_subtracted_image < thresh_otsu
+    binary_otsu = np.array(binary_otsu)*255
+    binary_otsu = np.uint8(binary_otsu)
+    return binary_otsu
+
+def read_video(video_folder: typing.Union[str, bytes, os.PathLike], optional_settings: dict = {}) -> skimage.io.collection.ImageCollection:
+    """
+    Reads the images in a video folder into an image collection.
+
+    Images are loaded lazily, one frame at a time, as the collection is
+    indexed. If image_extension is "mraw", video_folder is instead the path
+    to a Photron .mraw file, which is read with its .cihx or .cih header.
+
+    Parameters
+    ----------
+    video_folder: path-like
+        Points to the folder which contains the video to read, or to the .mraw
+        file if image_extension is "mraw".
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    image_extension: string
+        The extension for images in the video folder. TIFF recommended.
+        "mraw" for Photron .mraw recordings.
+        Default is "tif". Do not include ".".
+    reader: string
+        "skimage" to read frames through skimage's tifffile plugin, or
+        "memmap" to memory-map uncompressed TIFF frames so frames are views
+        of the files rather than new arrays. Only used for TIFF images.
+        Default is "skimage".
+
+    Returns
+    -------
+    video: skimage.io.collection.ImageCollection, reader.MemmapVideo, or mraw.MrawVideo
+        The frames of the video, in sorted order.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    image_extension = settings["image_extension"]
+    reader_backend = settings["reader"]
+
+    if reader_backend not in ["skimage", "memmap"]:
+        raise ValueError("reader must be 'skimage' or 'memmap'.")
+
+    if image_extension == "mraw":
+        video = mraw.read_mraw(video_folder)
+    elif image_extension == "tif" or image_extension == "tiff":
+        video = skimage.io.imread_collection(os.path.join(video_folder,"*." + image_extension), plugin='tifffile')
+        if reader_backend == "memmap":
+            # Uses the collection only for its sorted list of files.
+            video = reader.MemmapVideo(video.files)
+    else:
+        # No plugin used for non-TIFF image formats
+        video = skimage.io.imread_collection(os.path.join(video_folder,"*." + image_extension))
+    return video
+
+def prepare_background(experimental_video: skimage.io.collection.ImageCollection, background_video: skimage.io.collection.ImageCollection, optional_settings: dict = {}) -> typing.Tuple[dict, np.ndarray]:
+    """
+    Determines the crop parameters and the background to subtract for a video.
+
+    Parameters
+    ----------
+    experimental_video: skimage.io.collection.ImageCollection
+         The video identified as the experiment video from the researcher
+    background_video: skimage.io.collection.ImageCollection
+         The video identified as the background video from the researcher
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    bg_drop_removal: bool
+        True to remove the background drop from the background that is
+        subtracted from the image before binarization. False to not alter
+        the background.
+        Default is False.
+    profile: bool
+        True to time finding the background as the "background" event (see
+        profiling.timer).
+        Default is False.
+
+    Returns
+    -------
+    params_dict: dict
+        Dictionary of parameters with the crop information added
+    bg_median: np.ndarray
+        The single background image to subtract from each cropped frame
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    bg_drop_removal = settings["bg_drop_removal"]
+
+    with profiling.timer("background", settings["profile"]):
+        params_dict = define_image_parameters(experimental_video, optional_settings)
+        bg_median = produce_background_image(background_video, params_dict, optional_settings)
+        if bg_drop_removal:
+            bg_median = remove_bg_drop(bg_median)
+    return params_dict, bg_median
+
+def tiffs_to_binary(experimental_video_folder: typing.Union[str, bytes, os.PathLike], background_video_folder: typing.Union[str, bytes, os.PathLike], images_location: typing.Union[str, bytes, os.PathLike], optional_settings: dict = {}):
+    """
+
+    Processes experimental and background video into binarized video.
+
+    Given a experimental video folder and a background video folder, processes
+    the videos into a folder of binarized images in the target directory.
+    Can also produce cropped and background subtracted images given optional
+    settings.
+
+    Parameters
+    ----------
+    experimental_video_folder: path-like
+        Points to the folder which contains the experimental video to analyse.
+    background_video_folder: path-like
+        Points to the folder which contains the background video used in analysis.
+    images_location: path-like
+        The folder where folders of images should be saved.
+    optional_settings: dict
+        A dictionary of optional settings.
+
     Optional Settings and Defaults
     ------------------------------
     save_crop: bool
@@ -445,6 +1451,28 @@ def tiffs_to_binary(experimental_video_folder: typing.Union[str, bytes, os.PathL
     image_extension: string
         The extension for images in the video folder. TIFF recommended.
         Default is "tif". Do not include ".".
+    async_write: bool
+        True to save images on background threads. Every image is saved
+        before tiffs_to_binary returns.
+        Default is False.
+    frame_step: int
+        Converts every frame_step-th frame first, then every frame in the
+        region where D/D0 passes through tc_bounds and fitting_bounds, for
+        quick screening. Images are named by frame number, so
+        binary_images_to_csv finds the correct times. 1 to convert every
+        frame.
+        Default is 1.
+    use_cache: bool
+        True to skip only the stages (binary, cropped, and
+        background-subtracted images, and parameters) whose cache key in the
+        cache manifest matches the current videos and settings. Folders of
+        other stages are emptied and recomputed. Replaces skip_existing.
+        Default is False.
+    resume: bool
+        True to continue a video interrupted partway through from the last
+        recorded frame, rather than converting it again from the start.
+        Interrupted videos are never skipped, whatever skip_existing is.
+        Default is False.
 
     Returns
     -------
@@ -453,40 +1481,596 @@ def tiffs_to_binary(experimental_video_folder: typing.Union[str, bytes, os.PathL
 
     settings = integration.set_defaults(optional_settings)
     skip_existing = settings["skip_existing"]
-    image_extension = settings["image_extension"]
     verbose = settings["verbose"]
-    bg_drop_removal = settings["bg_drop_removal"]
+    use_cache = settings["use_cache"]
     fname = os.path.basename(experimental_video_folder)
 
     folders_exist = folder.make_destination_folders(images_location, optional_settings)
+    if use_cache:
+        # Cached stages are skipped and every other stage is recomputed,
+        # whether or not its folder exists.
+        keys = {stage: cache.stage_key(stage, experimental_video_folder, background_video_folder, optional_settings) for stage in cache.IMAGE_STAGES + ["params"]}
+        folders_exist, stages_to_compute = cache.prepare_image_stages(images_location, keys, folders_exist, optional_settings)
+        optional_settings = dict(optional_settings)
+        optional_settings["skip_existing"] = True
+        skip_existing = cache.is_cached(images_location, "params", keys["params"])
+        if not skip_existing:
+            cache.start_stage(images_location, "params")
+    if cache.interrupted(images_location):
+        # An earlier run stopped partway through this video, so its saved
+        # images are saved again (or continued if resume is True) rather
+        # than skipped.
+        saved_stages = cache.saved_image_stages(optional_settings)
+        folders_exist = [exists and stage not in saved_stages for stage, exists in zip(cache.IMAGE_STAGES, folders_exist)]
     # If all the image folders that would be saved exist and the skip_existing
     # is True, skips loading and saving images completely.
     if not all(folders_exist) or not skip_existing:
-        # TODO: test image format handling
         if verbose:
             print("Processing folder: " + fname)
-        if image_extension == "tif" or image_extension == "tiff":
-            experimental_video = skimage.io.imread_collection(os.path.join(experimental_video_folder,"*." + image_extension), plugin='tifffile')
-            background_video = skimage.io.imread_collection(os.path.join(background_video_folder,"*."+image_extension), plugin='tifffile')
-        else:
-            # No plugin used for non-TIFF image formats
-            experimental_video = skimage.io.imread_collection(os.path.join(experimental_video_folder,"*." + image_extension))
-            background_video = skimage.io.imread_collection(os.path.join(background_video_folder,"*." + image_extension))
-        params_dict = define_image_parameters(experimental_video, optional_settings)
-        bg_median = produce_background_image(background_video, params_dict, optional_settings)
-        if bg_drop_removal:
-            bg_median = remove_bg_drop(bg_median)
-        convert_tiff_sequence_to_binary(experimental_video, bg_median, params_dict, images_location, folders_exist, optional_settings)
+        experimental_video = read_video(experimental_video_folder, optional_settings)
+        background_video = read_video(background_video_folder, optional_settings)
+        params_dict, bg_median = prepare_background(experimental_video, background_video, optional_settings)
         params_dict["window_top"] = top_border(bg_median)
+        if settings["frame_step"] > 1:
+            # Sampling needs the diameter of each frame as it is converted,
+            # measured in the same window as binary_images_to_csv.
+            (height, width) = bg_median.shape
+            window = [0,params_dict["window_top"],width,height]
+            sampled_settings = dict(optional_settings)
+            sampled_settings["save_bin"] = True
+            # Sampled frames are converted out of order, so the video only
+            # records that it has started, and is converted again if
+            # interrupted.
+            cache.record_progress(images_location, 0, len(experimental_video), optional_settings)
+            convert_tiff_sequence_to_diameters(experimental_video, bg_median, params_dict, window, images_location, folders_exist, sampled_settings)
+        else:
+            convert_tiff_sequence_to_binary(experimental_video, bg_median, params_dict, images_location, folders_exist, optional_settings)
         export_params(images_location, params_dict)
-        toc = time.time()
-        #if verbose:
-        #    print("Total time elapsed: " + str(np.round((toc-tic))) + " seconds")
+        cache.complete_progress(images_location, optional_settings)
+        if use_cache:
+            for stage in stages_to_compute + ["params"]:
+                cache.finish_stage(images_location, stage, keys[stage])
     else:
         if verbose:
             print("Folder " + fname + "skipped because all folders for processing already exist and optional_settings skip_existing is True (by default).")
     pass
 
+def tiffs_to_csv(experimental_video_folder: typing.Union[str, bytes, os.PathLike], background_video_folder: typing.Union[str, bytes, os.PathLike], images_location: typing.Union[str, bytes, os.PathLike], csv_location: typing.Union[str, bytes, os.PathLike], fps: float, optional_settings: dict = {}):
+    """
+    Processes experimental and background video directly into a csv of D/D0 vs. time.
+
+    Fused alternative to tiffs_to_binary followed by binary_images_to_csv.
+    Each frame is cropped, background-subtracted, binarized, and measured in
+    memory, so binary images are never written to and read back from disk
+    unless save_bin is True. Image parameters are still exported to
+    images_location.
+
+    Parameters
+    ----------
+    experimental_video_folder: path-like
+        Points to the folder which contains the experimental video to analyse.
+    background_video_folder: path-like
+        Points to the folder which contains the background video used in analysis.
+    images_location: path-like
+        The folder where the parameters and any optional images should be
+        saved, named with relevent experimental information. The csv is
+        named after this folder.
+    csv_location: path-like
+        The path to the folder in which csv should be saved.
+    fps: float
+        Frames per second for the video (likely parsed from file name)
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    save_crop: bool
+        True to save intermediate cropped images (i.e. experimental video
+        images cropped but not background-subtracted or binarized).
+        Default is False.
+    save_bg_sub: bool
+        True to save background-subtracted images (i.e. experimental video
+        images cropped and background-subtracted but not binarized).
+        Default is False.
+    save_bin: bool
+        True to save binary images as well.
+        Default is False.
+    bg_drop_removal: bool
+        True to remove the background drop from the background that is
+        subtracted from the image before binarization. False to not alter
+        the background.
+        Default is False.
+    skip_existing: bool
+        Determines the behavior when a file already appears exists
+        when a function would generate it. True to skip any existing files.
+        False to overwrite (or delete and then write, where overwriting would
+        generate an error).
+        Default is True.
+    verbose: bool
+        Determines whether processing functions print statements as they
+        progress through major steps. True to see print statements, False to
+        hide non-errors/warnings.
+        Default is False.
+    image_extension: string
+        The extension for images in the video folder. TIFF recommended.
+        Default is "tif". Do not include ".".
+    stop_after_breakup: int
+        Number of consecutive frames with a minimum diameter of 0 after
+        which the rest of the video is not processed. The number of frames
+        processed and in the video are saved with the parameters. 0 to
+        process every frame.
+        Default is 0.
+    frame_step: int
+        Processes every frame_step-th frame first, then every frame in the
+        region where D/D0 passes through tc_bounds and fitting_bounds, for
+        quick screening. The csv only holds the processed frames, at their
+        correct times. 1 to process every frame.
+        Default is 1.
+    use_cache: bool
+        True to skip the video only if the cache manifest in images_location
+        records the csv and any saved images as made from the current videos,
+        settings, and fps. Otherwise the csv is rewritten, and optional
+        images are only saved again for stages that are not cached. Replaces
+        skip_existing.
+        Default is False.
+    profile: bool
+        True to time finding the background, converting frames, and saving
+        the csv ("write_csv") as events (see profiling.timer).
+        Default is False.
+
+    Returns
+    -------
+    Saved csv on disk (and optional image sequences at images_location).
+    """
+
+    fused_settings = dict(optional_settings)
+    fused_settings["fused"] = True
+    settings = integration.set_defaults(fused_settings)
+    skip_existing = settings["skip_existing"]
+    verbose = settings["verbose"]
+    use_cache = settings["use_cache"]
+    fname = os.path.basename(experimental_video_folder)
+    folder_name = os.path.basename(images_location)
+
+    csv_exists = os.path.exists(os.path.join(csv_location,folder_name + ".csv"))
+    if use_cache:
+        keys = {stage: cache.stage_key(stage, experimental_video_folder, background_video_folder, fused_settings) for stage in cache.IMAGE_STAGES + ["params"]}
+        keys["csv"] = cache.stage_key("csv", experimental_video_folder, background_video_folder, fused_settings, {"fps": fps})
+        # Skips only if the csv and every saved image stage are cached.
+        stages = ["csv"] + cache.saved_image_stages(fused_settings)
+        csv_exists = csv_exists and all(cache.is_cached(images_location, stage, keys[stage]) for stage in stages)
+        skip_existing = True
+
+    # Skips processing if csv already exists and skip_existing is True.
+    if csv_exists and skip_existing:
+        if verbose:
+            print(folder_name + ".csv already exists and skip_existing is True. tiffs_to_csv skipped.")
+        return
+
+    if verbose:
+        print("Processing folder: " + fname)
+    folders_exist = folder.make_destination_folders(images_location, fused_settings)
+    if use_cache:
+        # Cached image stages are not saved again, and the csv and
+        # parameters are always rewritten.
+        folders_exist, stages_to_compute = cache.prepare_image_stages(images_location, keys, folders_exist, fused_settings)
+        for stage in ["csv", "params"]:
+            cache.start_stage(images_location, stage)
+        fused_settings["skip_existing"] = True
+    experimental_video = read_video(experimental_video_folder, fused_settings)
+    background_video = read_video(background_video_folder, fused_settings)
+    params_dict, bg_median = prepare_background(experimental_video, background_video, fused_settings)
+
+    # The window matches the one binary_images_to_csv would construct from
+    # the saved binaries, which are the same size as bg_median.
+    ### window: [left, top, right, bottom]
+    params_dict["window_top"] = top_border(bg_median)
+    (height, width) = bg_median.shape
+    window = [0,params_dict["window_top"],width,height]
+
+    diameters, measured = convert_tiff_sequence_to_diameters(experimental_video, bg_median, params_dict, window, images_location, folders_exist, fused_settings)
+    if settings["stop_after_breakup"] > 0 or settings["frame_step"] > 1:
+        # Records how much of the video was processed.
+        params_dict["frames_processed"] = np.count_nonzero(measured)
+        params_dict["frames_total"] = len(experimental_video)
+    export_params(images_location, params_dict)
+
+    params_dict["fps"] = fps
+    df = binary.diameters_to_dataframe(diameters, params_dict, measured)
+    with profiling.timer("write_csv", settings["profile"]):
+        if use_cache:
+            csv_settings = dict(fused_settings)
+            csv_settings["skip_existing"] = False
+            binary.save_diameter_csv(df, csv_location, folder_name, csv_settings)
+            for stage in stages_to_compute + ["params", "csv"]:
+                cache.finish_stage(images_location, stage, keys[stage])
+        else:
+            binary.save_diameter_csv(df, csv_location, folder_name, fused_settings)
+    pass
+
+# Memory used by a worker process with its modules imported, before it
+# processes any video.
+WORKER_BASE_BYTES = 200 * 2**20
+
+# Memory used per pixel of each frame being converted, for the frame and
+# the floating point images made while cropping, subtracting the
+# background, and binarizing it.
+FRAME_WORKING_BYTES_PER_PIXEL = 48
+
+# Memory used per pixel of the background by streaming_median: histograms
+# of 64 bins (np.uint32) and their cumulative sums (np.uint64) for the
+# coarse bins and for the lower and upper fine bins.
+STREAMING_MEDIAN_BYTES_PER_PIXEL = 64 * 3 * (4 + 8)
+
+def video_frame_info(video_folder: typing.Union[str, bytes, os.PathLike], optional_settings: dict = {}) -> typing.Tuple[tuple, np.dtype, int]:
+    """
+    Reads the frame shape, dtype, and number of frames of a video from its
+    headers, without reading any frames.
+
+    Parameters
+    ----------
+    video_folder: path-like
+        Points to the folder which contains the video, or to the .mraw file
+        if image_extension is "mraw".
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    image_extension: string
+        The extension for images in the video folder. TIFF recommended.
+        "mraw" for Photron .mraw recordings. Images that are not TIFFs are
+        read to find their shape.
+        Default is "tif". Do not include ".".
+
+    Returns
+    -------
+    shape: tuple
+        Shape of each frame.
+    dtype: np.dtype
+        Data type of each frame.
+    frame_count: int
+        Number of frames in the video.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    image_extension = settings["image_extension"]
+
+    if image_extension == "mraw":
+        header = mraw.read_cih(mraw.find_cih(video_folder))
+        shape = (header["Image Height"], header["Image Width"])
+        dtype = np.dtype(np.uint8) if header["Color Bit"] == 8 else np.dtype(np.uint16)
+        return shape, dtype, header["Total Frame"]
+    files = sorted(glob.glob(os.path.join(video_folder,"*." + image_extension)))
+    if len(files) == 0:
+        return (0, 0), np.dtype(np.uint16), 0
+    if image_extension == "tif" or image_extension == "tiff":
+        with tifffile.TiffFile(files[0]) as tif:
+            page = tif.pages[0]
+            shape, dtype = page.shape, page.dtype
+    else:
+        image = skimage.io.imread(files[0])
+        shape, dtype = image.shape, image.dtype
+    return shape, np.dtype(dtype), len(files)
+
+def estimate_task_memory(experimental_video_folder: typing.Union[str, bytes, os.PathLike], background_video_folder: typing.Union[str, bytes, os.PathLike], optional_settings: dict = {}) -> dict:
+    """
+    Estimates the peak memory of the steps of processing a video.
+
+    Frames are assumed to be uncropped, so estimates are upper bounds for
+    videos that are cropped.
+
+    Parameters
+    ----------
+    experimental_video_folder: path-like
+        Points to the folder which contains the experimental video.
+    background_video_folder: path-like
+        Points to the folder which contains the background video.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    streaming_median: bool
+        True if the background median is found with streaming_median.
+        Default is False.
+    frame_threads: int
+        Number of threads converting chunks of frames at once.
+        Default is 1.
+    prefetch_depth: int
+        Number of frames read ahead while converting frames.
+        Default is 4.
+
+    Returns
+    -------
+    estimates: dict
+        Peak memory in bytes of a worker process finding the background
+        ("background") and converting frames ("frames"), each including
+        WORKER_BASE_BYTES.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    streaming = settings["streaming_median"]
+    frame_threads = settings["frame_threads"]
+    prefetch_depth = settings["prefetch_depth"]
+
+    exp_shape, exp_dtype, exp_count = video_frame_info(experimental_video_folder, optional_settings)
+    bg_shape, bg_dtype, bg_count = video_frame_info(background_video_folder, optional_settings)
+    bg_pixels = int(np.prod(bg_shape))
+    exp_pixels = int(np.prod(exp_shape))
+
+    if streaming:
+        background = bg_pixels * STREAMING_MEDIAN_BYTES_PER_PIXEL
+    else:
+        # The list of cropped frames, the array np.median makes from it and
+        # sorts, and the float median.
+        background = 2 * bg_count * bg_pixels * bg_dtype.itemsize + 8 * bg_pixels
+
+    if frame_threads > 1:
+        frames_in_progress = 2 * frame_threads * FRAME_CHUNK_SIZE
+    else:
+        frames_in_progress = FRAME_CHUNK_SIZE + prefetch_depth
+    frames = frames_in_progress * exp_pixels * (exp_dtype.itemsize + FRAME_WORKING_BYTES_PER_PIXEL)
+
+    return {"background": WORKER_BASE_BYTES + background, "frames": WORKER_BASE_BYTES + frames}
+
+def video_chunks_supported(optional_settings: dict = {}) -> bool:
+    """
+    Determines whether videos can be converted in ranges of frames with
+    prepare_video_chunks, convert_video_chunk, and finish_video_chunks.
+
+    Ranges of frames are converted independently, so every image must be
+    saved as its own file and no frame may depend on the frames before it.
+
+    Parameters
+    ----------
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    task_frames: int
+        Number of frames in each range. 0 to convert whole videos.
+        Default is 0.
+
+    Returns
+    -------
+    video_chunks_supported: bool
+        True if task_frames is above 0, bin_format is "png",
+        intermediate_format is "tiff", frame_step is 1, stop_after_breakup is
+        0, and use_cache and resume are False.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+
+    return settings["task_frames"] > 0 and video_chunks_conflicts(optional_settings) == []
+
+def video_chunks_conflicts(optional_settings: dict = {}) -> list:
+    """
+    Finds the settings that prevent videos being converted in ranges of
+    frames (see video_chunks_supported).
+
+    Parameters
+    ----------
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Returns
+    -------
+    conflicts: list of str
+        Names of the settings that prevent converting ranges of frames:
+        bin_format if not "png", intermediate_format if not "tiff",
+        frame_step if above 1, stop_after_breakup if above 0, and use_cache
+        and resume if True. Empty if ranges can be converted.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+
+    conflicts = []
+    if settings["bin_format"] != "png":
+        conflicts.append("bin_format")
+    if settings["intermediate_format"] != "tiff":
+        conflicts.append("intermediate_format")
+    if settings["frame_step"] != 1:
+        conflicts.append("frame_step")
+    if settings["stop_after_breakup"] != 0:
+        conflicts.append("stop_after_breakup")
+    if settings["use_cache"]:
+        conflicts.append("use_cache")
+    if settings["resume"]:
+        conflicts.append("resume")
+    return conflicts
+
+def prepare_video_chunks(experimental_video_folder: typing.Union[str, bytes, os.PathLike], background_video_folder: typing.Union[str, bytes, os.PathLike], images_location: typing.Union[str, bytes, os.PathLike], csv_location: typing.Optional[typing.Union[str, bytes, os.PathLike]] = None, optional_settings: dict = {}) -> typing.Optional[dict]:
+    """
+    Prepares a video to be converted in ranges of frames.
+
+    Determines the crop parameters and background once per video, so that
+    each range of frames can then be converted by convert_video_chunk in any
+    worker. Videos are skipped the same way as by tiffs_to_binary, or by
+    tiffs_to_csv if fused is True.
+
+    Parameters
+    ----------
+    experimental_video_folder: path-like
+        Points to the folder which contains the experimental video to analyse.
+    background_video_folder: path-like
+        Points to the folder which contains the background video used in analysis.
+    images_location: path-like
+        The folder where folders of images should be saved. Created if it
+        does not exist.
+    csv_location: path-like, optional
+        The folder in which the csv is saved, if fused is True.
+        Default is None.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    fused: bool
+        True to measure the diameter of each frame in memory, saving binary
+        images only if save_bin is True.
+        Default is False.
+    skip_existing: bool
+        Determines the behavior when a file already appears exists
+        when a function would generate it. True to skip any existing files.
+        False to overwrite (or delete and then write, where overwriting would
+        generate an error).
+        Default is True.
+    verbose: bool
+        Determines whether processing functions print statements as they
+        progress through major steps. True to see print statements, False to
+        hide non-errors/warnings.
+        Default is False.
+
+    Returns
+    -------
+    prepared: dict or None
+        The parameters ("params_dict"), background ("bg_median"), existing
+        folders ("folders_exist"), number of frames ("frame_count"), and
+        window in which to measure diameters ("window", None if fused is
+        False) of the video. None if the video is skipped.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    skip_existing = settings["skip_existing"]
+    verbose = settings["verbose"]
+    fused = settings["fused"]
+    fname = os.path.basename(experimental_video_folder)
+    folder_name = os.path.basename(images_location)
+
+    if fused:
+        csv_exists = os.path.exists(os.path.join(csv_location,folder_name + ".csv"))
+        if csv_exists and skip_existing:
+            if verbose:
+                print(folder_name + ".csv already exists and skip_existing is True. Video skipped.")
+            return None
+
+    if not os.path.isdir(images_location):
+        os.mkdir(images_location)
+    folders_exist = folder.make_destination_folders(images_location, optional_settings)
+    if cache.interrupted(images_location):
+        # Saved images of an interrupted video are saved again.
+        saved_stages = cache.saved_image_stages(optional_settings)
+        folders_exist = [exists and stage not in saved_stages for stage, exists in zip(cache.IMAGE_STAGES, folders_exist)]
+    if not fused and all(folders_exist) and skip_existing:
+        if verbose:
+            print("Folder " + fname + " skipped because all folders for processing already exist and optional_settings skip_existing is True (by default).")
+        return None
+
+    if verbose:
+        print("Processing folder: " + fname)
+    experimental_video = read_video(experimental_video_folder, optional_settings)
+    background_video = read_video(background_video_folder, optional_settings)
+    params_dict, bg_median = prepare_background(experimental_video, background_video, optional_settings)
+    params_dict["window_top"] = top_border(bg_median)
+    window = None
+    if fused:
+        (height, width) = bg_median.shape
+        window = [0,params_dict["window_top"],width,height]
+    frame_count = len(experimental_video)
+    # Marks the video as in progress until finish_video_chunks.
+    cache.record_progress(images_location, 0, frame_count, optional_settings)
+    return {"params_dict": params_dict, "bg_median": bg_median, "folders_exist": folders_exist,
+            "frame_count": frame_count, "window": window}
+
+def convert_video_chunk(experimental_video_folder: typing.Union[str, bytes, os.PathLike], images_location: typing.Union[str, bytes, os.PathLike], prepared: dict, start: int, stop: int, optional_settings: dict = {}) -> np.ndarray:
+    """
+    Converts a range of frames of a video prepared by prepare_video_chunks.
+
+    Only the frames from start to stop are read, so ranges of the same video
+    can be converted at once in different worker processes.
+
+    Parameters
+    ----------
+    experimental_video_folder: path-like
+        Points to the folder which contains the experimental video to analyse.
+    images_location: path-like
+        The folder where folders of images should be saved.
+    prepared: dict
+        The video as prepared by prepare_video_chunks. "bg_median" may be
+        replaced by a handle from shared_arrays.share_array, so workers read
+        the background from shared memory instead of receiving a copy.
+    start: int
+        First frame to convert.
+    stop: int
+        Frame after the last frame to convert.
+    optional_settings: dict
+        A dictionary of optional settings. See convert_tiff_sequence_to_binary.
+
+    Returns
+    -------
+    diameters: np.ndarray
+        Minimum diameter (in pixels) of each frame in the range if fused is
+        True, otherwise an empty array.
+    """
+
+    experimental_video = read_video(experimental_video_folder, optional_settings)
+    cropped_video = crop_video(experimental_video, prepared["params_dict"], optional_settings)
+    writers = open_stack_writers(images_location, prepared["folders_exist"], optional_settings)
+    try:
+        with shared_arrays.attached_array(prepared["bg_median"]) as bg_median:
+            diameters, collected = convert_cropped_frames(cropped_video, start, stop, bg_median, images_location,
+                                                          prepared["folders_exist"], optional_settings,
+                                                          window=prepared["window"], image_writer=writers["images"])
+            del bg_median
+        close_stack_writers(writers)
+    except BaseException:
+        abort_stack_writers(writers)
+        raise
+    return diameters
+
+def finish_video_chunks(images_location: typing.Union[str, bytes, os.PathLike], prepared: dict, diameters: np.ndarray, csv_location: typing.Optional[typing.Union[str, bytes, os.PathLike]] = None, fps: typing.Optional[float] = None, optional_settings: dict = {}):
+    """
+    Finishes a video once every range of frames is converted.
+
+    Exports the image parameters and marks the video as complete. If fused is
+    True, also saves the csv of D/D0 vs. time from the diameters of every
+    range, in frame order.
+
+    Parameters
+    ----------
+    images_location: path-like
+        The folder where the parameters should be saved. The csv is named
+        after this folder.
+    prepared: dict
+        The video as prepared by prepare_video_chunks.
+    diameters: np.ndarray
+        Diameters returned by convert_video_chunk for each range, joined in
+        frame order. Only used if fused is True.
+    csv_location: path-like, optional
+        The folder in which to save the csv, if fused is True.
+        Default is None.
+    fps: float, optional
+        Frames per second for the video, if fused is True.
+        Default is None.
+    optional_settings: dict
+        A dictionary of optional settings.
+
+    Optional Settings and Defaults
+    ------------------------------
+    fused: bool
+        True to save the csv of D/D0 vs. time.
+        Default is False.
+
+    Returns
+    -------
+    Parameters (and csv if fused is True) saved on disk.
+    """
+
+    settings = integration.set_defaults(optional_settings)
+    fused = settings["fused"]
+    params_dict = prepared["params_dict"]
+
+    export_params(images_location, params_dict)
+    cache.complete_progress(images_location, optional_settings)
+    if fused:
+        params_dict = dict(params_dict)
+        params_dict["fps"] = fps
+        df = binary.diameters_to_dataframe(diameters, params_dict)
+        binary.save_diameter_csv(df, csv_location, os.path.basename(images_location), optional_settings)
+    pass
+
 def top_border(bg_median: np.ndarray) -> int:
     """
     Finds the top border of interest given a background image.
@@ -532,5 +2116,7 @@ def export_params(images_location: typing.Union[str, bytes, os.PathLike], params
     folder_name = os.path.basename(images_location)
     path = os.path.join(images_location,folder_name + "_params.csv")
     params_df = pd.DataFrame(list(params_dict.items()), columns = ['Keys','Values'])
-    params_df.to_csv(path, index=False)
+    # Saves through a temporary file so the parameters are never half-written.
+    params_df.to_csv(path + ".partial", index=False)
+    os.replace(path + ".partial", path)
     pass
@@ -0,0 +1,132 @@
+# Benchmarks of each stage of the pipeline, and of the whole pipeline in
+# frames per second, on synthetic DOS videos (see dosertools.tests.synthetic).
+# Requires pytest-benchmark. From src, run
+#     python -m pytest dosertools/tests/benchmarks --benchmark-only
+# and compare runs with --benchmark-autosave and --benchmark-compare.
+# The size of the videos can be set with the DOSERTOOLS_BENCHMARK_SHAPE
+# (e.g. "1024x512"), DOSERTOOLS_BENCHMARK_FRAMES, and DOSERTOOLS_BENCHMARK_RUNS
+# environment variables.
+
+import os
+import shutil
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from dosertools.data_processing import integration as integration
+from dosertools.data_processing import csv as dpcsv
+from dosertools.data_processing import fitting as fitting
+from dosertools.image_processing import tiff_handling as th
+from dosertools.image_processing import binary as binary
+from dosertools.file_handling import tags as tags
+from dosertools.tests import synthetic as synthetic
+
+SHAPE = tuple(int(size) for size in os.environ.get("DOSERTOOLS_BENCHMARK_SHAPE", "1024x512").split("x"))
+FRAME_COUNT = int(os.environ.get("DOSERTOOLS_BENCHMARK_FRAMES", "200"))
+RUN_COUNT = int(os.environ.get("DOSERTOOLS_BENCHMARK_RUNS", "3"))
+# Rounds of each benchmark; every stage takes long enough to time in one
+# iteration.
+ROUNDS = 3
+
+fname_format = "sampleinfo_fps_substrate_run_vtype_remove_remove"
+sampleinfo_format = "MW-backbone-pass-concentration"
+optional_settings = {"experiment_tag" : "", "verbose" : False}
+
+@pytest.fixture(scope="module")
+def synthetic_videos(tmp_path_factory):
+    # Runs of one sample, each with its own noise.
+    videos_folder = tmp_path_factory.mktemp("videos")
+    folders = []
+    for run in range(1, RUN_COUNT + 1):
+        video, background, truth = synthetic.dos_video(SHAPE, frame_count=FRAME_COUNT, seed=run)
+        folders.append(synthetic.write_dos_videos(videos_folder, "6.7M-PAM-20pass-0.021wtpct_fps-25k_Al_" + str(run), video, background))
+    return videos_folder, folders
+
+@pytest.fixture(scope="module")
+def binaries(tmp_path_factory, synthetic_videos):
+    videos_folder, folders = synthetic_videos
+    (experimental_video_folder, background_video_folder) = folders[0]
+    images_location = tmp_path_factory.mktemp("images") / os.path.basename(experimental_video_folder)
+    th.tiffs_to_binary(experimental_video_folder, background_video_folder, images_location, optional_settings)
+    return images_location
+
+@pytest.fixture(scope="module")
+def csv_folder(tmp_path_factory, synthetic_videos):
+    videos_folder, folders = synthetic_videos
+    images_folder = tmp_path_factory.mktemp("images")
+    csv_folder = tmp_path_factory.mktemp("csv")
+    summary_folder = tmp_path_factory.mktemp("summary")
+    integration.videos_to_csvs(videos_folder, images_folder, csv_folder, summary_folder, fname_format, sampleinfo_format, optional_settings)
+    return csv_folder
+
+@pytest.fixture(scope="module")
+def short_fname_format():
+    return tags.shorten_fname_format(fname_format, optional_settings)
+
+@pytest.fixture(scope="module")
+def df(csv_folder, short_fname_format):
+    return dpcsv.generate_df(csv_folder, short_fname_format, sampleinfo_format, optional_settings)
+
+@pytest.fixture(scope="module")
+def summary_df(df):
+    return fitting.make_summary_dataframe(df, sampleinfo_format, optional_settings)
+
+def fresh_folders(tmp_path, *names):
+    # Returns a setup function for benchmark.pedantic that empties the
+    # folders in tmp_path named names before each round, so nothing is
+    # skipped as already processed.
+    def setup():
+        folders = [tmp_path / name for name in names]
+        for path in folders:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.mkdir(path)
+        return tuple(folders), {}
+    return setup
+
+def test_tiffs_to_binary(benchmark, tmp_path, synthetic_videos):
+    # Times background subtraction and binarization of one video.
+    videos_folder, folders = synthetic_videos
+    (experimental_video_folder, background_video_folder) = folders[0]
+    def convert(images_location):
+        th.tiffs_to_binary(experimental_video_folder, background_video_folder, images_location, optional_settings)
+    benchmark.pedantic(convert, setup=fresh_folders(tmp_path, "images"), rounds=ROUNDS)
+    benchmark.extra_info["frames"] = FRAME_COUNT
+
+def test_binaries_to_diameter_time(benchmark, binaries):
+    # Times measuring the diameter in the binary images of one video.
+    params_dict = binary.add_saved_params_to_dict(binaries, {"fps" : 25000})
+    binary_location = os.path.join(binaries, "bin")
+    (height, width) = binary.binary_image_shape(binary_location)
+    window = [0, int(params_dict["window_top"]), width, height]
+    df = benchmark.pedantic(binary.binaries_to_diameter_time, args=(binary_location, window, params_dict),
+                            kwargs={"optional_settings" : optional_settings}, rounds=ROUNDS)
+    assert len(df) == FRAME_COUNT
+
+def test_generate_df(benchmark, csv_folder, short_fname_format):
+    # Times reading and processing the csvs of every run.
+    df = benchmark.pedantic(dpcsv.generate_df, args=(csv_folder, short_fname_format, sampleinfo_format, optional_settings),
+                            rounds=ROUNDS)
+    assert df["run"].nunique() == RUN_COUNT
+
+def test_make_summary_dataframe(benchmark, df):
+    # Times fitting the relaxation time of every run.
+    summary_df = benchmark.pedantic(fitting.make_summary_dataframe, args=(df, sampleinfo_format, optional_settings),
+                                    rounds=ROUNDS)
+    assert len(summary_df) == RUN_COUNT
+
+def test_calculate_elongational_visc(benchmark, df, summary_df):
+    # Times calculating the elongational viscosity of every run.
+    benchmark.pedantic(fitting.calculate_elongational_visc, args=(df, summary_df, optional_settings), rounds=ROUNDS)
+
+def test_videos_to_summaries(benchmark, tmp_path, synthetic_videos):
+    # Times the whole pipeline on every run, reported in frames per second
+    # in extra_info.
+    videos_folder, folders = synthetic_videos
+    def process(images_folder, csv_folder, summary_folder):
+        integration.videos_to_summaries(videos_folder, images_folder, csv_folder, summary_folder, fname_format,
+                                        sampleinfo_format, optional_settings)
+    benchmark.pedantic(process, setup=fresh_folders(tmp_path, "images", "csv", "summary"), rounds=ROUNDS)
+    frames = FRAME_COUNT * RUN_COUNT
+    benchmark.extra_info["frames"] = frames
+    benchmark.extra_info["frames_per_second"] = frames / benchmark.stats.stats.mean
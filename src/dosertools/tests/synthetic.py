@@ -0,0 +1,238 @@
+import numpy as np
+import os
+import typing
+import tifffile
+
+# Intensities (12-bit) of the backlit background and of the nozzle, liquid,
+# and substrate in shadow.
+BRIGHT_LEVEL = 3800
+DARK_LEVEL = 80
+
+def dos_diameters(frame_count: int, nozzle_diameter: float, ec_start: float = 0.2, breakup: float = 0.8,
+                  ec_ratio: float = 0.5) -> typing.Tuple[np.ndarray, float]:
+    """
+    Finds the neck diameter of a thinning DOS filament in each frame.
+
+    The neck first thins inertio-capillarily, with (1 - D/D0) growing as
+    t^(2/3), from D/D0 = 1 to ec_ratio, then elasto-capillarily, with D/D0
+    decaying exponentially with time constant 3 * relaxation time, until it
+    is 1 pixel wide. The filament then pinches off (diameter 0).
+
+    Parameters
+    ----------
+    frame_count: int
+        Number of frames.
+    nozzle_diameter: float
+        Diameter of the nozzle (D0) in pixels.
+    ec_start: float, optional
+        Fraction of the video before the elasto-capillary regime starts.
+        Default is 0.2.
+    breakup: float, optional
+        Fraction of the video before the filament pinches off.
+        Default is 0.8.
+    ec_ratio: float, optional
+        D/D0 at the start of the elasto-capillary regime.
+        Default is 0.5.
+
+    Returns
+    -------
+    diameters: np.ndarray
+        Neck diameter in pixels in each frame, 0 after pinch-off.
+    relaxation_frames: float
+        Relaxation time in frames (divide by fps for seconds).
+    """
+
+    frames = np.arange(0, frame_count, dtype=float)
+    ec_frame = ec_start * frame_count
+    breakup_frame = breakup * frame_count
+    # The diameter reaches 1 pixel at breakup_frame.
+    relaxation_frames = (breakup_frame - ec_frame) / (3 * np.log(ec_ratio * nozzle_diameter))
+
+    inertial = 1 - (1 - ec_ratio) * (frames / ec_frame)**(2/3)
+    elastic = ec_ratio * np.exp(-(frames - ec_frame) / (3 * relaxation_frames))
+    diameters = nozzle_diameter * np.where(frames < ec_frame, inertial, elastic)
+    diameters[frames >= breakup_frame] = 0
+    return diameters, relaxation_frames
+
+def dos_geometry(shape: typing.Tuple[int, int]) -> dict:
+    """
+    Places the nozzle and substrate in a frame of the given shape.
+
+    The nozzle is centered and as wide as 40% of the frame (or less, so the
+    whole crop of the pipeline fits in the frame), and its tip and the
+    substrate are placed inside the region the pipeline crops with default
+    settings (see tiff_handling.define_image_parameters).
+
+    Parameters
+    ----------
+    shape: tuple of two ints
+        Shape (rows, columns) of each frame.
+
+    Returns
+    -------
+    geometry: dict
+        Center column ("center"), width of the nozzle ("nozzle_diameter"),
+        last row of the nozzle ("nozzle_tip"), and first row of the
+        substrate ("substrate"), all in pixels.
+    """
+
+    (height, width) = shape
+    # Even, so the nozzle covers whole pixels either side of the center.
+    nozzle_diameter = 2 * int(min(0.4 * width, height / 2.5) / 2)
+    return {"center": width / 2, "nozzle_diameter": nozzle_diameter, "nozzle_tip": int(0.6 * nozzle_diameter),
+            "substrate": int(1.9 * nozzle_diameter)}
+
+def dos_frame(shape: typing.Tuple[int, int], geometry: dict, diameter: typing.Optional[float],
+              rng: np.random.Generator, noise: float = 20) -> np.ndarray:
+    """
+    Draws one backlit frame of a DOS video.
+
+    Parameters
+    ----------
+    shape: tuple of two ints
+        Shape (rows, columns) of the frame.
+    geometry: dict
+        Positions of the nozzle and substrate, from dos_geometry.
+    diameter: float or None
+        Neck diameter of the liquid bridge in pixels, 0 for a pinched-off
+        filament, or None for no liquid (a background frame).
+    rng: np.random.Generator
+        Source of the noise.
+    noise: float, optional
+        Standard deviation of the Gaussian noise, in 12-bit intensity.
+        Default is 20.
+
+    Returns
+    -------
+    frame: np.ndarray
+        np.uint16 frame with 12-bit intensities (0 to 4095).
+    """
+
+    (height, width) = shape
+    rows = np.arange(0, height)[:, np.newaxis]
+    cols = np.arange(0, width)[np.newaxis, :]
+    center = geometry["center"]
+    nozzle_diameter = geometry["nozzle_diameter"]
+    tip = geometry["nozzle_tip"]
+    substrate = geometry["substrate"]
+
+    # Backlight falling off slightly toward the edges.
+    radius = ((rows - height / 2)**2 + (cols - width / 2)**2) / ((height / 2)**2 + (width / 2)**2)
+    frame = BRIGHT_LEVEL * (1 - 0.1 * radius)
+
+    # Half width of the dark shapes in each row.
+    half_width = np.zeros((height, 1))
+    half_width[:tip + 1] = nozzle_diameter / 2
+    half_width[substrate:] = width
+    if diameter is not None:
+        # Liquid bridge from the nozzle to the drop spreading on the
+        # substrate, narrowest halfway between them.
+        bridge = np.arange(tip + 1, substrate)
+        position = 2 * (bridge - tip) / (substrate - tip) - 1
+        bridge_width = diameter + (nozzle_diameter - diameter) * position**4
+        if diameter == 0:
+            # The filament has pinched off, leaving a gap around the neck.
+            bridge_width[np.abs(position) < 0.2] = 0
+        half_width[tip + 1:substrate, 0] = bridge_width / 2
+    shadow = np.abs(cols + 0.5 - center) < half_width
+    frame = np.where(shadow, DARK_LEVEL, frame)
+
+    frame = frame + rng.normal(0, noise, shape)
+    return np.uint16(np.clip(np.round(frame), 0, 4095))
+
+def dos_video(shape: typing.Tuple[int, int] = (1024, 512), frame_count: int = 400, background_count: int = 20,
+              noise: float = 20, seed: int = 0, **thinning) -> typing.Tuple[np.ndarray, np.ndarray, dict]:
+    """
+    Synthesizes a dripping-onto-substrate video and its background video.
+
+    Each frame shows a nozzle at the top and a substrate at the bottom,
+    joined by a liquid bridge that thins (see dos_diameters) and pinches off,
+    backlit with 12-bit intensities and Gaussian noise. The background video
+    shows the same nozzle and substrate without liquid.
+
+    Parameters
+    ----------
+    shape: tuple of two ints, optional
+        Shape (rows, columns) of each frame.
+        Default is (1024, 512), the shape of the test_sequence fixture.
+    frame_count: int, optional
+        Number of frames of the experimental video.
+        Default is 400.
+    background_count: int, optional
+        Number of frames of the background video.
+        Default is 20.
+    noise: float, optional
+        Standard deviation of the noise, in 12-bit intensity.
+        Default is 20.
+    seed: int, optional
+        Seed of the noise, so the same videos are made each time.
+        Default is 0.
+    **thinning:
+        ec_start, breakup, and ec_ratio, passed to dos_diameters.
+
+    Returns
+    -------
+    video: np.ndarray
+        np.uint16 frames of the experimental video, (frames, rows, columns).
+    background: np.ndarray
+        np.uint16 frames of the background video.
+    truth: dict
+        The geometry (see dos_geometry), the neck diameter of each frame in
+        pixels ("diameters"), the relaxation time in frames
+        ("relaxation_frames"), and the first frame after pinch-off
+        ("breakup_frame").
+    """
+
+    rng = np.random.default_rng(seed)
+    geometry = dos_geometry(shape)
+    diameters, relaxation_frames = dos_diameters(frame_count, geometry["nozzle_diameter"], **thinning)
+    video = np.stack([dos_frame(shape, geometry, diameter, rng, noise) for diameter in diameters])
+    background = np.stack([dos_frame(shape, geometry, None, rng, noise) for i in range(0, background_count)])
+    truth = dict(geometry)
+    truth["diameters"] = diameters
+    truth["relaxation_frames"] = relaxation_frames
+    truth["breakup_frame"] = int(np.argmax(diameters == 0)) if np.any(diameters == 0) else frame_count
+    return video, background, truth
+
+def write_dos_videos(videos_folder: typing.Union[str, bytes, os.PathLike], fname: str, video: np.ndarray,
+                     background: np.ndarray, timecode: str = "_0000_0000") -> typing.Tuple[str, str]:
+    """
+    Saves an experimental and background video as folders of TIFFs, named
+    like the test_sequence fixture.
+
+    The videos are saved in videos_folder as fname + timecode and fname +
+    "_bg" + timecode, with one TIFF per frame named by the folder name and
+    the frame number, so they are matched with the fname_format
+    "sampleinfo_fps_substrate_run_vtype_remove_remove" and experiment_tag
+    "".
+
+    Parameters
+    ----------
+    videos_folder: path-like
+        Folder in which to save the video folders.
+    fname: str
+        Name of the videos, e.g. "6.7M-PAM-20pass-0.021wtpct_fps-25k_Al_1".
+    video: np.ndarray
+        Frames of the experimental video, from dos_video.
+    background: np.ndarray
+        Frames of the background video, from dos_video.
+    timecode: str, optional
+        End of the folder names, removed when matching videos.
+        Default is "_0000_0000".
+
+    Returns
+    -------
+    experimental_video_folder: str
+        Path to the folder of the experimental video.
+    background_video_folder: str
+        Path to the folder of the background video.
+    """
+
+    folders = []
+    for name, frames in [(fname + timecode, video), (fname + "_bg" + timecode, background)]:
+        video_folder = os.path.join(videos_folder, name)
+        os.makedirs(video_folder, exist_ok=True)
+        for i in range(0, len(frames)):
+            tifffile.imwrite(os.path.join(video_folder, name + f"{i+1:06}.tif"), frames[i])
+        folders.append(video_folder)
+    return folders[0], folders[1]
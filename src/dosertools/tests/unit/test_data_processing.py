@@ -4,9 +4,11 @@ import pytest
 import numpy as np
 from datetime import datetime
 import os
+import sys
 import time
 import json
 import fnmatch
+import shutil
 import skimage.io
 import multiprocessing
 
@@ -15,10 +17,22 @@ from dosertools.data_processing import csv as dpcsv
 from dosertools.data_processing import fitting as fitting
 from dosertools.data_processing import extension as extension
 from dosertools.data_processing import integration as integration
+from dosertools.data_processing import executor as executor
+from dosertools.data_processing import profiling as profiling
 
 from dosertools.file_handling import folder as folder
 from dosertools.file_handling import tags as tags
 
+def imported_modules(modules):
+    # Runs in a worker process; must be at module level to be sent there.
+    return [module in sys.modules for module in modules]
+
+def timed_sleep(seconds):
+    # Runs in a worker process; times sleeping as a "sleep" event.
+    with profiling.timer("sleep"):
+        time.sleep(seconds)
+    return seconds
+
 @pytest.fixture
 def fixtures_fitting(fixtures_folder):
     return os.path.join(fixtures_folder,"fixtures_fitting")
@@ -361,6 +375,9 @@ class TestGenerateDF:
     test_correct_values:
         Checks if generate_df returns correct values based on previously
         validated results.
+    test_uses_processed_dfs:
+        Checks if generate_df uses dataframes in processed_dfs instead of
+        processing their csvs again.
     """
 
     # Sets up sample data.
@@ -436,6 +453,27 @@ class TestGenerateDF:
         with pytest.raises(FileNotFoundError,match="No CSVs"):
             dpcsv.generate_df(tmp_path,self.fname_format,self.sampleinfo_format)
 
+    def test_uses_processed_dfs(self,tmp_path):
+        # Fails if generate_df processes a csv found in processed_dfs again,
+        # or does not match processing every csv.
+
+        # Constructs sample files.
+        for i in range(0,2):
+            csv_name = self.fname_base + "_" + str(i) + ".csv"
+            path = tmp_path / csv_name
+            self.dataset.to_csv(path,index=False)
+
+        csv = os.path.abspath(tmp_path / (self.fname_base + "_0.csv"))
+        processed_dfs = {csv : dpcsv.process_csv(csv,self.fname_format,self.sampleinfo_format)}
+        results = dpcsv.generate_df(tmp_path,self.fname_format,self.sampleinfo_format,{},processed_dfs)
+        correct = dpcsv.generate_df(tmp_path,self.fname_format,self.sampleinfo_format)
+        pandas.testing.assert_frame_equal(results, correct)
+
+        # Replaces the processed dataframe with a marker.
+        processed_dfs[csv] = processed_dfs[csv].assign(run="marker")
+        results = dpcsv.generate_df(tmp_path,self.fname_format,self.sampleinfo_format,{},processed_dfs)
+        assert "marker" in list(results["run"])
+
 
 class TestTruncateData:
     """
@@ -979,6 +1017,455 @@ class TestSetDefaults:
         settings = integration.set_defaults(optional_settings)
         assert settings["fname_split"] == "_"
 
+class TestVideoProcessCount:
+    """
+    Tests video_process_count.
+
+    Tests
+    -----
+    test_divides_cpu_count:
+        Checks if the number of processes is cpu_count divided by
+        frame_threads, and at least 1.
+    """
+
+    def test_divides_cpu_count(self):
+        # Fails if the number of processes does not keep the total number of
+        # workers within cpu_count.
+        assert integration.video_process_count({"cpu_count" : 32}) == 32
+        assert integration.video_process_count({"cpu_count" : 32, "frame_threads" : 4}) == 8
+        assert integration.video_process_count({"cpu_count" : 32, "frame_threads" : 5}) == 6
+        assert integration.video_process_count({"cpu_count" : 2, "frame_threads" : 8}) == 1
+
+class TestPipelinePool:
+    """
+    Tests pipeline_pool and pool_starmap.
+
+    Tests
+    -----
+    test_workers_warmed:
+        Checks if each worker has imported the modules in WARM_MODULES.
+    test_shut_down_after_block:
+        Checks if the pool no longer accepts work after the with block.
+    test_terminated_on_error:
+        Checks if an error in the with block is raised and the pool is shut
+        down.
+    test_pool_starmap_without_pool:
+        Checks if pool_starmap returns results in order when no pool is
+        given.
+    test_reused_between_stages:
+        Checks if videos_to_binaries runs in a given pool and leaves it
+        running for later stages.
+    """
+
+    def test_workers_warmed(self):
+        # Fails if a worker has not imported the modules in WARM_MODULES.
+        with integration.pipeline_pool({"cpu_count" : 1}) as pool:
+            imported = pool.apply(imported_modules, (integration.WARM_MODULES,))
+        assert all(imported)
+
+    def test_shut_down_after_block(self):
+        # Fails if the pool still accepts work after the with block.
+        with integration.pipeline_pool({"cpu_count" : 1}) as pool:
+            assert pool.apply(abs, (-1,)) == 1
+        with pytest.raises(ValueError):
+            pool.apply(abs, (-1,))
+
+    def test_terminated_on_error(self):
+        # Fails if the error is not raised or the pool still accepts work.
+        with pytest.raises(RuntimeError, match="stage failed"):
+            with integration.pipeline_pool({"cpu_count" : 1}) as pool:
+                raise RuntimeError("stage failed")
+        with pytest.raises(ValueError):
+            pool.apply(abs, (-1,))
+
+    def test_pool_starmap_without_pool(self):
+        # Fails if the results are missing or out of order.
+        results = integration.pool_starmap(pow, [(2, 1), (2, 2), (2, 3)], None, {"cpu_count" : 1})
+        assert results == [2, 4, 8]
+
+    def test_reused_between_stages(self,tmp_path,videos_folder,fname,image_count,long_fname_format):
+        # Fails if videos_to_binaries does not save binary images in the
+        # given pool or shuts the pool down.
+        images_folder = tmp_path / "images"
+        os.mkdir(images_folder)
+        optional_settings = {"experiment_tag" : '', "cpu_count" : 1}
+        with integration.pipeline_pool(optional_settings) as pool:
+            integration.videos_to_binaries(videos_folder, images_folder, long_fname_format, optional_settings, pool)
+            assert pool.apply(abs, (-1,)) == 1
+        for i in range(0,image_count):
+            assert os.path.exists(os.path.join(images_folder, fname, "bin", f"{i:03}." + "png"))
+
+class TestMakePool:
+    """
+    Tests make_pool, SerialPool, and FuturesPool.
+
+    Tests
+    -----
+    test_starmap:
+        Checks if every kind of pool returns starmap results in order.
+    test_apply_async_callbacks:
+        Checks if apply_async calls callback with the result, or
+        error_callback with the error, for every kind of pool.
+    test_initializer:
+        Checks if a serial pool calls its initializer when created.
+    test_unknown_executor:
+        Checks if make_pool raises a ValueError for an unknown executor.
+    test_loky_not_installed:
+        Checks if make_pool raises an ImportError for "loky" when loky is
+        not installed.
+    """
+
+    # Executors that can run here.
+    available = [name for name in executor.EXECUTORS
+                 if name in multiprocessing.get_all_start_methods() + ["process", "thread", "serial"]
+                 or (name == "loky" and executor.loky is not None)]
+
+    @pytest.mark.parametrize("name", available)
+    def test_starmap(self, name):
+        # Fails if the results are missing or out of order.
+        pool = executor.make_pool(name, 2)
+        assert pool.starmap(pow, [(2, 1), (2, 2), (2, 3)]) == [2, 4, 8]
+        pool.close()
+        pool.join()
+
+    @pytest.mark.parametrize("name", available)
+    def test_apply_async_callbacks(self, name):
+        # Fails if the result or error is not passed to the right callback.
+        pool = executor.make_pool(name, 2)
+        results = []
+        errors = []
+        pool.apply_async(pow, (2, 3), callback=results.append, error_callback=errors.append)
+        pool.apply_async(int, ("not a number",), callback=results.append, error_callback=errors.append)
+        pool.close()
+        pool.join()
+        assert results == [8]
+        assert len(errors) == 1 and isinstance(errors[0], ValueError)
+
+    def test_initializer(self):
+        # Fails if the initializer is not called.
+        called = []
+        executor.make_pool("serial", 1, lambda: called.append(True))
+        assert called == [True]
+
+    def test_unknown_executor(self):
+        # Fails if no ValueError is raised.
+        with pytest.raises(ValueError):
+            executor.make_pool("cluster", 1)
+
+    @pytest.mark.skipif(executor.loky is not None, reason="loky is installed")
+    def test_loky_not_installed(self):
+        # Fails if no ImportError is raised.
+        with pytest.raises(ImportError):
+            executor.make_pool("loky", 1)
+
+class TestProfiling:
+    """
+    Tests timer, frame_phases, lap, summarize_events, chrome_trace,
+    save_report, and collecting events from workers with pool_starmap.
+
+    Tests
+    -----
+    test_nested_timers:
+        Checks if timers record their path of enclosing timer names and
+        their args.
+    test_disabled:
+        Checks if nothing is recorded when timers are not enabled.
+    test_frame_phases:
+        Checks if laps are summed into phase events laid out one after
+        another inside the frame_phases event, and if lap does nothing
+        outside frame_phases.
+    test_summarize_events:
+        Checks if events with the same path are totaled, and time is totaled
+        for each fname.
+    test_save_report:
+        Checks if save_report saves the report and a Chrome trace of every
+        event, and clears the events.
+    test_events_from_workers:
+        Checks if events timed in worker processes are collected by
+        pool_starmap, nested in the timers running when it was called.
+    """
+
+    def test_nested_timers(self):
+        # Fails if a path or args are wrong.
+        profiling.drain_events()
+        with profiling.timer("stage"):
+            with profiling.timer("video", fname="a"):
+                pass
+        events = profiling.drain_events()
+        assert [event["path"] for event in events] == [["stage", "video"], ["stage"]]
+        assert events[0]["args"] == {"fname" : "a"}
+        assert events[1]["duration"] >= events[0]["duration"]
+
+    def test_disabled(self):
+        # Fails if any event is recorded.
+        profiling.drain_events()
+        with profiling.timer("stage", False):
+            with profiling.frame_phases("frames", False):
+                profiling.lap("decode")
+        assert profiling.drain_events() == []
+
+    def test_frame_phases(self):
+        # Fails if the phases are not summed or not laid out in order inside
+        # the frames event.
+        profiling.drain_events()
+        profiling.lap("outside")
+        with profiling.frame_phases("frames", start=0, stop=3):
+            for i in range(0,3):
+                time.sleep(0.001)
+                profiling.lap("decode")
+                profiling.lap("threshold")
+        events = {event["name"] : event for event in profiling.drain_events()}
+        assert sorted(events.keys()) == ["decode", "frames", "threshold"]
+        assert events["decode"]["path"] == ["frames", "decode"]
+        assert events["decode"]["args"] == {"laps" : 3}
+        assert events["decode"]["duration"] >= 0.003
+        assert events["decode"]["start"] == events["frames"]["start"]
+        assert events["threshold"]["start"] == events["decode"]["start"] + events["decode"]["duration"]
+        assert events["frames"]["args"] == {"start" : 0, "stop" : 3}
+
+    def test_summarize_events(self):
+        # Fails if the totals are wrong.
+        events = [{"name" : "bin", "path" : ["bin"], "start" : 0, "duration" : 1, "pid" : 1, "tid" : 1,
+                   "args" : {"fname" : "a"}},
+                  {"name" : "bin", "path" : ["bin"], "start" : 1, "duration" : 3, "pid" : 2, "tid" : 1,
+                   "args" : {"fname" : "b"}},
+                  {"name" : "decode", "path" : ["bin", "frames", "decode"], "start" : 0, "duration" : 0.5,
+                   "pid" : 1, "tid" : 1, "args" : {"laps" : 10}}]
+        report = profiling.summarize_events(events)
+        assert report["wall_seconds"] == 4
+        assert report["processes"] == 2
+        assert list(report["stages"].keys()) == ["bin", "bin/frames/decode"]
+        assert report["stages"]["bin"] == {"count" : 2, "total_seconds" : 4, "max_seconds" : 3, "mean_seconds" : 2}
+        assert report["stages"]["bin/frames/decode"]["laps"] == 10
+        assert report["videos"] == {"a" : 1, "b" : 3}
+
+    def test_save_report(self,tmp_path):
+        # Fails if either file is missing or wrong, or events are left.
+        profiling.drain_events()
+        with profiling.timer("stage"):
+            pass
+        profiling.save_report(tmp_path, "test", True)
+        with open(tmp_path / "test_profile.json") as f:
+            report = json.load(f)
+        with open(tmp_path / "test_trace.json") as f:
+            trace = json.load(f)
+        assert list(report["stages"].keys()) == ["stage"]
+        assert [(event["name"], event["ph"], event["ts"]) for event in trace["traceEvents"]] == [("stage", "X", 0)]
+        assert profiling.drain_events() == []
+
+    def test_events_from_workers(self):
+        # Fails if the events of the workers' tasks are missing or not
+        # nested in the calling timer.
+        profiling.drain_events()
+        with profiling.timer("stage"):
+            results = integration.pool_starmap(timed_sleep, [(0.01,), (0.02,)], None,
+                                               {"cpu_count" : 2, "profile" : True})
+        assert results == [0.01, 0.02]
+        events = profiling.drain_events()
+        paths = sorted("/".join(event["path"]) for event in events)
+        assert paths == ["stage", "stage/timed_sleep", "stage/timed_sleep", "stage/timed_sleep/sleep",
+                         "stage/timed_sleep/sleep"]
+        assert len(set(event["pid"] for event in events)) > 1
+
+class TestStreamVideosToCSVs:
+    """
+    Tests stream_videos_to_csvs.
+
+    Tests
+    -----
+    test_saves_csvs:
+        Checks if stream_videos_to_csvs saves binary images and a csv for
+        each video.
+    test_process_csvs:
+        Checks if stream_videos_to_csvs returns each csv processed by
+        process_csv when process_csvs is True.
+    test_fused:
+        Checks if stream_videos_to_csvs saves csvs without binary images
+        when fused is True.
+    test_error_in_worker:
+        Checks if an error in a worker is raised.
+    test_task_frames:
+        Checks if splitting videos into ranges of task_frames frames saves
+        the same csvs and processed dataframes as sending whole videos, with
+        and without fused.
+    test_executors:
+        Checks if every executor saves the same csv as the default process
+        pool, with videos split into ranges of frames.
+    test_profile:
+        Checks if videos_to_csvs saves a report of the time spent in each
+        stage and frame phase when profile is True.
+    test_max_memory:
+        Checks if every task still runs, one at a time, when max_memory is
+        smaller than any task, and if the observed peak is warned about (but
+        not printed without verbose) when it exceeds max_memory.
+    test_warns_task_frames_unsupported:
+        Checks if schedule_video_steps warns, naming the conflicting
+        settings, when task_frames is above 0 but ranges of frames cannot be
+        converted.
+    """
+
+    def test_saves_csvs(self,tmp_path,videos_folder,fname,image_count,long_fname_format,short_fname_format,
+                        sampleinfo_format):
+        # Fails if a binary image or the csv is missing, or if anything is
+        # returned without process_csvs.
+        images_folder = tmp_path / "images"
+        os.mkdir(images_folder)
+        csv_folder = tmp_path / "csv"
+        optional_settings = {"experiment_tag" : '', "cpu_count" : 1}
+        processed_dfs = integration.stream_videos_to_csvs(videos_folder, images_folder, csv_folder, short_fname_format,
+                                                          long_fname_format, sampleinfo_format, optional_settings)
+        for i in range(0,image_count):
+            assert os.path.exists(os.path.join(images_folder, fname, "bin", f"{i:03}." + "png"))
+        assert os.path.exists(os.path.join(csv_folder,fname + ".csv"))
+        assert processed_dfs == {}
+
+    def test_process_csvs(self,tmp_path,videos_folder,fname,long_fname_format,short_fname_format,sampleinfo_format):
+        # Fails if the processed csv is missing or differs from process_csv.
+        images_folder = tmp_path / "images"
+        os.mkdir(images_folder)
+        csv_folder = tmp_path / "csv"
+        optional_settings = {"experiment_tag" : '', "cpu_count" : 1}
+        with integration.pipeline_pool(optional_settings) as pool:
+            processed_dfs = integration.stream_videos_to_csvs(videos_folder, images_folder, csv_folder,
+                                                              short_fname_format, long_fname_format, sampleinfo_format,
+                                                              optional_settings, pool, True)
+        csv = os.path.abspath(os.path.join(csv_folder,fname + ".csv"))
+        assert list(processed_dfs.keys()) == [csv]
+        correct = dpcsv.process_csv(csv, short_fname_format, sampleinfo_format, optional_settings)
+        pandas.testing.assert_frame_equal(processed_dfs[csv], correct)
+
+    def test_fused(self,tmp_path,videos_folder,fname,long_fname_format,short_fname_format,sampleinfo_format):
+        # Fails if the csv is missing or binary images are saved.
+        images_folder = tmp_path / "images"
+        os.mkdir(images_folder)
+        csv_folder = tmp_path / "csv"
+        optional_settings = {"experiment_tag" : '', "cpu_count" : 1, "fused" : True}
+        integration.stream_videos_to_csvs(videos_folder, images_folder, csv_folder, short_fname_format,
+                                          long_fname_format, sampleinfo_format, optional_settings)
+        assert os.path.exists(os.path.join(csv_folder,fname + ".csv"))
+        assert not os.path.exists(os.path.join(images_folder,fname,"bin"))
+
+    def test_error_in_worker(self,tmp_path,videos_folder,long_fname_format,short_fname_format,sampleinfo_format):
+        # Fails if the error from a worker (images_folder does not exist) is
+        # not raised.
+        images_folder = tmp_path / "missing" / "images"
+        csv_folder = tmp_path / "csv"
+        optional_settings = {"experiment_tag" : '', "cpu_count" : 1}
+        with pytest.raises(FileNotFoundError):
+            integration.stream_videos_to_csvs(videos_folder, images_folder, csv_folder, short_fname_format,
+                                              long_fname_format, sampleinfo_format, optional_settings)
+
+    @pytest.mark.parametrize("fused", [False, True])
+    def test_task_frames(self,tmp_path,videos_folder,fname,image_count,long_fname_format,short_fname_format,
+                         sampleinfo_format,fused):
+        # Fails if the csv, binary images, or processed dataframe differ from
+        # those made from whole videos.
+        results = {}
+        for task_frames in [0, 100]:
+            images_folder = tmp_path / ("images" + str(task_frames))
+            os.mkdir(images_folder)
+            csv_folder = tmp_path / ("csv" + str(task_frames))
+            optional_settings = {"experiment_tag" : '', "cpu_count" : 2, "fused" : fused, "task_frames" : task_frames}
+            processed_dfs = integration.stream_videos_to_csvs(videos_folder, images_folder, csv_folder, short_fname_format,
+                                                              long_fname_format, sampleinfo_format, optional_settings,
+                                                              process_csvs=True)
+            csv = os.path.abspath(os.path.join(csv_folder,fname + ".csv"))
+            results[task_frames] = (pd.read_csv(csv), processed_dfs[csv])
+            assert os.path.exists(os.path.join(images_folder, fname, fname + "_params.csv"))
+            assert os.path.exists(os.path.join(images_folder, fname, "bin", f"{image_count-1:03}.png")) != fused
+        pandas.testing.assert_frame_equal(results[0][0], results[100][0])
+        pandas.testing.assert_frame_equal(results[0][1], results[100][1])
+
+    @pytest.mark.parametrize("name", ["serial", "thread", "forkserver"])
+    def test_executors(self,tmp_path,videos_folder,fname,long_fname_format,short_fname_format,sampleinfo_format,name):
+        # Fails if the csv differs from the csv made in a process pool.
+        results = {}
+        for executor_name in ["process", name]:
+            images_folder = tmp_path / ("images" + executor_name)
+            os.mkdir(images_folder)
+            csv_folder = tmp_path / ("csv" + executor_name)
+            optional_settings = {"experiment_tag" : '', "cpu_count" : 2, "task_frames" : 100,
+                                 "executor" : executor_name}
+            integration.stream_videos_to_csvs(videos_folder, images_folder, csv_folder, short_fname_format,
+                                              long_fname_format, sampleinfo_format, optional_settings)
+            results[executor_name] = pd.read_csv(os.path.join(csv_folder,fname + ".csv"))
+        pandas.testing.assert_frame_equal(results["process"], results[name])
+
+    def test_profile(self,tmp_path,videos_folder,fname,image_count,long_fname_format,sampleinfo_format):
+        # Fails if the report or trace is missing, or a stage or frame phase
+        # is missing from the report.
+        images_folder = tmp_path / "images"
+        os.mkdir(images_folder)
+        summary_folder = tmp_path / "summary"
+        os.mkdir(summary_folder)
+        optional_settings = {"experiment_tag" : '', "cpu_count" : 1, "profile" : True, "profile_trace" : True,
+                             "summary_filename" : "test"}
+        integration.videos_to_csvs(videos_folder, images_folder, tmp_path / "csv", summary_folder, long_fname_format,
+                                   sampleinfo_format, optional_settings)
+        assert os.path.exists(summary_folder / "test_DOS_trace.json")
+        with open(summary_folder / "test_DOS_profile.json") as f:
+            report = json.load(f)
+        stages = report["stages"]
+        for stage in ["videos_to_csvs", "videos_to_csvs/stream_videos_to_csvs/bin/background",
+                      "videos_to_csvs/stream_videos_to_csvs/csv/measure", "videos_to_csvs/csvs_to_raw_figure"]:
+            assert stage in stages
+        for phase in ["decode", "rescale", "bg_subtract", "threshold", "write"]:
+            assert stages["videos_to_csvs/stream_videos_to_csvs/bin/frames/" + phase]["laps"] == image_count
+        assert list(report["videos"].keys()) == [fname]
+
+    def test_max_memory(self,tmp_path,videos_folder,fname,image_count,long_fname_format,short_fname_format,
+                        sampleinfo_format,capsys):
+        # Fails if a binary image or the csv is missing, or if the peak is
+        # not warned about, or is printed though verbose is False.
+        images_folder = tmp_path / "images"
+        os.mkdir(images_folder)
+        csv_folder = tmp_path / "csv"
+        optional_settings = {"experiment_tag" : '', "cpu_count" : 2, "task_frames" : 100, "max_memory" : 1}
+        with pytest.warns(UserWarning, match="max_memory"):
+            integration.stream_videos_to_csvs(videos_folder, images_folder, csv_folder, short_fname_format,
+                                              long_fname_format, sampleinfo_format, optional_settings)
+        for i in range(0,image_count):
+            assert os.path.exists(os.path.join(images_folder, fname, "bin", f"{i:03}." + "png"))
+        assert os.path.exists(os.path.join(csv_folder,fname + ".csv"))
+        assert "Peak memory" not in capsys.readouterr().out
+
+    def test_warns_task_frames_unsupported(self,tmp_path):
+        # Fails if no warning names the settings that prevent converting
+        # ranges of frames.
+        optional_settings = {"task_frames" : 100, "bin_format" : "packed", "resume" : True}
+        with pytest.warns(UserWarning, match="task_frames is ignored.*bin_format, resume"):
+            integration.schedule_video_steps([], [], [], tmp_path, tmp_path, optional_settings=optional_settings,
+                                             pool=executor.SerialPool())
+
+class TestReportMemory:
+    """
+    Tests report_memory.
+
+    Tests
+    -----
+    test_prints_if_verbose:
+        Checks if the peaks are printed only if verbose is True.
+    test_warns_over_budget:
+        Checks if peaks over max_memory are warned about whether or not
+        verbose is True.
+    """
+
+    worker_peaks = {1 : 300*2**20, 2 : 200*2**20}
+
+    def test_prints_if_verbose(self, capsys):
+        # Fails if the peaks are not printed with verbose, or are printed
+        # without.
+        integration.report_memory(400*2**20, self.worker_peaks, verbose=True)
+        assert "Peak memory: 400 MB projected" in capsys.readouterr().out
+        integration.report_memory(400*2**20, self.worker_peaks, verbose=False)
+        assert capsys.readouterr().out == ""
+
+    def test_warns_over_budget(self):
+        # Fails if the peaks summed over max_memory are not warned about.
+        for verbose in [True, False]:
+            with pytest.warns(UserWarning, match="500 MB summed"):
+                integration.report_memory(400*2**20, self.worker_peaks, 450*2**20, verbose)
+
 class TestMultiprocessingVideoToBinary:
     """
     Tests
@@ -1177,6 +1664,12 @@ class TestVideosToCSVs:
         correct.
     test_saves_csvs:
         Checks if videos_to_csvs saves csvs and if the test csv is correct.
+    test_fused_saves_csvs:
+        Checks if videos_to_csvs saves csvs without binary images when fused
+        is True.
+    test_saves_csvs_of_unmatched_binaries:
+        Checks if videos_to_csvs saves csvs for binary folders already in
+        images_folder that have no video in videos_folder.
     """
 
 
@@ -1220,6 +1713,39 @@ class TestVideosToCSVs:
         for column in test_data.columns:
             assert pd.Series.eq(round(results[column],4),round(test_data[column],4)).all()
 
+    def test_saves_csvs_of_unmatched_binaries(self,tmp_path,test_sequence,fname,long_fname_format,sampleinfo_format):
+        # Fails if no csv is saved for a binary folder without a video.
+        videos_folder = tmp_path / "videos"
+        os.mkdir(videos_folder)
+        images_folder = tmp_path / "images"
+        unmatched_fname = fname[:-1] + "3"
+        shutil.copytree(os.path.join(test_sequence,fname,"bin"), images_folder / unmatched_fname / "bin")
+        shutil.copy(os.path.join(test_sequence,fname,fname + "_params.csv"),
+                    images_folder / unmatched_fname / (unmatched_fname + "_params.csv"))
+        csv_folder = tmp_path / "csv"
+        summary_folder = tmp_path / "summary"
+        os.mkdir(summary_folder)
+        optional_settings = {"experiment_tag" : '', "cpu_count" : 1}
+        integration.videos_to_csvs(videos_folder, images_folder, csv_folder, summary_folder, long_fname_format,
+                                   sampleinfo_format, optional_settings)
+        assert os.listdir(csv_folder) == [unmatched_fname + ".csv"]
+
+    def test_fused_saves_csvs(self,tmp_path,videos_folder,test_sequence,fname,long_fname_format, sampleinfo_format):
+        # Fails if videos_to_csvs does not save csvs in fused mode or if it
+        # saves binary images when save_bin is False.
+        images_folder = tmp_path / "images"
+        os.mkdir(images_folder)
+        csv_folder = tmp_path / "csv"
+        os.mkdir(csv_folder)
+        summary_folder = tmp_path / "summary"
+        os.mkdir(summary_folder)
+        optional_settings = {"experiment_tag" : '', "fused" : True}
+        integration.videos_to_csvs(videos_folder, images_folder, csv_folder, summary_folder, long_fname_format,
+                                   sampleinfo_format, optional_settings)
+        assert os.path.exists(os.path.join(csv_folder,fname + ".csv"))
+        assert os.path.exists(os.path.join(images_folder,fname,fname + "_params.csv"))
+        assert not os.path.exists(os.path.join(images_folder,fname,"bin"))
+
 class TestCSVsToSummaries:
     """
     """
@@ -1265,6 +1791,47 @@ class TestCSVsToSummaries:
         assert "Summary" in out
         assert "Annotated" in out
 
+class TestMergeShards:
+    """
+    Tests videos_to_summaries with shard_count above 1 and merge_shards.
+
+    Tests
+    -----
+    test_shards_then_merge:
+        Checks if each shard only saves the csvs of its own videos without
+        summaries, and if merge_shards then saves the summaries.
+    test_missing_csv:
+        Checks if merge_shards raises a FileNotFoundError if a video does not
+        have a csv.
+    """
+
+    def test_shards_then_merge(self,tmp_path,videos_folder,fname,long_fname_format,sampleinfo_format):
+        # Fails if a shard saves another shard's csv or any summary, or if
+        # merge_shards does not save the summary.
+        images_folder = tmp_path / "images"
+        os.mkdir(images_folder)
+        csv_folder = tmp_path / "csv"
+        summary_folder = tmp_path / "summary"
+        for shard_index in [1, 0]:
+            # The one video is in shard 0.
+            optional_settings = {"experiment_tag" : '', "cpu_count" : 1, "shard_index" : shard_index,
+                                 "shard_count" : 2}
+            integration.videos_to_summaries(videos_folder, images_folder, csv_folder, summary_folder,
+                                            long_fname_format, sampleinfo_format, optional_settings)
+            assert os.path.exists(os.path.join(csv_folder,fname + ".csv")) == (shard_index == 0)
+            assert not os.path.exists(summary_folder)
+        integration.merge_shards(videos_folder, csv_folder, summary_folder, long_fname_format, sampleinfo_format,
+                                 {"experiment_tag" : ''})
+        assert any("summary" in filename for filename in os.listdir(summary_folder))
+
+    def test_missing_csv(self,tmp_path,videos_folder,long_fname_format,sampleinfo_format):
+        # Fails if no FileNotFoundError is raised for the empty csv folder.
+        csv_folder = tmp_path / "csv"
+        os.mkdir(csv_folder)
+        with pytest.raises(FileNotFoundError):
+            integration.merge_shards(videos_folder, csv_folder, tmp_path / "summary", long_fname_format,
+                                     sampleinfo_format, {"experiment_tag" : ''})
+
 def test_multiprocessing_faster_than_1_core():
     """
     Fails if multiprocessing is not correctly sharing tasks.
@@ -3,6 +3,7 @@ import pytest
 
 from dosertools.file_handling import folder as folder
 from dosertools.file_handling import tags as tags
+from dosertools.file_handling import cache as cache
 
 # Creates sample data for folder names and filenames.
 
@@ -494,6 +495,12 @@ class TestMakeDestinationFolders:
         Checks if make_destination_folders makes a folder for the crop files.
     test_make_bgsub_folder:
         Checks if make_destination_folders makes a folder for the bg_sub files.
+    test_skips_bin_folder_if_fused:
+        Checks if make_destination_folders skips the binary folder if fused
+        is True and save_bin is False.
+    test_make_bin_folder_if_fused_save_bin:
+        Checks if make_destination_folders makes the binary folder if fused
+        and save_bin are True.
     test_warn_if_bin_exists:
         Checks if make_destination_folders warns if binary folder exists.
     test_warn_if_crop_exists:
@@ -540,6 +547,24 @@ class TestMakeDestinationFolders:
         assert os.path.isdir(destination)
         assert not bg_sub_exists
 
+    def test_skips_bin_folder_if_fused(self,tmp_path):
+        # Fails if makes a binary folder when fused is True and save_bin is
+        # False or if the bin_exists return is not True.
+        optional_settings = {"fused" : True}
+        [bin_exists, crop_exists, bg_sub_exists] = folder.make_destination_folders(tmp_path,optional_settings)
+        destination = tmp_path / "bin"
+        assert not os.path.isdir(destination)
+        assert bin_exists
+
+    def test_make_bin_folder_if_fused_save_bin(self,tmp_path):
+        # Fails if does not make a binary folder when fused and save_bin are
+        # True.
+        optional_settings = {"fused" : True, "save_bin" : True}
+        [bin_exists, crop_exists, bg_sub_exists] = folder.make_destination_folders(tmp_path,optional_settings)
+        destination = tmp_path / "bin"
+        assert os.path.isdir(destination)
+        assert not bin_exists
+
     # def test_warn_if_bin_exists(self,tmp_path):
     #     # Fails if does not warn if binary folder already exists or if the
     #     # first bool (bin_exists) is inaccurately False.
@@ -949,6 +974,14 @@ class TestSelectVideoFolders:
         Checks if select_video_folders correctly does not return folders that
         do not conform to inputted filename formating (i.e. metadata or
         experimental videos with no matching background)
+    test_pairs_mraw_files:
+        Checks if select_video_folders pairs .mraw files instead of folders
+        if image_extension is "mraw", with one background for every
+        experiment.
+    test_pairs_one_bg_per_group_mraw_files:
+        Checks if select_video_folders pairs .mraw files instead of folders
+        if image_extension is "mraw", with one background for each group of
+        experiments only differing by run number.
     """
 
     fname_format = "date_sampleinfo_fps_run_vtype"
@@ -1153,3 +1186,312 @@ class TestSelectVideoFolders:
             index = exp_videos.index(str(ef)) # find location of folder in list
             assert str(bg) == bg_videos[index] # Check background folder paired
             assert fnames_remove_tag[i] == fnames_out[index] # Check filename
+
+    def test_pairs_mraw_files(self,tmp_path,fnames,exp_tag_folders,bg_pair_folders):
+        # Fails if select_video_folders does not return paired background and
+        # experimental .mraw files when they are 1:1.
+
+        # Creates .mraw files for experimental videos and backgrounds, and a
+        # folder that should be ignored.
+        for ef in exp_tag_folders:
+            (tmp_path / (ef + ".mraw")).touch()
+        for bgf in bg_pair_folders:
+            (tmp_path / (bgf + ".mraw")).touch()
+        os.mkdir(tmp_path / exp_tag_folders[0])
+        optional_settings = {"image_extension":"mraw"}
+        fnames_out, exp_videos, bg_videos = folder.select_video_folders(tmp_path,self.fname_format,optional_settings)
+
+        # Checks that the files found match the files inputted.
+        assert len(exp_videos) == len(exp_tag_folders)
+        for i in range(0,len(exp_tag_folders)):
+            ef = tmp_path / (exp_tag_folders[i] + ".mraw")
+            bg = tmp_path / (bg_pair_folders[i] + ".mraw")
+            assert str(ef) in exp_videos # experimental file in output list
+            index = exp_videos.index(str(ef)) # find location of file in list
+            assert str(bg) == bg_videos[index] # Check background file paired
+            assert fnames[i] == fnames_out[index] # Check filename
+
+    def test_pairs_one_bg_per_group_mraw_files(self,tmp_path,fnames,exp_tag_folders,bg_one_folders):
+        # Fails if select_video_folders does not return paired background and
+        # experimental .mraw files when there is 1 background for each series
+        # of experimental videos that only differ by run number.
+
+        # Creates .mraw files for experimental videos and backgrounds.
+        for ef in exp_tag_folders:
+            (tmp_path / (ef + ".mraw")).touch()
+        for bgf in bg_one_folders:
+            (tmp_path / (bgf + ".mraw")).touch()
+        optional_settings = {"image_extension":"mraw", "one_background":True}
+        fnames_out, exp_videos, bg_videos = folder.select_video_folders(tmp_path,self.fname_format,optional_settings)
+
+        # Checks that the files found match the files inputted.
+        for i in range(0,len(exp_tag_folders)):
+            ef = tmp_path / (exp_tag_folders[i] + ".mraw")
+            bg = tmp_path / (bg_one_folders[i] + ".mraw")
+            assert str(ef) in exp_videos # experimental file in output list
+            index = exp_videos.index(str(ef)) # find location of file in list
+            assert str(bg) == bg_videos[index] # Check background file paired
+            assert fnames[i] == fnames_out[index] # Check filename
+
+class TestSelectShard:
+    """
+    Test select_shard.
+
+    Tests
+    -----
+    test_shards_cover_videos_once:
+        Checks if every video is in exactly one of shard_count shards, with
+        its experimental and background videos still paired.
+    test_independent_of_order:
+        Checks if the same shard is selected whatever order the videos are
+        listed in.
+    test_one_shard:
+        Checks if every video is selected by default, sorted by fname.
+    test_invalid_shard:
+        Checks if select_shard raises a ValueError for a shard_index outside
+        0 to shard_count - 1 or a shard_count below 1.
+    """
+
+    fnames = ["video" + str(i) for i in range(0,10)]
+    exp_videos = ["exp" + str(i) for i in range(0,10)]
+    bg_videos = ["bg" + str(i) for i in range(0,10)]
+
+    def test_shards_cover_videos_once(self):
+        # Fails if a video is missing, in two shards, or unpaired.
+        selected = []
+        for shard_index in range(0,3):
+            optional_settings = {"shard_index" : shard_index, "shard_count" : 3}
+            fnames, exp_videos, bg_videos = folder.select_shard(self.fnames, self.exp_videos, self.bg_videos,
+                                                                optional_settings)
+            assert len(fnames) in [3, 4]
+            for fname, exp_video, bg_video in zip(fnames, exp_videos, bg_videos):
+                assert exp_video == "exp" + fname[5:]
+                assert bg_video == "bg" + fname[5:]
+            selected = selected + fnames
+        assert sorted(selected) == sorted(self.fnames)
+
+    def test_independent_of_order(self):
+        # Fails if reversing the lists changes the shard.
+        optional_settings = {"shard_index" : 1, "shard_count" : 4}
+        forward = folder.select_shard(self.fnames, self.exp_videos, self.bg_videos, optional_settings)
+        backward = folder.select_shard(self.fnames[::-1], self.exp_videos[::-1], self.bg_videos[::-1],
+                                       optional_settings)
+        assert forward == backward
+
+    def test_one_shard(self):
+        # Fails if any video is left out or the videos are not sorted.
+        fnames, exp_videos, bg_videos = folder.select_shard(self.fnames[::-1], self.exp_videos[::-1],
+                                                            self.bg_videos[::-1])
+        assert fnames == sorted(self.fnames)
+        assert exp_videos == sorted(self.exp_videos)
+
+    @pytest.mark.parametrize("shard_index,shard_count", [(2,2), (-1,2), (0,0)])
+    def test_invalid_shard(self, shard_index, shard_count):
+        # Fails if no ValueError is raised.
+        optional_settings = {"shard_index" : shard_index, "shard_count" : shard_count}
+        with pytest.raises(ValueError):
+            folder.select_shard(self.fnames, self.exp_videos, self.bg_videos, optional_settings)
+
+class TestStageKey:
+    """
+    Test stage_key
+
+    Tests
+    -----
+    test_same_inputs_same_key:
+        Checks if the key is the same for unchanged videos and settings.
+    test_changes_with_stage_setting:
+        Checks if the key changes when a setting of the stage changes.
+    test_ignores_other_settings:
+        Checks if the key does not change with settings that do not change
+        the stage output.
+    test_changes_with_video_files:
+        Checks if the key changes when a video file changes or is added.
+    test_digest_ignores_mtime:
+        Checks if the key with cache_digest True only changes with file
+        contents.
+    """
+
+    @pytest.fixture
+    def videos(self,tmp_path):
+        # Makes an experimental and background video of two frames each.
+        for video in ["exp", "bg"]:
+            os.mkdir(tmp_path / video)
+            for i in range(0,2):
+                (tmp_path / video / (str(i) + ".tif")).write_bytes(bytes([i]*10))
+        return tmp_path / "exp", tmp_path / "bg"
+
+    def test_same_inputs_same_key(self,videos):
+        # Fails if the key changes without any change to the inputs.
+        assert cache.stage_key("bin", *videos) == cache.stage_key("bin", *videos)
+
+    def test_changes_with_stage_setting(self,videos):
+        # Fails if changing crop_height_coefficient does not change the key.
+        assert cache.stage_key("bin", *videos) != cache.stage_key("bin", *videos, {"crop_height_coefficient" : 3})
+
+    def test_ignores_other_settings(self,videos):
+        # Fails if settings that do not change the binary images change the
+        # key.
+        optional_settings = {"frame_threads" : 4, "verbose" : True, "save_crop" : True, "intermediate_format" : "stack"}
+        assert cache.stage_key("bin", *videos) == cache.stage_key("bin", *videos, optional_settings)
+
+    def test_changes_with_video_files(self,videos):
+        # Fails if changing or adding a frame does not change the key.
+        (experimental_video, background_video) = videos
+        key = cache.stage_key("bin", *videos)
+        (experimental_video / "1.tif").write_bytes(bytes([5]*11))
+        changed_key = cache.stage_key("bin", *videos)
+        assert changed_key != key
+        (background_video / "2.tif").write_bytes(bytes([5]*10))
+        assert cache.stage_key("bin", *videos) != changed_key
+
+    def test_digest_ignores_mtime(self,videos):
+        # Fails if touching a file changes the digest key or changing its
+        # contents does not.
+        (experimental_video, background_video) = videos
+        optional_settings = {"cache_digest" : True}
+        key = cache.stage_key("bin", *videos, optional_settings)
+        os.utime(experimental_video / "0.tif", ns=(0, 0))
+        assert cache.stage_key("bin", *videos, optional_settings) == key
+        (experimental_video / "0.tif").write_bytes(bytes([9]*10))
+        assert cache.stage_key("bin", *videos, optional_settings) != key
+
+class TestManifest:
+    """
+    Test read_manifest, write_manifest, start_stage, finish_stage, and
+    is_cached
+
+    Tests
+    -----
+    test_empty_without_manifest:
+        Checks if read_manifest returns an empty manifest if there is none.
+    test_round_trip:
+        Checks if a written manifest is read back the same.
+    test_finish_then_start:
+        Checks if a finished stage is cached until it is started again.
+    test_none_never_cached:
+        Checks if a key of None is never cached.
+    """
+
+    def test_empty_without_manifest(self,tmp_path):
+        # Fails if a missing manifest is not empty.
+        assert cache.read_manifest(tmp_path / "missing") == {}
+
+    def test_round_trip(self,tmp_path):
+        # Fails if the manifest read differs from the manifest written.
+        manifest = {"bin" : "abc", "csv" : "def"}
+        cache.write_manifest(tmp_path, manifest)
+        assert cache.read_manifest(tmp_path) == manifest
+        assert os.listdir(tmp_path) == [cache.MANIFEST_NAME]
+
+    def test_finish_then_start(self,tmp_path):
+        # Fails if the stage is not cached with only its own key after
+        # finishing, or is still cached after starting again.
+        cache.finish_stage(tmp_path, "bin", "abc")
+        assert cache.is_cached(tmp_path, "bin", "abc")
+        assert not cache.is_cached(tmp_path, "bin", "abd")
+        cache.start_stage(tmp_path, "bin")
+        assert not cache.is_cached(tmp_path, "bin", "abc")
+
+    def test_none_never_cached(self,tmp_path):
+        # Fails if a stage is cached without a key.
+        cache.finish_stage(tmp_path, "csv", None)
+        assert not cache.is_cached(tmp_path, "csv", None)
+        assert cache.derived_key(None, "csv") is None
+
+class TestPrepareImageStages:
+    """
+    Test prepare_image_stages
+
+    Tests
+    -----
+    test_keeps_cached_stage:
+        Checks if a cached stage keeps its images and is marked as existing.
+    test_clears_stale_stage:
+        Checks if a stage that is not cached is emptied, removed from the
+        manifest, and marked to compute.
+    """
+
+    keys = {"bin" : "new_bin", "crop" : "new_crop", "bg_sub" : "new_bg_sub"}
+    optional_settings = {"save_crop" : True}
+
+    @pytest.fixture
+    def images_location(self,tmp_path):
+        # Makes bin and crop folders holding an image each.
+        folders_exist = folder.make_destination_folders(tmp_path, self.optional_settings)
+        for stage in ["bin", "crop"]:
+            (tmp_path / stage / "000.png").touch()
+        return tmp_path
+
+    def test_keeps_cached_stage(self,images_location):
+        # Fails if cached images are removed or recomputed.
+        cache.finish_stage(images_location, "bin", "new_bin")
+        folders_exist, stages_to_compute = cache.prepare_image_stages(images_location, self.keys, [True, True, True], self.optional_settings)
+        assert folders_exist[0]
+        assert "bin" not in stages_to_compute
+        assert os.path.exists(images_location / "bin" / "000.png")
+
+    def test_clears_stale_stage(self,images_location):
+        # Fails if stale images are kept or the stage stays in the manifest.
+        cache.finish_stage(images_location, "crop", "old_crop")
+        folders_exist, stages_to_compute = cache.prepare_image_stages(images_location, self.keys, [True, True, True], self.optional_settings)
+        assert folders_exist == [False, False, True]
+        assert stages_to_compute == ["bin", "crop"]
+        assert os.listdir(images_location / "crop") == []
+        assert "crop" not in cache.read_manifest(images_location)
+
+class TestProgress:
+    """
+    Test record_progress, read_progress, resume_frame, and interrupted
+
+    Tests
+    -----
+    test_round_trip:
+        Checks if recorded progress is read back.
+    test_resume_frame:
+        Checks if resume_frame only continues interrupted progress of the
+        same video length and settings.
+    test_interrupted:
+        Checks if a video is only interrupted if its progress is recorded
+        and not complete.
+    test_cleared_with_stale_stage:
+        Checks if prepare_image_stages removes the progress when it empties
+        a stage folder.
+    """
+
+    def test_round_trip(self,tmp_path):
+        # Fails if the progress read differs from the progress recorded.
+        cache.record_progress(tmp_path, 16, 50)
+        progress = cache.read_progress(tmp_path)
+        assert progress["frames_completed"] == 16
+        assert progress["frames_total"] == 50
+        assert not progress["complete"]
+        cache.complete_progress(tmp_path)
+        assert cache.read_progress(tmp_path)["complete"]
+        assert cache.read_progress(tmp_path)["frames_completed"] == 50
+
+    def test_resume_frame(self,tmp_path):
+        # Fails if the resume frame is not the recorded frame for the same
+        # video and settings, or not 0 otherwise.
+        assert cache.resume_frame(tmp_path, 50) == 0
+        cache.record_progress(tmp_path, 16, 50, {"save_crop" : True})
+        assert cache.resume_frame(tmp_path, 50, {"save_crop" : True}) == 16
+        assert cache.resume_frame(tmp_path, 60, {"save_crop" : True}) == 0
+        assert cache.resume_frame(tmp_path, 50) == 0
+        cache.complete_progress(tmp_path, {"save_crop" : True})
+        assert cache.resume_frame(tmp_path, 50, {"save_crop" : True}) == 0
+
+    def test_interrupted(self,tmp_path):
+        # Fails if interrupted does not match the recorded progress.
+        assert not cache.interrupted(tmp_path)
+        cache.record_progress(tmp_path, 16, 50)
+        assert cache.interrupted(tmp_path)
+        cache.complete_progress(tmp_path)
+        assert not cache.interrupted(tmp_path)
+
+    def test_cleared_with_stale_stage(self,tmp_path):
+        # Fails if the progress is kept after a stage folder is emptied.
+        folders_exist = folder.make_destination_folders(tmp_path)
+        cache.record_progress(tmp_path, 16, 50)
+        cache.prepare_image_stages(tmp_path, {"bin" : "key", "crop" : "key", "bg_sub" : "key"}, folders_exist)
+        assert cache.read_progress(tmp_path) == {}
@@ -2,16 +2,29 @@ import numpy as np
 import os
 import pytest
 import json
+import multiprocessing
+import shutil
+import threading
+import time
 import pandas as pd
 
 import skimage.io
 import skimage.filters
+import tifffile
 from skimage.filters import (threshold_otsu, threshold_li)
 from skimage import exposure
 
 from dosertools.image_processing import tiff_handling as th
 from dosertools.image_processing import binary as binary
+from dosertools.image_processing import reader as reader
+from dosertools.image_processing import mraw as mraw
+from dosertools.image_processing import binary_stack as stack
+from dosertools.image_processing import intermediate as intermediate
+from dosertools.image_processing import async_writer as async_writer
+from dosertools.image_processing import shared_arrays as shared_arrays
+from dosertools.file_handling import cache as cache
 from dosertools.file_handling import folder as folder
+from dosertools.tests import synthetic as synthetic
 
 @pytest.fixture
 def fixtures_binary(fixtures_folder):
@@ -29,6 +42,18 @@ def experimental_video(fname, timecode, videos_folder):
     experimental_video = skimage.io.imread_collection(experimental_video_location, plugin='tifffile')
     return experimental_video
 
+@pytest.fixture
+def short_video_folders(tmp_path, experimental_video, background_video):
+    # Links the first 20 frames of the experimental video and the
+    # background video into new folders.
+    for path in [tmp_path / "exp", tmp_path / "bg"]:
+        os.mkdir(path)
+    for i in range(0, 20):
+        os.symlink(os.path.abspath(experimental_video.files[i]), tmp_path / "exp" / os.path.basename(experimental_video.files[i]))
+    for i in range(0, len(background_video)):
+        os.symlink(os.path.abspath(background_video.files[i]), tmp_path / "bg" / os.path.basename(background_video.files[i]))
+    return tmp_path / "exp", tmp_path / "bg"
+
 @pytest.fixture
 def target_params_dict(fixtures_folder):
     with open(os.path.join(fixtures_folder,"params.json")) as f:
@@ -51,10 +76,60 @@ def bg_median(fixtures_folder):
 def bg_drop_removed(fixtures_folder):
     return np.load(os.path.join(fixtures_folder,"bg_median_drop_removed.npy"))
 
+def write_mraw(mraw_path, frames, bit = 12, header_extension = ".cihx"):
+    # Writes frames as a synthetic Photron .mraw file with a .cihx or .cih
+    # header, packing pixels as the camera does.
+    frames = np.asarray(frames, dtype=np.uint16)
+    frame_count, height, width = np.shape(frames)
+    if bit == 8:
+        data = frames.astype(np.uint8).tobytes()
+    elif bit == 16:
+        data = frames.astype('<u2').tobytes()
+    else:
+        pairs = frames.reshape(-1, 2)
+        packed = np.empty((len(pairs), 3), dtype=np.uint8)
+        packed[:,0] = pairs[:,0] >> 4
+        packed[:,1] = ((pairs[:,0] & 15) << 4) | (pairs[:,1] >> 8)
+        packed[:,2] = pairs[:,1] & 255
+        data = packed.tobytes()
+    with open(mraw_path, "wb") as f:
+        f.write(data)
+
+    base = os.path.splitext(mraw_path)[0]
+    if header_extension == ".cihx":
+        header = ("<cih><recordInfo><recordRate>25000</recordRate></recordInfo>"
+                  "<frameInfo><totalFrame>" + str(frame_count) + "</totalFrame></frameInfo>"
+                  "<imageDataInfo><resolution><width>" + str(width) + "</width>"
+                  "<height>" + str(height) + "</height></resolution>"
+                  "<colorInfo><type>Mono</type><bit>" + str(bit) + "</bit></colorInfo>"
+                  "<effectiveBit><depth>" + str(bit) + "</depth><side>Lower</side></effectiveBit>"
+                  "</imageDataInfo><imageFileInfo><fileFormat>MRaw</fileFormat></imageFileInfo></cih>")
+        # Real .cihx files start with binary data before the XML.
+        with open(base + ".cihx", "wb") as f:
+            f.write(b"\x00\x01\x02" + header.encode())
+    else:
+        header = ("#Camera Information Header\n"
+                  "Record Rate(fps) : 25000\n"
+                  "Total Frame : " + str(frame_count) + "\n"
+                  "Image Width : " + str(width) + "\n"
+                  "Image Height : " + str(height) + "\n"
+                  "Color Type : Mono\n"
+                  "Color Bit : " + str(bit) + "\n"
+                  "File Format : MRaw\n")
+        with open(base + ".cih", "w") as f:
+            f.write(header)
+
 
 
 ## TODO: class for tests for define_image_parameters
 
+def sum_shared_array(handle):
+    # Runs in a worker process; must be at module level to be sent there.
+    with shared_arrays.attached_array(handle) as array:
+        total = int(np.sum(array))
+        del array
+    return total
+
 def test_define_image_parameters(experimental_video,target_params_dict):
     params_dict = th.define_image_parameters(experimental_video)
     assert target_params_dict == params_dict
@@ -175,6 +250,312 @@ class TestProduceBackgroundImage:
         bg_median_test = th.produce_background_image(background_video, target_params_dict)
         assert np.all(bg_median.astype(int) == bg_median_test.astype(int))
 
+    def test_streaming_produces_correct_background(self,target_params_dict,background_video,bg_median):
+        # Fails if the streaming median does not produce the same background.
+        optional_settings = {"streaming_median" : True}
+        bg_median_test = th.produce_background_image(background_video, target_params_dict, optional_settings)
+        assert np.all(bg_median.astype(int) == bg_median_test.astype(int))
+
+class TestStreamingMedian:
+    """
+    Tests streaming_median.
+
+    Tests
+    -----
+    test_matches_median:
+        Checks if streaming_median matches np.median of the cropped frames
+        for odd and even numbers of frames.
+    test_error_if_float:
+        Checks if streaming_median raises a TypeError for non-integer images.
+    test_error_if_over_12_bit:
+        Checks if streaming_median raises a ValueError for values above 4095
+        rather than clipping them.
+    """
+
+    params_dict = {"crop_width_start": 2, "crop_width_end": 9, "crop_bottom": 10, "crop_top": 1}
+
+    def test_matches_median(self):
+        # Fails if streaming_median does not match the median of the cropped
+        # frames.
+        rng = np.random.default_rng(0)
+        for frame_count in [1,2,5,8]:
+            frames = [rng.integers(0,4096,(14,12)).astype(np.uint16) for i in range(0,frame_count)]
+            cropped_frames = [th.crop_single_image(frame, self.params_dict) for frame in frames]
+            assert np.all(th.streaming_median(frames, self.params_dict) == np.median(cropped_frames, axis=0))
+
+    def test_error_if_float(self):
+        # Fails if streaming_median does not raise a TypeError for float
+        # images.
+        frames = [np.zeros((14,12)), np.ones((14,12))]
+        with pytest.raises(TypeError, match="integer"):
+            th.streaming_median(frames, self.params_dict)
+
+    def test_error_if_over_12_bit(self):
+        # Fails if streaming_median does not raise a ValueError for 16-bit
+        # values.
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(5000,60000,(14,12)).astype(np.uint16) for i in range(0,3)]
+        with pytest.raises(ValueError, match="12-bit"):
+            th.streaming_median(frames, self.params_dict)
+
+class TestCropVideo:
+    """
+    Tests crop_video.
+
+    Tests
+    -----
+    test_matches_crop_single_image:
+        Checks if frames of the cropped video match crop_single_image on
+        the full frames.
+    test_crops_arrays:
+        Checks if a list of arrays is cropped the same as by
+        crop_single_image.
+    """
+
+    def test_matches_crop_single_image(self,target_params_dict,experimental_video):
+        # Fails if cropping while reading does not match cropping the full
+        # frame.
+        cropped_video = th.crop_video(experimental_video, target_params_dict)
+        assert len(cropped_video) == len(experimental_video)
+        for image_number in range(0,len(experimental_video),50):
+            cropped_image = th.crop_single_image(experimental_video[image_number], target_params_dict)
+            assert np.array_equal(cropped_video[image_number], cropped_image)
+
+    def test_crops_arrays(self,target_params_dict):
+        # Fails if a video without files is not cropped like
+        # crop_single_image.
+        frames = [np.arange(1024*512).reshape(1024,512) + i for i in range(0,3)]
+        cropped_video = th.crop_video(frames, target_params_dict)
+        assert cropped_video.files is None
+        for frame, cropped_image in zip(frames, cropped_video):
+            assert np.array_equal(cropped_image, th.crop_single_image(frame, target_params_dict))
+
+class TestReadTiffROI:
+    """
+    Tests read_tiff_roi.
+
+    Tests
+    -----
+    test_matches_full_image:
+        Checks if read_tiff_roi matches slicing the full image for a range
+        of slices, including negative, empty, stepped, and out of bounds
+        slices.
+    """
+
+    @pytest.mark.parametrize("row_slice, col_slice",
+                             [(slice(0,5), slice(None)),
+                              (slice(7,33), slice(100,200)),
+                              (slice(1015,2000), slice(3,-4)),
+                              (slice(-20,-3), slice(0,10)),
+                              (slice(5,5), slice(0,3)),
+                              (slice(0,None,2), slice(None))])
+    def test_matches_full_image(self,experimental_video,row_slice,col_slice):
+        # Fails if the region of interest does not match the sliced full
+        # image.
+        path = experimental_video.files[3]
+        image = experimental_video[3]
+        assert np.array_equal(reader.read_tiff_roi(path, row_slice, col_slice), image[row_slice, col_slice])
+
+class TestReadTiffMemmap:
+    """
+    Tests read_tiff_memmap.
+
+    Tests
+    -----
+    test_memmaps_uncompressed:
+        Checks if an uncompressed TIFF is read as a view of a memory map with
+        the correct values.
+    test_reads_compressed:
+        Checks if a compressed TIFF is decoded with the correct values.
+    test_reads_packed:
+        Checks if a 12-bit packed TIFF from the fixtures is decoded the same
+        as by skimage.
+    """
+
+    image = np.arange(40*30, dtype=np.uint16).reshape(40,30)
+
+    def test_memmaps_uncompressed(self, tmp_path):
+        # Fails if the image is not memory-mapped or values are wrong.
+        path = tmp_path / "000.tif"
+        tifffile.imwrite(path, self.image)
+        result = reader.read_tiff_memmap(path)
+        assert isinstance(result.base, np.memmap)
+        assert np.array_equal(result, self.image)
+
+    def test_reads_compressed(self, tmp_path):
+        # Fails if a compressed image is not read correctly.
+        path = tmp_path / "000.tif"
+        tifffile.imwrite(path, self.image, compression="zlib")
+        assert reader.memmap_tiff(path) is None
+        assert np.array_equal(reader.read_tiff_memmap(path), self.image)
+
+    def test_reads_packed(self, experimental_video):
+        # Fails if a 12-bit packed image does not match skimage.
+        path = experimental_video.files[0]
+        assert np.array_equal(reader.read_tiff_memmap(path), experimental_video[0])
+
+class TestReadVideo:
+    """
+    Tests read_video.
+
+    Tests
+    -----
+    test_memmap_matches_skimage:
+        Checks if the memmap reader gives the same frames, in the same order,
+        as the skimage reader.
+    test_memmap_crop:
+        Checks if cropping a memmap video gives views of the same crop as
+        crop_single_image.
+    test_error_if_unknown_reader:
+        Checks if read_video raises a ValueError for an unknown reader.
+    test_reads_mraw:
+        Checks if read_video reads a .mraw recording if image_extension is
+        "mraw".
+    test_reads_other_formats:
+        Checks if read_video reads images of a non-TIFF image_extension.
+    """
+
+    @pytest.fixture
+    def video_folder(self, tmp_path):
+        for i in range(0,12):
+            tifffile.imwrite(tmp_path / (str(i) + ".tif"), np.full((20,16), i, dtype=np.uint16))
+        return tmp_path
+
+    def test_memmap_matches_skimage(self, video_folder):
+        # Fails if the memmap reader frames differ from the skimage reader.
+        video = th.read_video(video_folder)
+        memmap_video = th.read_video(video_folder, {"reader" : "memmap"})
+        assert isinstance(memmap_video, reader.MemmapVideo)
+        assert len(memmap_video) == len(video)
+        for frame, memmap_frame in zip(video, memmap_video):
+            assert np.array_equal(frame, memmap_frame)
+
+    def test_memmap_crop(self, video_folder):
+        # Fails if the cropped frames are not views or differ from
+        # crop_single_image.
+        params_dict = {"crop_width_start": 2, "crop_width_end": 9, "crop_bottom": 10, "crop_top": 1}
+        memmap_video = th.read_video(video_folder, {"reader" : "memmap"})
+        cropped_video = th.crop_video(memmap_video, params_dict)
+        for frame, cropped_image in zip(memmap_video, cropped_video):
+            assert isinstance(cropped_image.base.base, np.memmap)
+            assert np.array_equal(cropped_image, th.crop_single_image(frame, params_dict))
+
+    def test_error_if_unknown_reader(self, video_folder):
+        # Fails if an unknown reader does not raise a ValueError.
+        with pytest.raises(ValueError, match="reader"):
+            th.read_video(video_folder, {"reader" : "unknown"})
+
+    def test_reads_mraw(self, tmp_path):
+        # Fails if a .mraw recording is not read as its frames.
+        frames = np.arange(0, 3*4*6).reshape((3,4,6))
+        write_mraw(tmp_path / "video.mraw", frames)
+        video = th.read_video(tmp_path / "video.mraw", {"image_extension" : "mraw"})
+        assert isinstance(video, mraw.MrawVideo)
+        assert len(video) == len(frames)
+        for frame, video_frame in zip(frames, video):
+            assert np.array_equal(frame, video_frame)
+
+    def test_reads_other_formats(self, tmp_path):
+        # Fails if images of another extension are not read, in order.
+        for i in range(0,3):
+            skimage.io.imsave(tmp_path / (str(i) + ".png"), np.full((20,16), i, dtype=np.uint8), check_contrast=False)
+        video = th.read_video(tmp_path, {"image_extension" : "png"})
+        assert len(video) == 3
+        for i in range(0,3):
+            assert np.array_equal(video[i], np.full((20,16), i, dtype=np.uint8))
+
+class TestReadCih:
+    """
+    Tests read_cih.
+
+    Tests
+    -----
+    test_cihx_matches_cih:
+        Checks if .cihx and .cih headers for the same recording are read into
+        the same values.
+    test_error_if_no_cih_element:
+        Checks if read_cih raises a ValueError for a .cihx file without a
+        <cih> element.
+    """
+
+    def test_cihx_matches_cih(self, tmp_path):
+        # Fails if the two header formats are not read the same.
+        frames = np.zeros((3,4,6))
+        write_mraw(tmp_path / "cihx.mraw", frames, 12, ".cihx")
+        write_mraw(tmp_path / "cih.mraw", frames, 12, ".cih")
+        cihx_header = mraw.read_cih(tmp_path / "cihx.cihx")
+        cih_header = mraw.read_cih(tmp_path / "cih.cih")
+        for key in ["Record Rate(fps)", "Total Frame", "Image Width", "Image Height", "Color Type", "Color Bit", "File Format"]:
+            assert cihx_header[key] == cih_header[key]
+        assert cih_header["Total Frame"] == 3
+        assert cih_header["Image Width"] == 6
+        assert cih_header["Image Height"] == 4
+
+    def test_error_if_no_cih_element(self, tmp_path):
+        # Fails if a .cihx without a <cih> element does not raise a
+        # ValueError.
+        (tmp_path / "empty.cihx").write_text("<other></other>")
+        with pytest.raises(ValueError, match="cih"):
+            mraw.read_cih(tmp_path / "empty.cihx")
+
+class TestReadMraw:
+    """
+    Tests read_mraw.
+
+    Tests
+    -----
+    test_reads_frames:
+        Checks if frames of 8, 12, and 16-bit recordings (including an odd
+        width for 12-bit) match the frames written, with .cihx or .cih
+        headers.
+    test_read_roi:
+        Checks if read_roi matches slicing the full frame.
+    test_error_if_no_header:
+        Checks if read_mraw raises a FileNotFoundError without a header.
+    test_error_if_too_short:
+        Checks if read_mraw raises a ValueError if the .mraw file has fewer
+        frames than the header.
+    """
+
+    @pytest.fixture
+    def frames(self):
+        rng = np.random.default_rng(0)
+        return rng.integers(0, 4096, (5, 8, 6)).astype(np.uint16)
+
+    @pytest.mark.parametrize("bit, header_extension, width",
+                             [(8, ".cihx", 6), (12, ".cihx", 6), (12, ".cih", 6),
+                              (12, ".cihx", 5), (16, ".cih", 6)])
+    def test_reads_frames(self, tmp_path, frames, bit, header_extension, width):
+        # Fails if the frames read do not match the frames written.
+        frames = frames[:, :, :width].astype(np.int64) % (2**bit)
+        write_mraw(tmp_path / "video.mraw", frames, bit, header_extension)
+        video = mraw.read_mraw(tmp_path / "video.mraw")
+        assert len(video) == len(frames)
+        for frame, video_frame in zip(frames, video):
+            assert np.array_equal(frame, video_frame)
+
+    def test_read_roi(self, tmp_path, frames):
+        # Fails if the region of interest does not match the sliced frame.
+        write_mraw(tmp_path / "video.mraw", frames)
+        video = mraw.read_mraw(tmp_path / "video.mraw")
+        for row_slice, col_slice in [(slice(1,5), slice(2,4)), (slice(None), slice(0,-1)), (slice(3,3), slice(None))]:
+            assert np.array_equal(video.read_roi(2, row_slice, col_slice), frames[2][row_slice, col_slice])
+
+    def test_error_if_no_header(self, tmp_path, frames):
+        # Fails if a missing header does not raise a FileNotFoundError.
+        write_mraw(tmp_path / "video.mraw", frames)
+        os.remove(tmp_path / "video.cihx")
+        with pytest.raises(FileNotFoundError):
+            mraw.read_mraw(tmp_path / "video.mraw")
+
+    def test_error_if_too_short(self, tmp_path, frames):
+        # Fails if a truncated .mraw does not raise a ValueError.
+        write_mraw(tmp_path / "video.mraw", frames)
+        with open(tmp_path / "video.mraw", "r+b") as f:
+            f.truncate(10)
+        with pytest.raises(ValueError, match="too short"):
+            mraw.read_mraw(tmp_path / "video.mraw")
+
 class TestRemoveBGDrop:
     """
     Tests remove_bg_drop
@@ -187,6 +568,8 @@ class TestRemoveBGDrop:
     test_returns_bg_with_drop_removed:
         Checks if remove_bg_drop returns the bg_median given with the
         background drop removed
+    test_does_not_modify_bg_median:
+        Checks if remove_bg_drop leaves the bg_median given unchanged
     """
     @pytest.mark.filterwarnings("ignore::DeprecationWarning")
     def test_returns_correct_shape_array(self,bg_median):
@@ -203,6 +586,13 @@ class TestRemoveBGDrop:
         bg_median_drop_removed = th.remove_bg_drop(bg_median)
         assert np.all(bg_median_drop_removed.astype(int) == bg_drop_removed.astype(int))
 
+    @pytest.mark.filterwarnings("ignore::DeprecationWarning")
+    def test_does_not_modify_bg_median(self,bg_median):
+        # Fails if remove_bg_drop modifies the bg_median it was given
+        original_bg_median = bg_median.copy()
+        th.remove_bg_drop(bg_median)
+        assert np.all(original_bg_median == bg_median)
+
 class TestBGDropTopEdge:
     """
     Tests bg_drop_top_edge
@@ -228,6 +618,30 @@ class TestBGDropTopEdge:
 
 class TestConvertTiffSequenceToBinary:
     """
+    Tests convert_tiff_sequence_to_binary.
+
+    Tests
+    -----
+    test_convert_tiff_sequence_to_binary:
+        Checks if the binary images match the binary images in the fixtures.
+    test_saves_intermediate_stacks:
+        Checks if intermediate_format "stack" saves the same cropped and
+        background-subtracted images as one TIFF per frame.
+    test_frame_threads_match_serial:
+        Checks if converting frames on several threads saves the same images
+        and stacks as converting them one at a time.
+    test_async_write_matches:
+        Checks if saving images on background threads saves the same images
+        as saving them directly, by the time the function returns.
+    test_resume:
+        Checks if resume only converts the frames after the recorded
+        progress, and saves the same images as a full run.
+    test_records_progress:
+        Checks if the progress through the video is recorded once every
+        frame is saved.
+    test_error_removes_stacks:
+        Checks if an error partway through leaves no stacks or temporary
+        files and stops the image writer's threads.
     """
     # TODO: docstring, comments
 
@@ -244,6 +658,372 @@ class TestConvertTiffSequenceToBinary:
         for i in range(0,len(target_converted_sequence)):
             assert (np.all(target_converted_sequence[i] == produced_converted_sequence[i]))
 
+    def test_saves_intermediate_stacks(self, tmp_path, experimental_video, target_params_dict, bg_median):
+        # Fails if intermediate stacks do not hold the same images as the
+        # intermediate images saved one per frame.
+        frames = [experimental_video[i] for i in range(0,12)]
+        for intermediate_format in ["tiff", "stack"]:
+            save_location = tmp_path / intermediate_format
+            os.mkdir(save_location)
+            optional_settings = {"save_crop" : True, "save_bg_sub" : True, "intermediate_format" : intermediate_format, "intermediate_compression" : "zlib"}
+            folders_exist = folder.make_destination_folders(save_location, optional_settings)
+            th.convert_tiff_sequence_to_binary(frames, bg_median, target_params_dict, save_location, folders_exist, optional_settings)
+        for stage in ["crop", "bg_sub"]:
+            assert os.listdir(tmp_path / "stack" / stage) == [stage + ".tif"]
+            images = tifffile.imread(tmp_path / "stack" / stage / (stage + ".tif"))
+            target = skimage.io.imread_collection(str(tmp_path / "tiff" / stage / "*"))
+            assert len(images) == len(target)
+            for i in range(0,len(target)):
+                assert np.array_equal(images[i], target[i])
+
+    def test_frame_threads_match_serial(self, tmp_path, experimental_video, target_params_dict, bg_median):
+        # Fails if the images saved using frame threads differ from the images
+        # saved without, or are out of order in the stacks.
+        frames = [experimental_video[i] for i in range(0,50)]
+        for frame_threads in [1, 3]:
+            save_location = tmp_path / str(frame_threads)
+            os.mkdir(save_location)
+            optional_settings = {"save_crop" : True, "intermediate_format" : "stack", "frame_threads" : frame_threads}
+            folders_exist = folder.make_destination_folders(save_location, optional_settings)
+            th.convert_tiff_sequence_to_binary(frames, bg_median, target_params_dict, save_location, folders_exist, optional_settings)
+        target_bin = skimage.io.imread_collection(str(tmp_path / "1" / "bin" / "*"))
+        results_bin = skimage.io.imread_collection(str(tmp_path / "3" / "bin" / "*"))
+        assert len(results_bin) == len(target_bin) == len(frames)
+        for i in range(0,len(target_bin)):
+            assert np.array_equal(results_bin[i], target_bin[i])
+        target_crop = tifffile.imread(tmp_path / "1" / "crop" / "crop.tif")
+        results_crop = tifffile.imread(tmp_path / "3" / "crop" / "crop.tif")
+        assert np.array_equal(results_crop, target_crop)
+
+    def test_async_write_matches(self, tmp_path, experimental_video, target_params_dict, bg_median):
+        # Fails if any image saved on background threads differs or is
+        # missing once convert_tiff_sequence_to_binary returns.
+        frames = [experimental_video[i] for i in range(0,30)]
+        for async_write in [False, True]:
+            save_location = tmp_path / str(async_write)
+            os.mkdir(save_location)
+            optional_settings = {"save_bg_sub" : True, "async_write" : async_write, "frame_threads" : 2}
+            folders_exist = folder.make_destination_folders(save_location, optional_settings)
+            th.convert_tiff_sequence_to_binary(frames, bg_median, target_params_dict, save_location, folders_exist, optional_settings)
+        for stage in ["bin", "bg_sub"]:
+            target = skimage.io.imread_collection(str(tmp_path / "False" / stage / "*"))
+            results = skimage.io.imread_collection(str(tmp_path / "True" / stage / "*"))
+            assert len(results) == len(target) == len(frames)
+            for i in range(0,len(target)):
+                assert np.array_equal(results[i], target[i])
+
+    def test_resume(self, tmp_path, experimental_video, target_params_dict, bg_median):
+        # Fails if frames before the recorded progress are converted again,
+        # or the resumed images differ from the images of a full run.
+        frames = [experimental_video[i] for i in range(0,50)]
+        optional_settings = {"resume" : True}
+        folders_exist = folder.make_destination_folders(tmp_path, optional_settings)
+        th.convert_tiff_sequence_to_binary(frames, bg_median, target_params_dict, tmp_path, folders_exist, optional_settings)
+        target = skimage.io.imread_collection(str(tmp_path / "bin" / "*"))
+        target = [target[i] for i in range(0,len(target))]
+
+        # Simulates a run interrupted after 32 frames.
+        cache.record_progress(tmp_path, 32, 50, optional_settings)
+        for i in range(32,50):
+            os.remove(tmp_path / "bin" / f"{i:03}.png")
+        mtimes = [os.stat(tmp_path / "bin" / f"{i:03}.png").st_mtime_ns for i in range(0,32)]
+        th.convert_tiff_sequence_to_binary(frames, bg_median, target_params_dict, tmp_path, [False, True, True], optional_settings)
+
+        assert mtimes == [os.stat(tmp_path / "bin" / f"{i:03}.png").st_mtime_ns for i in range(0,32)]
+        results = skimage.io.imread_collection(str(tmp_path / "bin" / "*"))
+        assert len(results) == 50
+        for i in range(0,50):
+            assert np.array_equal(results[i], target[i])
+
+    def test_records_progress(self, tmp_path, experimental_video, target_params_dict, bg_median):
+        # Fails if the progress does not record every frame as saved.
+        frames = [experimental_video[i] for i in range(0,20)]
+        folders_exist = folder.make_destination_folders(tmp_path)
+        th.convert_tiff_sequence_to_binary(frames, bg_median, target_params_dict, tmp_path, folders_exist)
+        progress = cache.read_progress(tmp_path)
+        assert progress["frames_completed"] == progress["frames_total"] == 20
+        assert not progress["complete"]
+        assert not any(name.startswith(".") for name in os.listdir(tmp_path / "bin"))
+
+    def test_error_removes_stacks(self, tmp_path, experimental_video, target_params_dict, bg_median, monkeypatch):
+        # Fails if any stack or temporary file is left, or the image writer's
+        # threads are still running, after an error.
+        def fail_to_write(writers, collected):
+            raise RuntimeError("interrupted")
+        monkeypatch.setattr(th, "write_collected_images", fail_to_write)
+        frames = [experimental_video[i] for i in range(0,12)]
+        optional_settings = {"save_crop" : True, "save_bg_sub" : True, "intermediate_format" : "stack",
+                             "bin_format" : "packed", "async_write" : True}
+        folders_exist = folder.make_destination_folders(tmp_path, optional_settings)
+        threads = threading.active_count()
+        with pytest.raises(RuntimeError, match="interrupted"):
+            th.convert_tiff_sequence_to_binary(frames, bg_median, target_params_dict, tmp_path, folders_exist, optional_settings)
+        for stage in ["bin", "crop", "bg_sub"]:
+            assert os.listdir(tmp_path / stage) == []
+        assert threading.active_count() == threads
+
+class TestAsyncImageWriter:
+    """
+    Tests AsyncImageWriter.
+
+    Tests
+    -----
+    test_saves_everything:
+        Checks if every queued image is saved by the time close returns.
+    test_backpressure:
+        Checks if save blocks while the queue is full.
+    test_raises_errors:
+        Checks if an error while saving is raised by close.
+    """
+
+    def test_saves_everything(self):
+        # Fails if any image is not saved after close.
+        saved = []
+        writer = async_writer.AsyncImageWriter(lambda image, number: saved.append(number), threads=3, max_queue=4)
+        for i in range(0,100):
+            writer.save(None, i)
+        writer.close()
+        assert sorted(saved) == list(range(0,100))
+
+    def test_backpressure(self):
+        # Fails if save does not wait while the queue is full.
+        release = threading.Event()
+        writer = async_writer.AsyncImageWriter(lambda number: release.wait(), threads=1, max_queue=2)
+        # One image is being saved and two are waiting, so the queue is full.
+        for i in range(0,3):
+            writer.save(i)
+        blocked = threading.Thread(target=writer.save, args=(3,))
+        blocked.start()
+        blocked.join(0.2)
+        assert blocked.is_alive()
+        release.set()
+        blocked.join()
+        writer.close()
+
+    def test_raises_errors(self):
+        # Fails if an error while saving is not raised.
+        def fail(number):
+            raise OSError("disk full")
+        writer = async_writer.AsyncImageWriter(fail)
+        writer.save(0)
+        with pytest.raises(OSError, match="disk full"):
+            writer.close()
+
+class TestPrefetchingVideo:
+    """
+    Tests PrefetchingVideo.
+
+    Tests
+    -----
+    test_frames_in_order:
+        Checks if frames indexed in order match the video, for several read
+        ahead depths.
+    test_frames_out_of_order:
+        Checks if frames indexed out of order match the video.
+    test_reads_ahead:
+        Checks if upcoming frames are read before they are indexed.
+    test_close:
+        Checks if closing stops the background thread and leaves frames
+        readable.
+    """
+
+    class CountingVideo:
+        """
+        A video of small frames that records which frames were read.
+        """
+
+        def __init__(self, frame_count):
+            self.frames = np.arange(frame_count*2*3).reshape(frame_count,2,3)
+            self.read = []
+
+        def __len__(self):
+            return len(self.frames)
+
+        def __getitem__(self, index):
+            self.read.append(index)
+            return self.frames[index]
+
+    @pytest.mark.parametrize("depth", [0, 1, 4, 20])
+    def test_frames_in_order(self, depth):
+        # Fails if any frame does not match the video.
+        video = self.CountingVideo(10)
+        with reader.PrefetchingVideo(video, depth) as frames:
+            assert len(frames) == 10
+            assert np.array_equal(np.stack(list(frames)), video.frames)
+
+    def test_frames_out_of_order(self):
+        # Fails if any frame does not match the video when frames are skipped
+        # or revisited.
+        video = self.CountingVideo(10)
+        with reader.PrefetchingVideo(video, 3) as frames:
+            for index in [0, 1, 5, 6, 2, 9, 3, 4]:
+                assert np.array_equal(frames[index], video.frames[index])
+
+    def test_reads_ahead(self):
+        # Fails if the frames after the first are not read after the first is
+        # indexed.
+        video = self.CountingVideo(10)
+        with reader.PrefetchingVideo(video, 3) as frames:
+            frames[0]
+            frames.futures[-1].result()
+            assert sorted(video.read) == [0, 1, 2, 3]
+
+    def test_close(self):
+        # Fails if the thread is not stopped or frames cannot be read after
+        # closing.
+        video = self.CountingVideo(5)
+        frames = reader.PrefetchingVideo(video, 2)
+        frames[0]
+        frames.close()
+        assert frames.executor is None
+        assert np.array_equal(frames[3], video.frames[3])
+
+class TestMapFrameChunks:
+    """
+    Tests map_frame_chunks.
+
+    Tests
+    -----
+    test_covers_frames_in_order:
+        Checks if the chunks cover every frame once and results are in order,
+        with and without threads, even if chunks finish out of order.
+    """
+
+    @pytest.mark.parametrize("frame_threads", [1, 4])
+    def test_covers_frames_in_order(self, frame_threads):
+        # Fails if any frame is missed or repeated or results are out of
+        # order.
+        def chunk(start, stop):
+            # Later chunks finish first.
+            time.sleep(0.001*(100 - start % 100)/10)
+            return list(range(start, stop))
+        frame_count = 3*th.FRAME_CHUNK_SIZE*frame_threads + 5
+        results = list(th.map_frame_chunks(chunk, frame_count, {"frame_threads" : frame_threads}))
+        assert [frame for result in results for frame in result] == list(range(0, frame_count))
+
+class TestTiffStackWriter:
+    """
+    Tests TiffStackWriter.
+
+    Tests
+    -----
+    test_round_trip:
+        Checks if the pages of the stack match the images written, with and
+        without compression.
+    test_partial_until_closed:
+        Checks if the stack is only at its path once the writer is closed.
+    test_abort:
+        Checks if aborting the writer removes the temporary file.
+    test_uncompressed_memmap:
+        Checks if an uncompressed stack can be memory-mapped.
+    """
+
+    images = np.arange(6*5*7, dtype=np.uint16).reshape(6,5,7)
+
+    @pytest.mark.parametrize("compression", [None, "zlib"])
+    def test_round_trip(self, tmp_path, compression):
+        # Fails if the stack does not match the images written.
+        path = tmp_path / "stack.tif"
+        with intermediate.TiffStackWriter(path, compression) as writer:
+            for image in self.images:
+                writer.append(image)
+        assert np.array_equal(tifffile.imread(path), self.images)
+
+    def test_partial_until_closed(self, tmp_path):
+        # Fails if the stack is at its path before the writer is closed.
+        path = tmp_path / "stack.tif"
+        writer = intermediate.TiffStackWriter(path)
+        writer.append(self.images[0])
+        assert not os.path.exists(path)
+        assert os.path.exists(str(path) + intermediate.PARTIAL_EXTENSION)
+        writer.close()
+        assert os.path.exists(path)
+        assert not os.path.exists(str(path) + intermediate.PARTIAL_EXTENSION)
+
+    def test_abort(self, tmp_path):
+        # Fails if aborting leaves any files.
+        path = tmp_path / "stack.tif"
+        writer = intermediate.TiffStackWriter(path)
+        writer.append(self.images[0])
+        writer.abort()
+        assert os.listdir(tmp_path) == []
+
+    def test_uncompressed_memmap(self, tmp_path):
+        # Fails if an uncompressed stack cannot be memory-mapped.
+        path = tmp_path / "stack.tif"
+        with intermediate.TiffStackWriter(path) as writer:
+            for image in self.images:
+                writer.append(image)
+        assert np.array_equal(tifffile.memmap(path, mode='r'), self.images)
+
+class TestOpenStackWriters:
+    """
+    Tests open_stack_writers.
+
+    Tests
+    -----
+    test_no_writers_by_default:
+        Checks if no writers are opened with default settings.
+    test_opens_writers:
+        Checks if writers are opened for the stacks that should be saved.
+    test_skips_existing_stack:
+        Checks if a complete stack is skipped if skip_existing is True, but
+        a stage folder without a complete stack is not.
+    test_error_if_unknown_format:
+        Checks if open_stack_writers raises a ValueError for an unknown
+        intermediate_format.
+    test_abort_stack_writers:
+        Checks if abort_stack_writers removes every unfinished stack and does
+        not raise errors from saving images.
+    """
+
+    optional_settings = {"save_crop" : True, "save_bg_sub" : True, "intermediate_format" : "stack", "bin_format" : "packed"}
+
+    def test_no_writers_by_default(self, tmp_path):
+        # Fails if writers are opened with default settings.
+        folders_exist = folder.make_destination_folders(tmp_path)
+        writers = th.open_stack_writers(tmp_path, folders_exist)
+        assert writers == {"bin": None, "crop": None, "bg_sub": None, "images": None}
+
+    def test_opens_writers(self, tmp_path):
+        # Fails if writers are not opened for every stack.
+        folders_exist = folder.make_destination_folders(tmp_path, self.optional_settings)
+        writers = th.open_stack_writers(tmp_path, folders_exist, self.optional_settings)
+        assert isinstance(writers["bin"], stack.BinaryStackWriter)
+        assert isinstance(writers["crop"], intermediate.TiffStackWriter)
+        assert isinstance(writers["bg_sub"], intermediate.TiffStackWriter)
+        th.close_stack_writers(writers)
+
+    def test_skips_existing_stack(self, tmp_path):
+        # Fails if a complete stack is not skipped, or if a folder without a
+        # complete stack is skipped.
+        folder.make_destination_folders(tmp_path, self.optional_settings)
+        (tmp_path / "crop" / "crop.tif").touch()
+        (tmp_path / "bg_sub" / ("bg_sub.tif" + intermediate.PARTIAL_EXTENSION)).touch()
+        writers = th.open_stack_writers(tmp_path, [True, True, True], self.optional_settings)
+        assert writers["crop"] is None
+        assert writers["bin"] is None
+        assert isinstance(writers["bg_sub"], intermediate.TiffStackWriter)
+        th.close_stack_writers(writers)
+
+    def test_error_if_unknown_format(self, tmp_path):
+        # Fails if an unknown format does not raise a ValueError.
+        with pytest.raises(ValueError, match="intermediate_format"):
+            th.open_stack_writers(tmp_path, [False, False, False], {"intermediate_format" : "zarr"})
+
+    def test_abort_stack_writers(self, tmp_path):
+        # Fails if any stack or temporary file is left, or an error from
+        # saving images is raised.
+        optional_settings = dict(self.optional_settings)
+        optional_settings["async_write"] = True
+        folders_exist = folder.make_destination_folders(tmp_path, optional_settings)
+        writers = th.open_stack_writers(tmp_path, folders_exist, optional_settings)
+        writers["bin"].append(np.ones((4,9), dtype=np.uint8))
+        writers["images"].error = OSError("disk full")
+        th.abort_stack_writers(writers)
+        for stage in ["bin", "crop", "bg_sub"]:
+            assert os.listdir(tmp_path / stage) == []
+
 class TestBackgroundSubtraction:
     """
     Tests substract_background_single_image
@@ -294,6 +1074,537 @@ def test_tiffs_to_binary():
     #assert produced video matches test_sequence
     pass
 
+class TestTiffsToBinary:
+    """
+    Tests tiffs_to_binary
+
+    Tests
+    -----
+    test_redoes_interrupted_video:
+        Checks if a video whose progress is not complete is converted again,
+        even though its folders exist and skip_existing is True.
+    test_skips_complete_video:
+        Checks if a completed video is skipped if skip_existing is True.
+    test_redoes_interrupted_sampled_video:
+        Checks if a video interrupted while sampling frames (frame_step
+        above 1) is converted again.
+    """
+
+    def test_redoes_interrupted_video(self, tmp_path, fname, short_video_folders):
+        # Fails if an interrupted video is skipped.
+        images_location = tmp_path / fname
+        th.tiffs_to_binary(*short_video_folders, images_location)
+        assert cache.read_progress(images_location)["complete"]
+        os.remove(images_location / "bin" / "019.png")
+        cache.record_progress(images_location, 16, 20)
+        th.tiffs_to_binary(*short_video_folders, images_location)
+        assert os.path.exists(images_location / "bin" / "019.png")
+        assert cache.read_progress(images_location)["complete"]
+
+    def test_skips_complete_video(self, tmp_path, fname, short_video_folders):
+        # Fails if a completed video is converted again.
+        images_location = tmp_path / fname
+        th.tiffs_to_binary(*short_video_folders, images_location)
+        os.remove(images_location / "bin" / "019.png")
+        th.tiffs_to_binary(*short_video_folders, images_location)
+        assert not os.path.exists(images_location / "bin" / "019.png")
+
+    def test_redoes_interrupted_sampled_video(self, tmp_path, fname, short_video_folders, monkeypatch):
+        # Fails if a video interrupted after saving its binary images but
+        # before saving its parameters is skipped.
+        images_location = tmp_path / fname
+        optional_settings = {"frame_step" : 4}
+        convert = th.convert_tiff_sequence_to_diameters
+        def interrupted_convert(*args, **kwargs):
+            convert(*args, **kwargs)
+            raise RuntimeError("interrupted")
+        monkeypatch.setattr(th, "convert_tiff_sequence_to_diameters", interrupted_convert)
+        with pytest.raises(RuntimeError, match="interrupted"):
+            th.tiffs_to_binary(*short_video_folders, images_location, optional_settings)
+        monkeypatch.undo()
+        assert cache.interrupted(images_location)
+        th.tiffs_to_binary(*short_video_folders, images_location, optional_settings)
+        assert os.path.exists(images_location / (fname + "_params.csv"))
+        assert cache.read_progress(images_location)["complete"]
+
+class TestEstimateTaskMemory:
+    """
+    Tests video_frame_info and estimate_task_memory.
+
+    Tests
+    -----
+    test_video_frame_info:
+        Checks if the frame shape, dtype, and number of frames read from the
+        headers match the frames of the video.
+    test_background_scales_with_frames:
+        Checks if the background estimate grows with the number of
+        background frames and the frames estimate does not.
+    test_streaming_median:
+        Checks if the background estimate does not depend on the number of
+        background frames when streaming_median is True.
+    test_empty_folder:
+        Checks if both estimates are WORKER_BASE_BYTES for folders without
+        images.
+    """
+
+    def link_frames(self, video, folder, count):
+        # Links the first count frames of video into folder.
+        os.mkdir(folder)
+        for i in range(0, count):
+            os.symlink(os.path.abspath(video.files[i]), folder / os.path.basename(video.files[i]))
+        return folder
+
+    def test_video_frame_info(self, videos_folder, fname, timecode, experimental_video):
+        # Fails if the shape, dtype, or number of frames is wrong.
+        shape, dtype, frame_count = th.video_frame_info(os.path.join(videos_folder, fname + timecode))
+        assert shape == experimental_video[0].shape
+        assert dtype == experimental_video[0].dtype
+        assert frame_count == len(experimental_video)
+
+    def test_background_scales_with_frames(self, tmp_path, experimental_video, background_video):
+        # Fails if the background estimate does not grow with the number of
+        # background frames, or the frames estimate changes.
+        exp = self.link_frames(experimental_video, tmp_path / "exp", 5)
+        small = th.estimate_task_memory(exp, self.link_frames(background_video, tmp_path / "bg5", 5))
+        large = th.estimate_task_memory(exp, self.link_frames(background_video, tmp_path / "bg10", 10))
+        assert large["background"] > small["background"] > th.WORKER_BASE_BYTES
+        assert large["frames"] == small["frames"] > th.WORKER_BASE_BYTES
+
+    def test_streaming_median(self, tmp_path, experimental_video, background_video):
+        # Fails if the background estimate changes with the number of
+        # background frames.
+        exp = self.link_frames(experimental_video, tmp_path / "exp", 5)
+        optional_settings = {"streaming_median" : True}
+        small = th.estimate_task_memory(exp, self.link_frames(background_video, tmp_path / "bg5", 5), optional_settings)
+        large = th.estimate_task_memory(exp, self.link_frames(background_video, tmp_path / "bg10", 10), optional_settings)
+        assert large["background"] == small["background"]
+
+    def test_empty_folder(self, tmp_path):
+        # Fails if either estimate is not WORKER_BASE_BYTES.
+        estimates = th.estimate_task_memory(tmp_path, tmp_path)
+        assert estimates == {"background" : th.WORKER_BASE_BYTES, "frames" : th.WORKER_BASE_BYTES}
+
+class TestVideoChunks:
+    """
+    Tests video_chunks_supported, prepare_video_chunks, convert_video_chunk,
+    and finish_video_chunks.
+
+    Tests
+    -----
+    test_supported:
+        Checks if ranges of frames are only supported when task_frames is
+        above 0 and every frame is converted independently.
+    test_conflicts:
+        Checks if video_chunks_conflicts names every setting that prevents
+        converting ranges of frames.
+    test_matches_tiffs_to_binary:
+        Checks if converting ranges of frames in any order saves the same
+        binary images and parameters as tiffs_to_binary.
+    test_fused_matches_tiffs_to_csv:
+        Checks if the joined diameters of each range save the same csv as
+        tiffs_to_csv when fused is True.
+    test_skips_complete_video:
+        Checks if prepare_video_chunks returns None for a completed video if
+        skip_existing is True.
+    """
+
+    fps = 25000
+
+    def convert_in_ranges(self, video_folders, images_location, csv_location, optional_settings):
+        # Converts ranges of 7 frames, last range first.
+        os.makedirs(images_location.parent, exist_ok=True)
+        prepared = th.prepare_video_chunks(*video_folders, images_location, csv_location, optional_settings)
+        ranges = [(0, 7), (7, 14), (14, 20)]
+        diameters = {}
+        for start, stop in reversed(ranges):
+            diameters[start] = th.convert_video_chunk(video_folders[0], images_location, prepared, start, stop, optional_settings)
+        joined = np.concatenate([diameters[start] for start, stop in ranges])
+        th.finish_video_chunks(images_location, prepared, joined, csv_location, self.fps, optional_settings)
+
+    def test_supported(self):
+        # Fails if ranges of frames are supported with task_frames 0 or with
+        # settings that need frames in order.
+        assert th.video_chunks_supported({"task_frames" : 64})
+        assert not th.video_chunks_supported({})
+        assert not th.video_chunks_supported({"task_frames" : 64, "bin_format" : "packed"})
+        assert not th.video_chunks_supported({"task_frames" : 64, "intermediate_format" : "stack"})
+        assert not th.video_chunks_supported({"task_frames" : 64, "frame_step" : 4})
+        assert not th.video_chunks_supported({"task_frames" : 64, "stop_after_breakup" : 10})
+        assert not th.video_chunks_supported({"task_frames" : 64, "resume" : True})
+        assert not th.video_chunks_supported({"task_frames" : 64, "use_cache" : True})
+
+    def test_conflicts(self):
+        # Fails if a conflicting setting is missing or a default setting is
+        # named.
+        assert th.video_chunks_conflicts({}) == []
+        optional_settings = {"bin_format" : "packed", "intermediate_format" : "stack", "frame_step" : 4,
+                             "stop_after_breakup" : 10, "use_cache" : True, "resume" : True}
+        assert th.video_chunks_conflicts(optional_settings) == list(optional_settings.keys())
+
+    def test_matches_tiffs_to_binary(self, tmp_path, fname, short_video_folders):
+        # Fails if any binary image or the parameters differ from
+        # tiffs_to_binary, or if the video is not marked complete.
+        whole_location = tmp_path / "whole" / fname
+        chunk_location = tmp_path / "chunks" / fname
+        os.makedirs(whole_location)
+        th.tiffs_to_binary(*short_video_folders, whole_location)
+        self.convert_in_ranges(short_video_folders, chunk_location, None, {"task_frames" : 7})
+        for i in range(0, 20):
+            whole = skimage.io.imread(whole_location / "bin" / f"{i:03}.png")
+            chunk = skimage.io.imread(chunk_location / "bin" / f"{i:03}.png")
+            assert np.all(whole == chunk)
+        whole_params = pd.read_csv(whole_location / (fname + "_params.csv"))
+        chunk_params = pd.read_csv(chunk_location / (fname + "_params.csv"))
+        pd.testing.assert_frame_equal(whole_params, chunk_params)
+        assert cache.read_progress(chunk_location)["complete"]
+
+    def test_fused_matches_tiffs_to_csv(self, tmp_path, fname, short_video_folders):
+        # Fails if the csv differs from tiffs_to_csv or binary images are
+        # saved.
+        whole_csvs = tmp_path / "whole_csv"
+        chunk_csvs = tmp_path / "chunk_csv"
+        os.mkdir(whole_csvs)
+        os.mkdir(chunk_csvs)
+        os.makedirs(tmp_path / "whole" / fname)
+        th.tiffs_to_csv(*short_video_folders, tmp_path / "whole" / fname, whole_csvs, self.fps)
+        optional_settings = {"task_frames" : 7, "fused" : True}
+        self.convert_in_ranges(short_video_folders, tmp_path / "chunks" / fname, chunk_csvs, optional_settings)
+        whole = pd.read_csv(whole_csvs / (fname + ".csv"))
+        chunk = pd.read_csv(chunk_csvs / (fname + ".csv"))
+        pd.testing.assert_frame_equal(whole, chunk)
+        assert not os.path.exists(tmp_path / "chunks" / fname / "bin")
+
+    def test_skips_complete_video(self, tmp_path, fname, short_video_folders):
+        # Fails if a completed video is prepared again.
+        images_location = tmp_path / fname
+        self.convert_in_ranges(short_video_folders, images_location, None, {"task_frames" : 7})
+        assert th.prepare_video_chunks(*short_video_folders, images_location) is None
+
+class TestSharedArrays:
+    """
+    Tests share_array, attached_array, and SharedArrayRegistry.
+
+    Tests
+    -----
+    test_read_in_worker:
+        Checks if a worker process reads the same array from its handle.
+    test_read_only:
+        Checks if attached arrays cannot be changed.
+    test_array_used_as_is:
+        Checks if attached_array passes arrays that are not handles through.
+    test_release_frees_memory:
+        Checks if releasing a key frees its shared memory, and only its.
+    test_close_frees_memory:
+        Checks if closing the registry frees every remaining array, even if
+        an error was raised.
+    test_convert_video_chunk_with_handle:
+        Checks if convert_video_chunk gives the same diameters with the
+        background in shared memory.
+    """
+
+    array = np.arange(0, 120, dtype=np.uint16).reshape(10, 12)
+
+    def test_read_in_worker(self):
+        # Fails if the worker reads a different array.
+        with shared_arrays.SharedArrayRegistry() as registry:
+            handle = registry.publish(0, self.array)
+            with multiprocessing.Pool(1) as pool:
+                assert pool.apply(sum_shared_array, (handle,)) == int(np.sum(self.array))
+
+    def test_read_only(self):
+        # Fails if the attached array can be changed.
+        with shared_arrays.SharedArrayRegistry() as registry:
+            handle = registry.publish(0, self.array)
+            with shared_arrays.attached_array(handle) as array:
+                assert np.all(array == self.array)
+                with pytest.raises(ValueError):
+                    array[0,0] = 1
+                del array
+
+    def test_array_used_as_is(self):
+        # Fails if an array is not passed through unchanged.
+        with shared_arrays.attached_array(self.array) as array:
+            assert array is self.array
+
+    def test_release_frees_memory(self):
+        # Fails if a released array can still be attached, or another key's
+        # array cannot.
+        with shared_arrays.SharedArrayRegistry() as registry:
+            first = registry.publish(0, self.array)
+            second = registry.publish(1, self.array)
+            registry.release(0)
+            with pytest.raises(FileNotFoundError):
+                with shared_arrays.attached_array(first):
+                    pass
+            assert sum_shared_array(second) == int(np.sum(self.array))
+
+    def test_close_frees_memory(self):
+        # Fails if an array can still be attached after an error closed the
+        # registry.
+        with pytest.raises(RuntimeError):
+            with shared_arrays.SharedArrayRegistry() as registry:
+                handle = registry.publish(0, self.array)
+                raise RuntimeError("processing failed")
+        with pytest.raises(FileNotFoundError):
+            with shared_arrays.attached_array(handle):
+                pass
+
+    def test_convert_video_chunk_with_handle(self, tmp_path, fname, videos_folder, timecode):
+        # Fails if the diameters differ when the background is shared.
+        experimental_video_folder = os.path.join(videos_folder, fname + timecode)
+        background_video_folder = os.path.join(videos_folder, fname + "_bg" + timecode)
+        optional_settings = {"task_frames" : 10, "fused" : True}
+        prepared = th.prepare_video_chunks(experimental_video_folder, background_video_folder, tmp_path / "array",
+                                           tmp_path, optional_settings)
+        diameters = th.convert_video_chunk(experimental_video_folder, tmp_path / "array", prepared, 0, 10, optional_settings)
+        with shared_arrays.SharedArrayRegistry() as registry:
+            shared = dict(prepared)
+            shared["bg_median"] = registry.publish(0, prepared["bg_median"])
+            shared_diameters = th.convert_video_chunk(experimental_video_folder, tmp_path / "shared", shared, 0, 10, optional_settings)
+        assert np.all(diameters == shared_diameters)
+
+class TestTiffsToCSV:
+    """
+    Tests tiffs_to_csv
+
+    Tests
+    -----
+    test_matches_binary_path:
+        Checks if tiffs_to_csv saves the same csv as tiffs_to_binary followed
+        by binary_images_to_csv, without saving binary images.
+    test_saves_bin:
+        Checks if tiffs_to_csv saves binary images if save_bin is True.
+    test_skips_if_exists:
+        Checks if tiffs_to_csv skips the video if the csv already exists and
+        skip_existing is True (default).
+    test_mraw_matches_tiff:
+        Checks if tiffs_to_csv saves the same csv from .mraw recordings as
+        from the same frames saved as TIFFs.
+    test_saves_packed_bin:
+        Checks if tiffs_to_csv saves binary images as a packed binary stack
+        matching the .png binary images if bin_format is "packed".
+    test_stop_after_breakup:
+        Checks if tiffs_to_csv stops after stop_after_breakup frames with a
+        minimum diameter of 0, saving the start of the full csv and the
+        number of frames processed, with and without frame threads.
+    test_frame_step:
+        Checks if frame_step saves a subset of the full csv, the same as
+        tiffs_to_binary and binary_images_to_csv with the same frame_step.
+    test_frame_step_rejects_stacks:
+        Checks if frame_step above 1 raises a ValueError when binary images
+        are saved as a packed binary stack.
+    test_use_cache:
+        Checks if use_cache skips unchanged videos and recomputes videos
+        whose settings changed.
+    """
+
+    fps = 25000
+
+    @pytest.fixture
+    def video_folders(self, fname, timecode, videos_folder):
+        experimental_video_folder = os.path.join(videos_folder, fname + timecode)
+        background_video_folder = os.path.join(videos_folder, fname + "_bg" + timecode)
+        return experimental_video_folder, background_video_folder
+
+    def test_matches_binary_path(self, tmp_path, fname, video_folders):
+        # Fails if the fused csv differs from the csv produced through
+        # binary images saved on disk, or if binary images are saved.
+        experimental_video_folder, background_video_folder = video_folders
+        binary_location = tmp_path / "binary" / fname
+        fused_location = tmp_path / "fused" / fname
+        binary_csv = tmp_path / "binary_csv"
+        fused_csv = tmp_path / "fused_csv"
+        for path in [tmp_path / "binary", tmp_path / "fused", binary_csv, fused_csv]:
+            os.mkdir(path)
+
+        th.tiffs_to_binary(experimental_video_folder, background_video_folder, binary_location)
+        binary.binary_images_to_csv(binary_location, binary_csv, self.fps)
+        th.tiffs_to_csv(experimental_video_folder, background_video_folder, fused_location, fused_csv, self.fps)
+
+        assert not os.path.exists(fused_location / "bin")
+        target = pd.read_csv(binary_csv / (fname + ".csv"))
+        results = pd.read_csv(fused_csv / (fname + ".csv"))
+        pd.testing.assert_frame_equal(target, results)
+
+    def test_saves_bin(self, tmp_path, fname, video_folders):
+        # Fails if tiffs_to_csv does not save binary images if save_bin is
+        # True.
+        experimental_video_folder, background_video_folder = video_folders
+        images_location = tmp_path / fname
+        optional_settings = {"save_bin" : True}
+        th.tiffs_to_csv(experimental_video_folder, background_video_folder, images_location, tmp_path, self.fps, optional_settings)
+        assert os.path.exists(images_location / "bin" / "000.png")
+        assert os.path.exists(tmp_path / (fname + ".csv"))
+
+    def test_saves_packed_bin(self, tmp_path, fname, video_folders):
+        # Fails if tiffs_to_csv does not save the binary images as one packed
+        # binary stack matching the .png images if bin_format is "packed".
+        experimental_video_folder, background_video_folder = video_folders
+        png_location = tmp_path / "png" / fname
+        packed_location = tmp_path / "packed" / fname
+        for path in [tmp_path / "png", tmp_path / "packed"]:
+            os.mkdir(path)
+        optional_settings = {"save_bin" : True}
+        th.tiffs_to_csv(experimental_video_folder, background_video_folder, png_location, tmp_path / "png", self.fps, optional_settings)
+        optional_settings["bin_format"] = "packed"
+        th.tiffs_to_csv(experimental_video_folder, background_video_folder, packed_location, tmp_path / "packed", self.fps, optional_settings)
+
+        assert os.listdir(packed_location / "bin") == [stack.BINARY_STACK_NAME]
+        images = stack.read_binary_stack(packed_location / "bin" / stack.BINARY_STACK_NAME)
+        binary_sequence = skimage.io.imread_collection(os.path.join(png_location,"bin","*"))
+        assert len(images) == len(binary_sequence)
+        for i in range(0,len(binary_sequence),25):
+            assert np.array_equal(images[i], binary_sequence[i])
+
+    def test_skips_if_exists(self, tmp_path, fname, video_folders):
+        # Fails if tiffs_to_csv overwrites an existing csv when skip_existing
+        # is True.
+        experimental_video_folder, background_video_folder = video_folders
+        file = tmp_path / (fname + ".csv")
+        file.touch()
+        th.tiffs_to_csv(experimental_video_folder, background_video_folder, tmp_path / fname, tmp_path, self.fps)
+        assert os.stat(file).st_size == 0
+
+    def test_mraw_matches_tiff(self, tmp_path, fname, experimental_video, background_video):
+        # Fails if the csv from .mraw recordings differs from the csv from the
+        # same frames saved as TIFFs.
+        frame_count = 60
+        folders = [tmp_path / "exp_tiff", tmp_path / "bg_tiff", tmp_path / "tiff", tmp_path / "mraw", tmp_path / "tiff_csv", tmp_path / "mraw_csv"]
+        for path in folders:
+            os.mkdir(path)
+        for i in range(0, frame_count):
+            os.symlink(os.path.abspath(experimental_video.files[i]), tmp_path / "exp_tiff" / os.path.basename(experimental_video.files[i]))
+        for i in range(0, len(background_video)):
+            os.symlink(os.path.abspath(background_video.files[i]), tmp_path / "bg_tiff" / os.path.basename(background_video.files[i]))
+        write_mraw(tmp_path / "exp.mraw", [experimental_video[i] for i in range(0, frame_count)])
+        write_mraw(tmp_path / "bg.mraw", list(background_video), 12, ".cih")
+
+        th.tiffs_to_csv(tmp_path / "exp_tiff", tmp_path / "bg_tiff", tmp_path / "tiff" / fname, tmp_path / "tiff_csv", self.fps)
+        optional_settings = {"image_extension" : "mraw"}
+        th.tiffs_to_csv(tmp_path / "exp.mraw", tmp_path / "bg.mraw", tmp_path / "mraw" / fname, tmp_path / "mraw_csv", self.fps, optional_settings)
+
+        target = pd.read_csv(tmp_path / "tiff_csv" / (fname + ".csv"))
+        results = pd.read_csv(tmp_path / "mraw_csv" / (fname + ".csv"))
+        pd.testing.assert_frame_equal(target, results)
+
+    @pytest.mark.parametrize("frame_threads", [1, 2])
+    def test_stop_after_breakup(self, tmp_path, fname, video_folders, frame_threads):
+        # Fails if the csv does not end at the frame completing the breakup,
+        # differs from the start of the full csv, or the frames processed are
+        # not saved with the parameters.
+        experimental_video_folder, background_video_folder = video_folders
+        for path in [tmp_path / "full", tmp_path / "stopped"]:
+            os.mkdir(path)
+        th.tiffs_to_csv(experimental_video_folder, background_video_folder, tmp_path / "full" / fname, tmp_path / "full", self.fps)
+        optional_settings = {"stop_after_breakup" : 10, "frame_threads" : frame_threads, "save_bin" : True, "bin_format" : "packed"}
+        th.tiffs_to_csv(experimental_video_folder, background_video_folder, tmp_path / "stopped" / fname, tmp_path / "stopped", self.fps, optional_settings)
+
+        target = pd.read_csv(tmp_path / "full" / (fname + ".csv"))
+        results = pd.read_csv(tmp_path / "stopped" / (fname + ".csv"))
+        zeros = (target["D/D0"] == 0).astype(int).to_numpy()
+        # First frame ending 10 consecutive zeros.
+        stop = [i for i in range(9, len(zeros)) if zeros[i-9:i+1].all()][0] + 1
+        assert len(results) == stop < len(target)
+        pd.testing.assert_frame_equal(target.iloc[0:stop], results)
+        params = binary.add_saved_params_to_dict(tmp_path / "stopped" / fname, {})
+        assert int(params["frames_processed"]) == stop
+        assert int(params["frames_total"]) == len(target)
+        header = stack.read_binary_stack_header(tmp_path / "stopped" / fname / "bin" / stack.BINARY_STACK_NAME)
+        assert header["frames"] == stop
+
+    def test_frame_step(self, tmp_path, fname, video_folders):
+        # Fails if the sampled csv is not a subset of the full csv, or differs
+        # from the csv through binary images saved with the same frame_step.
+        experimental_video_folder, background_video_folder = video_folders
+        for path in [tmp_path / "full", tmp_path / "fused", tmp_path / "binary", tmp_path / "binary_csv"]:
+            os.mkdir(path)
+        optional_settings = {"frame_step" : 10}
+        th.tiffs_to_csv(experimental_video_folder, background_video_folder, tmp_path / "full" / fname, tmp_path / "full", self.fps)
+        th.tiffs_to_csv(experimental_video_folder, background_video_folder, tmp_path / "fused" / fname, tmp_path / "fused", self.fps, optional_settings)
+        th.tiffs_to_binary(experimental_video_folder, background_video_folder, tmp_path / "binary" / fname, optional_settings)
+        binary.binary_images_to_csv(tmp_path / "binary" / fname, tmp_path / "binary_csv", self.fps)
+
+        target = pd.read_csv(tmp_path / "full" / (fname + ".csv"))
+        results = pd.read_csv(tmp_path / "fused" / (fname + ".csv"))
+        frames = np.round(results["time (s)"]*self.fps).astype(int)
+        assert len(results) < len(target)
+        columns = ["time (s)", "D/D0"]
+        pd.testing.assert_frame_equal(target.iloc[frames].reset_index(drop=True)[columns], results[columns])
+        binary_results = pd.read_csv(tmp_path / "binary_csv" / (fname + ".csv"))
+        pd.testing.assert_frame_equal(results, binary_results)
+        params = binary.add_saved_params_to_dict(tmp_path / "fused" / fname, {})
+        assert int(params["frames_processed"]) == len(results)
+
+    def test_frame_step_rejects_stacks(self, tmp_path, fname, video_folders):
+        # Fails if frame_step above 1 is accepted with a packed binary stack.
+        experimental_video_folder, background_video_folder = video_folders
+        optional_settings = {"frame_step" : 10, "save_bin" : True, "bin_format" : "packed"}
+        with pytest.raises(ValueError):
+            th.tiffs_to_csv(experimental_video_folder, background_video_folder, tmp_path / fname, tmp_path, self.fps, optional_settings)
+
+    def test_use_cache(self, tmp_path, fname, experimental_video, background_video):
+        # Fails if an unchanged video is processed again, or a video with a
+        # changed setting or a half-written stage is not.
+        for path in [tmp_path / "exp", tmp_path / "bg", tmp_path / "csv"]:
+            os.mkdir(path)
+        for i in range(0, 20):
+            os.symlink(os.path.abspath(experimental_video.files[i]), tmp_path / "exp" / os.path.basename(experimental_video.files[i]))
+        for i in range(0, len(background_video)):
+            os.symlink(os.path.abspath(background_video.files[i]), tmp_path / "bg" / os.path.basename(background_video.files[i]))
+        images_location = tmp_path / fname
+        csv_path = tmp_path / "csv" / (fname + ".csv")
+        optional_settings = {"use_cache" : True, "save_bin" : True}
+
+        th.tiffs_to_csv(tmp_path / "exp", tmp_path / "bg", images_location, tmp_path / "csv", self.fps, optional_settings)
+        assert set(cache.read_manifest(images_location)) == {"bin", "params", "csv"}
+        mtime = os.stat(csv_path).st_mtime_ns
+        bin_mtime = os.stat(images_location / "bin" / "000.png").st_mtime_ns
+
+        # Unchanged: nothing is rewritten.
+        th.tiffs_to_csv(tmp_path / "exp", tmp_path / "bg", images_location, tmp_path / "csv", self.fps, optional_settings)
+        assert os.stat(csv_path).st_mtime_ns == mtime
+
+        # Changed crop setting: the csv and binary images are rewritten.
+        optional_settings["crop_height_coefficient"] = 2.5
+        th.tiffs_to_csv(tmp_path / "exp", tmp_path / "bg", images_location, tmp_path / "csv", self.fps, optional_settings)
+        assert os.stat(csv_path).st_mtime_ns != mtime
+        assert os.stat(images_location / "bin" / "000.png").st_mtime_ns != bin_mtime
+        mtime = os.stat(csv_path).st_mtime_ns
+        bin_mtime = os.stat(images_location / "bin" / "000.png").st_mtime_ns
+
+        # Interrupted binary images (stage started, never finished, with a
+        # stale image left over) are rewritten.
+        cache.start_stage(images_location, "bin")
+        (images_location / "bin" / "999.png").touch()
+        th.tiffs_to_csv(tmp_path / "exp", tmp_path / "bg", images_location, tmp_path / "csv", self.fps, optional_settings)
+        assert os.stat(images_location / "bin" / "000.png").st_mtime_ns != bin_mtime
+        assert len(os.listdir(images_location / "bin")) == 20
+        assert cache.is_cached(images_location, "bin", cache.stage_key("bin", tmp_path / "exp", tmp_path / "bg", dict(optional_settings, fused=True)))
+
+class TestFindBreakupStop:
+    """
+    Tests find_breakup_stop.
+
+    Tests
+    -----
+    test_finds_stop:
+        Checks if the stop is the frame completing the run of zeros, counting
+        zeros from earlier chunks.
+    test_no_stop:
+        Checks if no stop is found if runs of zeros are too short or
+        stop_after_breakup is 0.
+    """
+
+    def test_finds_stop(self):
+        # Fails if the stop or the run of zeros is incorrect.
+        assert th.find_breakup_stop(np.array([5, 0, 0, 0, 4]), 0, 3) == (4, 3)
+        assert th.find_breakup_stop(np.array([0, 0, 1]), 2, 3) == (1, 3)
+
+    def test_no_stop(self):
+        # Fails if a stop is found.
+        assert th.find_breakup_stop(np.array([0, 0, 4, 0]), 0, 3) == (None, 1)
+        assert th.find_breakup_stop(np.array([0, 0, 0, 0]), 1, 0) == (None, 5)
+
 class TestTopBorder:
     """
     Test top_border
@@ -408,6 +1719,182 @@ class TestCalculateMinDiameter:
             assert round(diameter,4) == diameters[i]
             i = i + 1
 
+@pytest.fixture
+def binary_stack(bin_folder):
+    binary_sequence = skimage.io.imread_collection(os.path.join(bin_folder,"*"))
+    return np.stack([binary_sequence[i] for i in range(0,len(binary_sequence),10)])
+
+class TestBinaryStack:
+    """
+    Tests write_binary_stack, BinaryStackWriter, and read_binary_stack.
+
+    Tests
+    -----
+    test_round_trip:
+        Checks if binary images read back from a packed binary stack match
+        the images written, with widths that are not a multiple of 8 and
+        chunks smaller than the video.
+    test_packed_size:
+        Checks if the packed stack is about 8x smaller than the uint8 images.
+    test_header:
+        Checks if the header holds the number of frames and their shape.
+    test_empty_stack:
+        Checks if a stack with no frames can be written and read.
+    test_error_if_different_shapes:
+        Checks if BinaryStackWriter raises a ValueError if images are not all
+        the same shape.
+    test_error_if_not_stack:
+        Checks if read_binary_stack raises a ValueError for other files.
+    test_partial_until_closed:
+        Checks if the stack is only at its path once the writer is closed.
+    test_interrupted_write:
+        Checks if write_binary_stack leaves no files if the images stop with
+        an error partway through.
+    """
+
+    def test_round_trip(self, tmp_path, binary_stack):
+        # Fails if the images read back do not match the images written.
+        rng = np.random.default_rng(0)
+        random_images = (rng.random((7,5,13)) > 0.5).astype(np.uint8)*255
+        for images in [binary_stack, random_images]:
+            path = tmp_path / "stack.dbs"
+            stack.write_binary_stack(path, images, chunk_frames=3)
+            result = stack.read_binary_stack(path)
+            assert result.dtype == np.uint8
+            assert np.array_equal(result, images)
+
+    def test_packed_size(self, tmp_path, binary_stack):
+        # Fails if the packed stack is not much smaller than the raw images.
+        path = tmp_path / "stack.dbs"
+        stack.write_binary_stack(path, binary_stack)
+        assert os.path.getsize(path) < binary_stack.nbytes/7
+
+    def test_header(self, tmp_path, binary_stack):
+        # Fails if the header does not match the images written.
+        path = tmp_path / "stack.dbs"
+        stack.write_binary_stack(path, binary_stack, chunk_frames=4)
+        header = stack.read_binary_stack_header(path)
+        (frames, rows, cols) = np.shape(binary_stack)
+        assert header == {"frames": frames, "rows": rows, "cols": cols, "chunk_frames": 4}
+
+    def test_empty_stack(self, tmp_path):
+        # Fails if an empty stack cannot be written and read.
+        path = tmp_path / "stack.dbs"
+        stack.write_binary_stack(path, [])
+        assert np.size(stack.read_binary_stack(path)) == 0
+
+    def test_error_if_different_shapes(self, tmp_path):
+        # Fails if images of different shapes do not raise a ValueError.
+        with stack.BinaryStackWriter(tmp_path / "stack.dbs") as writer:
+            writer.append(np.zeros((4,4)))
+            with pytest.raises(ValueError, match="same shape"):
+                writer.append(np.zeros((4,5)))
+
+    def test_error_if_not_stack(self, tmp_path):
+        # Fails if a file that is not a stack does not raise a ValueError.
+        path = tmp_path / "other.dbs"
+        path.write_bytes(b"not a binary stack file")
+        with pytest.raises(ValueError, match="not a packed binary stack"):
+            stack.read_binary_stack(path)
+
+    def test_partial_until_closed(self, tmp_path, binary_stack):
+        # Fails if the stack is at its path before the writer is closed.
+        path = tmp_path / "stack.dbs"
+        writer = stack.BinaryStackWriter(path)
+        writer.append(binary_stack[0])
+        assert not os.path.exists(path)
+        writer.close()
+        assert os.listdir(tmp_path) == ["stack.dbs"]
+
+    def test_interrupted_write(self, tmp_path, binary_stack):
+        # Fails if a stack or temporary file is left after an error.
+        def interrupted_images():
+            yield binary_stack[0]
+            raise RuntimeError("interrupted")
+        with pytest.raises(RuntimeError, match="interrupted"):
+            stack.write_binary_stack(tmp_path / "stack.dbs", interrupted_images())
+        assert os.listdir(tmp_path) == []
+
+class TestBottomBorders:
+    """
+    Tests bottom_borders
+
+    Tests
+    -----
+    test_matches_bottom_border:
+        Checks if bottom_borders returns the same values as bottom_border for
+        each image in a stack.
+    """
+
+    def test_matches_bottom_border(self, binary_stack):
+        # Fails if bottom_borders does not match bottom_border for every image
+        # in the stack.
+        bottoms = binary.bottom_borders(binary_stack)
+        for i in range(0,len(binary_stack)):
+            assert bottoms[i] == binary.bottom_border(binary_stack[i])
+
+class TestCalculateMinDiameters:
+    """
+    Tests calculate_min_diameters
+
+    Tests
+    -----
+    test_returns_correct_shapes:
+        Checks if calculate_min_diameters returns a profile for every row and
+        a minimum diameter for every image.
+    test_returns_correct_values:
+        Checks if calculate_min_diameters returns correct values for the
+        fixture images.
+    test_matches_calculate_min_diameter:
+        Checks if calculate_min_diameters returns the same values as
+        calculate_min_diameter for each image in a stack.
+    test_window_rows_excluded:
+        Checks if rows outside of the window are marked -1 in the profile.
+    """
+
+    window_top = 120
+
+    @pytest.fixture
+    def diameters(self,fixtures_binary):
+        return np.loadtxt(os.path.join(fixtures_binary,"fixture_diameters.csv"), delimiter=',')
+
+    def test_returns_correct_shapes(self, binary_stack):
+        # Fails if the profiles or minimum diameters have the wrong shape.
+        (frames, height, width) = binary_stack.shape
+        profiles, min_diameters = binary.calculate_min_diameters(binary_stack, [0,self.window_top,width,height])
+        assert profiles.shape == (frames, height)
+        assert min_diameters.shape == (frames,)
+
+    def test_returns_correct_values(self, images_list, diameters):
+        # Fails if calculate_min_diameters does not return correct values for
+        # the series of test images.
+        top_borders = [165,167,240,0,0]
+        for i in range(0,len(images_list)):
+            (height,width) = np.shape(images_list[i])
+            window = [0,top_borders[i],width,height]
+            profiles, min_diameters = binary.calculate_min_diameters(images_list[i][np.newaxis],window)
+            assert round(min_diameters[0],4) == diameters[i]
+
+    def test_matches_calculate_min_diameter(self, binary_stack):
+        # Fails if calculate_min_diameters does not return the same values as
+        # calculate_min_diameter for each image.
+        (frames, height, width) = binary_stack.shape
+        window = [0,self.window_top,width,height]
+        profiles, min_diameters = binary.calculate_min_diameters(binary_stack, window)
+        for i in range(0,frames):
+            assert min_diameters[i] == binary.calculate_min_diameter(binary_stack[i], window)
+
+    def test_window_rows_excluded(self, binary_stack):
+        # Fails if rows above the top of the window or below the bottom border
+        # are not -1 in the profile.
+        (frames, height, width) = binary_stack.shape
+        profiles, min_diameters = binary.calculate_min_diameters(binary_stack, [0,self.window_top,width,height])
+        bottoms = binary.bottom_borders(binary_stack)
+        for i in range(0,frames):
+            assert np.all(profiles[i,:self.window_top] == -1)
+            assert np.all(profiles[i,bottoms[i]:] == -1)
+            assert np.all(profiles[i,self.window_top:bottoms[i]] >= 0)
+
 class TestBinariesToDiameterTime:
     """
     Tests binaries_to_diameter_time
@@ -418,7 +1905,12 @@ class TestBinariesToDiameterTime:
         Checks if binaries_to_diameter_time returns a dataframe.
     test_returns_correct_values:
         Checks if binaries_to_diameter_time returns correct values for given
-        test sequence
+        test sequence, with and without reading images ahead.
+    test_frame_step:
+        Checks if frame_step measures a subset of frames, at the correct
+        times, including every frame in the refined region.
+    test_keeps_unmeasurable_frames:
+        Checks if frames with no diameter in the window are kept as NaN.
     """
 
     # TODO: make this into a fixture based on target_params_dict
@@ -440,14 +1932,135 @@ class TestBinariesToDiameterTime:
         # Fails if binaries_to_diameter_time does not return a dataframe.
         assert type(binary.binaries_to_diameter_time(binary_location,window,self.params_dict)) is pd.DataFrame
 
-    def test_returns_correct_values(self,fname,test_sequence,binary_location,window):
+    @pytest.mark.parametrize("prefetch_depth", [0, 4])
+    def test_returns_correct_values(self,fname,test_sequence,binary_location,window,prefetch_depth):
         # Fails if binaries_to_diameter_time does not return the correct values
-        # for the given sequence of images.
-        results = binary.binaries_to_diameter_time(binary_location,window,self.params_dict)
+        # for the given sequence of images, with or without reading ahead.
+        results = binary.binaries_to_diameter_time(binary_location,window,self.params_dict,optional_settings={"prefetch_depth" : prefetch_depth})
         test_data = pd.read_csv(os.path.join(test_sequence,fname,"csv",fname + ".csv"))
         for column in results.columns:
             assert pd.Series.eq(round(results[column],4),round(test_data[column],4)).all()
 
+    def test_frame_step(self,binary_location,window):
+        # Fails if sampled results are not the full results at the same
+        # times, or skip frames inside the refined region.
+        target = binary.binaries_to_diameter_time(binary_location,window,self.params_dict)
+        results = binary.binaries_to_diameter_time(binary_location,window,self.params_dict,optional_settings={"frame_step" : 10})
+        frames = np.round(results["time (s)"]*self.params_dict["fps"]).astype(int)
+        assert len(results) < len(target)
+        pd.testing.assert_frame_equal(target.iloc[frames].reset_index(drop=True), results)
+        first, last = binary.refinement_frames(frames[frames % 10 == 0].to_numpy(), results["D/D0"][frames % 10 == 0].to_numpy())
+        assert last > first
+        assert set(range(first, last + 1)) <= set(frames)
+
+    def test_keeps_unmeasurable_frames(self,binary_location,window):
+        # Fails if frames with no rows in the window are dropped.
+        target = binary.binaries_to_diameter_time(binary_location,window,self.params_dict)
+        empty_window = [window[0],window[3],window[2],window[3]]
+        results = binary.binaries_to_diameter_time(binary_location,empty_window,self.params_dict)
+        assert len(results) == len(target)
+        pd.testing.assert_series_equal(target["time (s)"], results["time (s)"])
+        assert results["D/D0"].isna().all()
+
+class TestRefinementFrames:
+    """
+    Tests refinement_frames.
+
+    Tests
+    -----
+    test_region_covers_bounds:
+        Checks if the region runs from the sample before D/D0 falls to the
+        largest bound to the sample after it falls below the smallest bound.
+    test_no_region:
+        Checks if no region is found if D/D0 never falls to the bounds.
+    test_region_to_end:
+        Checks if the region runs to the last sample if D/D0 never falls
+        below the smallest bound.
+    """
+
+    frame_numbers = np.arange(0, 100, 10)
+
+    def test_region_covers_bounds(self):
+        # Fails if the region does not start and end at the samples around
+        # the bounds.
+        normalized_diameters = np.array([1, 0.9, 0.5, 0.25, 0.1, 0.05, 0.03, 0, 0, 0])
+        assert binary.refinement_frames(self.frame_numbers, normalized_diameters) == (20, 70)
+
+    def test_no_region(self):
+        # Fails if a region is found.
+        normalized_diameters = np.full(10, 0.9)
+        first, last = binary.refinement_frames(self.frame_numbers, normalized_diameters)
+        assert last < first
+
+    def test_region_to_end(self):
+        # Fails if the region does not end at the last sample.
+        normalized_diameters = np.array([1, 1, 1, 1, 1, 1, 1, 0.2, 0.2, 0.2])
+        assert binary.refinement_frames(self.frame_numbers, normalized_diameters) == (60, 90)
+
+class TestMeasureSampledFrames:
+    """
+    Tests measure_sampled_frames.
+
+    Tests
+    -----
+    test_measures_all_frames:
+        Checks if every frame is measured once if frame_step is 1.
+    test_coarse_then_fine:
+        Checks if every frame_step-th frame is measured, then only the
+        frames in the refined region.
+    test_stopped_measure:
+        Checks if frames not returned by measure are left unmeasured.
+    test_nan_diameters_measured:
+        Checks if frames measured without a diameter count as measured and
+        are not measured again.
+    """
+
+    params_dict = {"nozzle_diameter" : 100}
+    # D/D0 falls linearly from 1 to 0 over 100 frames.
+    true_diameters = np.linspace(100, 0, 101)[:100]
+
+    def measure(self, positions):
+        self.calls.append(list(positions))
+        return self.true_diameters[positions]
+
+    def test_measures_all_frames(self):
+        # Fails if any frame is missed or measured twice.
+        self.calls = []
+        results, measured = binary.measure_sampled_frames(self.measure, np.arange(100), self.params_dict)
+        assert np.array_equal(results, self.true_diameters)
+        assert measured.all()
+        assert self.calls == [list(range(0, 100))]
+
+    def test_coarse_then_fine(self):
+        # Fails if the coarse frames or the refined region are wrong.
+        self.calls = []
+        results, measured = binary.measure_sampled_frames(self.measure, np.arange(100), self.params_dict, {"frame_step" : 10})
+        assert self.calls[0] == list(range(0, 100, 10))
+        # D/D0 first at or below 0.3 at frame 70 and below 0.045 at frame 99;
+        # the region runs from frame 60 to the last frame.
+        assert self.calls[1] == [frame for frame in range(60, 100) if frame % 10 != 0]
+        assert np.array_equal(measured, ~np.isnan(results))
+        assert np.array_equal(results[measured], self.true_diameters[measured])
+        assert np.count_nonzero(measured) == 6 + 40
+
+    def test_stopped_measure(self):
+        # Fails if frames not returned by measure are given a diameter.
+        results, measured = binary.measure_sampled_frames(lambda positions: self.true_diameters[positions][:5], np.arange(100), self.params_dict)
+        assert np.array_equal(results[0:5], self.true_diameters[0:5])
+        assert np.isnan(results[5:]).all()
+        assert measured[0:5].all() and not measured[5:].any()
+
+    def test_nan_diameters_measured(self):
+        # Fails if a frame measured as NaN is left unmeasured or measured
+        # again in the refined region.
+        self.calls = []
+        def measure(positions):
+            diameters = self.measure(positions)
+            return np.where(positions == 80, np.nan, diameters)
+        results, measured = binary.measure_sampled_frames(measure, np.arange(100), self.params_dict, {"frame_step" : 10})
+        assert np.isnan(results[80]) and measured[80]
+        assert 80 not in self.calls[1]
+
 class TestBinaryImagesToCSV:
     """
     Tests binary_images_to_csv
@@ -468,6 +2081,12 @@ class TestBinaryImagesToCSV:
     test_verbose:
         Tests if binary_images_to_csv produces print statements if verbose
         is True.
+    test_packed_matches_png:
+        Tests if binary_images_to_csv saves the same csv from a packed binary
+        stack as from .png binary images.
+    test_use_cache:
+        Tests if use_cache only skips the csv if it was made from cached
+        binary images with the same fps.
     """
 
     fps = 25000
@@ -542,3 +2161,119 @@ class TestBinaryImagesToCSV:
         binary.binary_images_to_csv(images_location,csv_path,self.fps,optional_settings)
         out, err = capfd.readouterr()
         assert ".csv already exists and skip_existing is False" in out
+
+    def test_packed_matches_png(self,tmp_path,fname,images_location,bin_folder):
+        # Fails if the csv from a packed binary stack differs from the csv
+        # from .png binary images.
+        packed_location = tmp_path / fname
+        os.makedirs(packed_location / "bin")
+        shutil.copy(os.path.join(images_location,fname + "_params.csv"), packed_location)
+        binary_sequence = skimage.io.imread_collection(os.path.join(bin_folder,"*"))
+        stack.write_binary_stack(packed_location / "bin" / stack.BINARY_STACK_NAME, binary_sequence)
+
+        for path in [tmp_path / "png_csv", tmp_path / "packed_csv"]:
+            os.mkdir(path)
+        binary.binary_images_to_csv(images_location,tmp_path / "png_csv",self.fps)
+        binary.binary_images_to_csv(packed_location,tmp_path / "packed_csv",self.fps)
+        target = pd.read_csv(tmp_path / "png_csv" / (fname + ".csv"))
+        results = pd.read_csv(tmp_path / "packed_csv" / (fname + ".csv"))
+        pd.testing.assert_frame_equal(target, results)
+
+    def test_use_cache(self,tmp_path,fname,images_location):
+        # Fails if the csv is skipped without cached binary images, or is not
+        # skipped once cached, or is skipped after fps changes.
+        images_copy = tmp_path / fname
+        os.mkdir(images_copy)
+        shutil.copytree(os.path.join(images_location,"bin"), images_copy / "bin")
+        shutil.copy(os.path.join(images_location,fname + "_params.csv"), images_copy)
+        csv_path = tmp_path / "csv"
+        os.mkdir(csv_path)
+        csv_file = csv_path / (fname + ".csv")
+        csv_file.touch()
+        optional_settings = {"use_cache" : True}
+
+        # Binary images not recorded in the cache: the existing csv is
+        # overwritten every time.
+        binary.binary_images_to_csv(images_copy,csv_path,self.fps,optional_settings)
+        assert os.stat(csv_file).st_size > 0
+        assert "csv" not in cache.read_manifest(images_copy)
+
+        cache.finish_stage(images_copy, "bin", "bin_key")
+        binary.binary_images_to_csv(images_copy,csv_path,self.fps,optional_settings)
+        assert "csv" in cache.read_manifest(images_copy)
+        mtime = os.stat(csv_file).st_mtime_ns
+        binary.binary_images_to_csv(images_copy,csv_path,self.fps,optional_settings)
+        assert os.stat(csv_file).st_mtime_ns == mtime
+        binary.binary_images_to_csv(images_copy,csv_path,2*self.fps,optional_settings)
+        assert os.stat(csv_file).st_mtime_ns != mtime
+
+@pytest.fixture(scope="module")
+def synthetic_video():
+    # A short synthetic video of 40 frames of 256 x 128 pixels, with 5
+    # background frames.
+    return synthetic.dos_video((256, 128), frame_count=40, background_count=5)
+
+class TestSyntheticVideo:
+    """
+    Tests the synthetic DOS videos of dosertools.tests.synthetic.
+
+    Tests
+    -----
+    test_video_frames:
+        Checks if the videos have the requested shape and numbers of frames,
+        and 12-bit np.uint16 intensities.
+    test_diameters:
+        Checks if the neck diameter starts at the nozzle diameter, thins,
+        and is 0 from breakup_frame on.
+    test_background_has_no_liquid:
+        Checks if the background video is bright between the nozzle and
+        substrate, where the first frame has liquid across the nozzle
+        diameter.
+    test_measured_diameters:
+        Checks if tiffs_to_csv measures the neck diameters the video was
+        made with, to within 2 pixels.
+    """
+
+    def test_video_frames(self, synthetic_video):
+        # Fails if the shape, dtype, or range of either video is wrong.
+        video, background, truth = synthetic_video
+        assert video.shape == (40, 256, 128)
+        assert background.shape == (5, 256, 128)
+        for frames in [video, background]:
+            assert frames.dtype == np.uint16
+            assert frames.max() <= 4095
+
+    def test_diameters(self, synthetic_video):
+        # Fails if the diameters do not start at the nozzle diameter, do not
+        # decrease, or are not 0 after breakup.
+        video, background, truth = synthetic_video
+        diameters = truth["diameters"]
+        breakup_frame = truth["breakup_frame"]
+        assert diameters[0] == truth["nozzle_diameter"]
+        assert np.all(np.diff(diameters[:breakup_frame]) < 0)
+        assert np.all(diameters[breakup_frame:] == 0)
+        assert 0 < breakup_frame < len(diameters)
+
+    def test_background_has_no_liquid(self, synthetic_video):
+        # Fails if the background is dark at the neck, or the first frame is
+        # not dark across the nozzle diameter at the neck.
+        video, background, truth = synthetic_video
+        neck_row = (truth["nozzle_tip"] + truth["substrate"]) // 2
+        threshold = (synthetic.BRIGHT_LEVEL + synthetic.DARK_LEVEL) / 2
+        assert np.all(background[:, neck_row, :] > threshold)
+        assert np.sum(video[0, neck_row, :] < threshold) == truth["nozzle_diameter"]
+
+    def test_measured_diameters(self, tmp_path, synthetic_video):
+        # Fails if any measured D/D0 is more than 2 pixels from the
+        # diameters the video was made with.
+        video, background, truth = synthetic_video
+        experimental_video_folder, background_video_folder = synthetic.write_dos_videos(tmp_path / "videos", "test", video, background)
+        images_location = tmp_path / "images"
+        csv_location = tmp_path / "csv"
+        os.mkdir(images_location)
+        os.mkdir(csv_location)
+        th.tiffs_to_csv(experimental_video_folder, background_video_folder, images_location, csv_location, 25000, {"verbose" : False})
+        results = pd.read_csv(csv_location / "images.csv")
+        target = truth["diameters"] / truth["nozzle_diameter"]
+        assert len(results) == len(video)
+        assert np.allclose(results["D/D0"], target, rtol=0, atol=2 / truth["nozzle_diameter"])